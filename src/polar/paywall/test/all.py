@@ -26,22 +26,27 @@
 # (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
 # THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
-from logging import info
+from logging import info, error
 
 from polar.paywall.test.subcommand import Subcommand
 
 from polar.paywall.test.auth import Auth
 from polar.paywall.test.validate import Validate
 
+from traceback import format_exc
+
+from threading import Thread
+
 
 class All(Subcommand):
     '''
-    Called by the all subcommand in main. Runs all of the unit tests in
-    sequence.
+    Called by the all subcommand in main. Runs all of the unit tests, with
+    the suites of each entry point running at the same time on connections
+    of their own.
     '''
     def run(self, arguments):
         '''
-        Runs the full series of unit tests on auth.
+        Runs the full series of unit tests on auth and validate.
         '''
         info('Running all publisher tests.')
 
@@ -50,6 +55,24 @@ class All(Subcommand):
             Validate(),
         ]
 
+        threads = []
         for test in tests:
-            test.config = self.config
+            self.share(test)
+            thread = Thread(target=self.run_suite_in_thread,
+                            args=(test, arguments))
+            thread.start()
+            threads.append(thread)
+
+        for thread in threads:
+            thread.join()
+
+    def run_suite_in_thread(self, test, arguments):
+        '''
+        Runs one suite, logging any error rather than losing it with the
+        thread.
+        '''
+        try:
             test.run(arguments)
+        except Exception, exception:
+            error(format_exc())
+            error(exception)
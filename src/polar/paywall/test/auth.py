@@ -30,15 +30,91 @@ from polar.paywall.test.schemas import AUTH_SCHEMAS
 
 from polar.paywall.test.subcommand import Subcommand
 
-from logging import info, error
+from polar.paywall.test.matrix import (Case, COMMON_CASES, url, random_id,
+                                       with_field, without_field,
+                                       has_invalid_user)
 
-from traceback import format_exc
+from logging import info
+
+
+def invalid_user_body(suite):
+    return suite.get_body(user='invalid user')
+
+
+def random_auth_params(suite):
+    return {suite.random_id(): suite.random_id()}
+
+
+def invalid_credentials(config):
+    '''
+    Returns a case for each of the valid user's auth params, in which the
+    param has an invalid value.
+    '''
+    return [Case('test_model', 'invalid authParams values for: %s' % name,
+                 401, 'InvalidPaywallCredentials',
+                 body=with_field('authParams.%s' % name, random_id))
+            for name, value in config.items('valid user')]
+
+
+# The tests of the auth entry point, as rows of the test matrix. Functions in
+# the matrix return the rows that depend on the config file. See Case.
+CASES = COMMON_CASES + [
+    Case('test_json', 'no body', 400, 'InvalidFormat', body=''),
+    Case('test_json', 'invalid body', 400, 'InvalidFormat', body='test'),
+
+    Case('test_device', 'no device', 400, 'InvalidDevice',
+         body=without_field('device')),
+    Case('test_device', 'invalid device', 400, 'InvalidDevice',
+         body=with_field('device', 'test')),
+    Case('test_device', 'no manufacturer', 400, 'InvalidDevice',
+         body=without_field('device.manufacturer')),
+    Case('test_device', 'invalid manufacturer', 400, 'InvalidDevice',
+         body=with_field('device.manufacturer', [])),
+    Case('test_device', 'no model', 400, 'InvalidDevice',
+         body=without_field('device.model')),
+    Case('test_device', 'invalid model', 400, 'InvalidDevice',
+         body=with_field('device.model', [])),
+    Case('test_device', 'no os_version', 400, 'InvalidDevice',
+         body=without_field('device.os_version')),
+    Case('test_device', 'invalid os_version', 400, 'InvalidDevice',
+         body=with_field('device.os_version', [])),
+
+    Case('test_auth_params', 'no authParams', 400, 'InvalidAuthParams',
+         body=without_field('authParams')),
+    Case('test_auth_params', 'invalid authParams', 400, 'InvalidAuthParams',
+         body=with_field('authParams', [])),
+    Case('test_auth_params', 'invalid authParams parameters', 400,
+         'InvalidAuthParams', body=with_field('authParams',
+                                              random_auth_params)),
+
+    invalid_credentials,
+    Case('test_model', 'invalid user', 403, 'AccountProblem',
+         url=url(user='invalid user'), body=invalid_user_body,
+         when=has_invalid_user),
+    Case('test_model', 'invalid product', 404, 'InvalidProduct',
+         url=url(product=random_id)),
+
+    Case('test_charset', 'non-ascii characters',
+         body=with_field('device.manufacturer', u'李刚'),
+         schemas=AUTH_SCHEMAS),
+
+    Case('test_success', 'a successful authentication',
+         schemas=AUTH_SCHEMAS),
+]
 
 
 class Auth(Subcommand):
     '''
     Called by the auth subcommand in main.
     '''
+    entry = 'auth'
+
+    # A successful authentication and the credential checks are the most
+    # important tests, so they are still run when the budget runs low.
+    priority_tests = ('test_model', 'test_success')
+
+    cases = CASES
+
     def run(self, arguments):
         '''
         Runs the full series of unit tests on auth.
@@ -46,26 +122,7 @@ class Auth(Subcommand):
         info('Running tests on the auth entry point.')
 
         connection = self.create_connection()
-
-        tests = [
-            self.test_urls,
-            self.test_headers,
-            self.test_json,
-            self.test_device,
-            self.test_auth_params,
-            self.test_model,
-            self.test_charset,
-            self.test_success,
-        ]
-
-        for test in tests:
-            try:
-                test(connection)
-
-            except Exception, exception:
-                error(format_exc())
-                error(exception)
-
+        self.run_suite(connection)
         connection.close()
 
     def get_url(self, api='paywallproxy', version=None, format='json',
@@ -73,8 +130,9 @@ class Auth(Subcommand):
         '''
         Creates a url using the values in the config file.
         '''
-        return Subcommand.get_url(self, entry='auth', api=api, version=version,
-                                  format=format, product=product, user=user)
+        return Subcommand.get_url(self, entry=self.entry, api=api,
+                                  version=version, format=format,
+                                  product=product, user=user)
 
     def get_headers(self, charset='utf-8'):
         '''
@@ -84,10 +142,11 @@ class Auth(Subcommand):
                 'Accept-Charset': charset,
                 'Authorization': 'PolarPaywallProxyAuthv1.0.0'}
 
-    def get_body(self, user='valid user'):
+    def get_body(self, user='valid user', auth_params=None):
         '''
         Get a sample body for auth testing. Possible choices for user are
-        'valid user' and 'invalid user'.
+        'valid user' and 'invalid user'. If auth_params are given, they are
+        used instead of the user's parameters.
         '''
         result = {
             'device': {
@@ -98,122 +157,12 @@ class Auth(Subcommand):
             'authParams': {},
         }
 
+        if auth_params is not None:
+            result['authParams'].update(auth_params)
+            return result
+
         # Extract authentication parameters from the configuration file.
         for option in self.config.options(user):
             result['authParams'][option] = self.config.get(user, option)
 
         return result
-
-    def test_json(self, connection):
-        '''
-        Test responses to bad json encoded resquests.
-        '''
-        info('Testing no body.')
-        body = ''
-        self.test_error(connection, 400, 'InvalidFormat', body=body)
-
-        info('Testing invalid body.')
-        body = 'test'
-        self.test_error(connection, 400, 'InvalidFormat', body=body)
-
-    def test_device(self, connection):
-        '''
-        Test responses to bad device values in the request.
-        '''
-        info('Testing no device.')
-        body = self.get_body()
-        del body['device']
-        self.test_error(connection, 400, 'InvalidDevice', body=body)
-
-        info('Testing invalid device.')
-        body = self.get_body()
-        body['device'] = 'test'
-        self.test_error(connection, 400, 'InvalidDevice', body=body)
-
-        info('Testing no manufacturer.')
-        body = self.get_body()
-        del body['device']['manufacturer']
-        self.test_error(connection, 400, 'InvalidDevice', body=body)
-
-        info('Testing invalid manufacturer.')
-        body = self.get_body()
-        body['device']['manufacturer'] = []
-        self.test_error(connection, 400, 'InvalidDevice', body=body)
-
-        info('Testing no model.')
-        body = self.get_body()
-        del body['device']['model']
-        self.test_error(connection, 400, 'InvalidDevice', body=body)
-
-        info('Testing invalid model.')
-        body = self.get_body()
-        body['device']['model'] = []
-        self.test_error(connection, 400, 'InvalidDevice', body=body)
-
-        info('Testing no os_version.')
-        body = self.get_body()
-        del body['device']['os_version']
-        self.test_error(connection, 400, 'InvalidDevice', body=body)
-
-        info('Testing invalid os_version.')
-        body = self.get_body()
-        body['device']['os_version'] = []
-        self.test_error(connection, 400, 'InvalidDevice', body=body)
-
-    def test_auth_params(self, connection):
-        '''
-        Test responses to bad auth params in the request.
-        '''
-        info('Testing no authParams.')
-        body = self.get_body()
-        del body['authParams']
-        self.test_error(connection, 400, 'InvalidAuthParams', body=body)
-
-        info('Testing invalid authParams.')
-        body = self.get_body()
-        body['authParams'] = []
-        self.test_error(connection, 400, 'InvalidAuthParams', body=body)
-
-        info('Testing invalid authParams parameters.')
-        body = self.get_body()
-        body['authParams'] = {self.random_id(): self.random_id()}
-        self.test_error(connection, 400, 'InvalidAuthParams', body=body)
-
-    def test_model(self, connection):
-        '''
-        Test responses to requests with valid formatting but invalid data.
-        '''
-        for name, value in self.config.items('valid user'):
-            info('Testing invalid authParams values for: %s.' % name)
-            body = self.get_body()
-            body['authParams'][name] = self.random_id()
-            code = 'InvalidPaywallCredentials'
-            self.test_error(connection, 401, code, body=body)
-
-        # If an invalid user is provided, we can test for an account problem.
-        if self.config.has_section('invalid user'):
-            info('Testing invalid user.')
-            url = self.get_url(user='invalid user')
-            body = self.get_body(user='invalid user')
-            code = 'AccountProblem'
-            self.test_error(connection, 403, code, url=url, body=body)
-
-        info('Testing invalid product.')
-        url = self.get_url(product=self.random_id())
-        self.test_error(connection, 404, 'InvalidProduct', url=url)
-
-    def test_charset(self, connection):
-        '''
-        Test authentication using non-ascii characters.
-        '''
-        info('Testing non-ascii characters.')
-        body = self.get_body()
-        body['device']['manufacturer'] = u'李刚'
-        self.request(connection, body=body, schemas=AUTH_SCHEMAS)
-
-    def test_success(self, connection):
-        '''
-        Test a successful request/response.
-        '''
-        info('Testing a successful authentication.')
-        self.request(connection, schemas=AUTH_SCHEMAS)
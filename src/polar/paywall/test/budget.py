@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# coding: utf-8
+# Copyright (c) 2012, Polar Mobile.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name Polar Mobile nor the names of its contributors
+#     may be used to endorse or promote products derived from this software
+#     without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL POLAR MOBILE BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from time import time
+
+
+class BudgetExhausted(Exception):
+    '''
+    Raised when a request would be sent after the time budget ran out.
+    '''
+    def __init__(self):
+        Exception.__init__(self, 'The time budget ran out.')
+
+
+class Budget(object):
+    '''
+    Tracks the time left in a run. A budget of None never runs out.
+    '''
+    def __init__(self, seconds=None, reserve=0):
+        '''
+        Starts the clock. When less than reserve seconds are left, the budget
+        is considered low.
+        '''
+        self.start = time()
+        self.seconds = seconds
+        self.reserve = reserve
+
+    def elapsed(self):
+        '''
+        Returns the number of seconds since the budget was created.
+        '''
+        return time() - self.start
+
+    def remaining(self):
+        '''
+        Returns the number of seconds left, or None if there is no limit.
+        '''
+        if self.seconds is None:
+            return None
+
+        return max(self.seconds - self.elapsed(), 0)
+
+    def exhausted(self):
+        '''
+        Returns True if there is no time left.
+        '''
+        return self.remaining() == 0
+
+    def low(self):
+        '''
+        Returns True if the time left has dropped below the reserve.
+        '''
+        remaining = self.remaining()
+        return remaining is not None and remaining < self.reserve
@@ -0,0 +1,372 @@
+#!/usr/bin/env python
+# coding: utf-8
+# Copyright (c) 2012, Polar Mobile.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name Polar Mobile nor the names of its contributors
+#     may be used to endorse or promote products derived from this software
+#     without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL POLAR MOBILE BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from polar.paywall.test.schemas import AUTH_SCHEMAS, VALIDATE_SCHEMAS
+
+from polar.paywall.test.subcommand import Subcommand
+
+from polar.paywall.test.auth import Auth
+from polar.paywall.test.validate import Validate
+
+from polar.paywall.test.pool import read_credentials
+
+from polar.paywall.test.pacing import Barrier, BrokenBarrier
+
+from polar.paywall.test.saturation import Saturation, LAG_LIMIT
+
+from polar.paywall.test.contention import describe
+
+from polar.paywall.test.stats import percentiles
+
+from logging import info, warning, error
+
+from threading import Thread, Lock, Event
+from time import time, sleep
+
+# The number of flows sent one at a time to measure the idle server.
+BASELINE = 20
+
+# A probe is healthy if it succeeds within this multiple of the idle p99
+# latency. The server has recovered once this many healthy probes in a row
+# have been sent after the burst drained.
+RECOVERED = 2.0
+STREAK = 5
+
+# The number of rows of the timeline.
+ROWS = 10
+
+
+class Burst(Subcommand):
+    '''
+    Called by the burst subcommand in main. Holds a number of virtual users
+    that have connected to the server, then releases them at once or over a
+    short ramp, like apps opening after a push notification. Each user
+    authenticates and then validates its session key. While the burst
+    drains, a probe sends the same flow one at a time to tell when the
+    server has recovered.
+    '''
+    def run(self, arguments):
+        '''
+        Measures the idle server, releases the burst and prints the report.
+        '''
+        auth = Auth()
+        self.share(auth)
+        product = self.config.get('products', 'valid user')
+        users = [(auth.get_body()['authParams'], product)]
+        if arguments.credentials:
+            users = read_credentials(arguments.credentials, product)
+
+        # The probe uses the first user, on a connection of its own.
+        self.probe_flow = self.prepare(users[0])
+        self.probe_connection = auth.create_connection()
+
+        info('Measuring the idle server with %i flows.' % BASELINE)
+        idle = [self.flow(self.probe_connection, self.probe_flow)
+                for index in xrange(BASELINE)]
+        failed = [flow for flow in idle if flow['response'] != '200']
+        if failed:
+            warning('%i of the idle flows failed: %s.' % \
+                    (len(failed), failed[0]['response']))
+        self.idle = percentiles([flow['auth'] for flow in idle
+                                 if flow['auth'] is not None], [50, 99])
+        self.healthy = RECOVERED * percentiles(
+            [flow['end'] - flow['start'] for flow in idle], [99])[0]
+
+        self.lock = Lock()
+        self.flows = []
+        self.probes = []
+        self.barrier = Barrier(arguments.users + 1)
+        self.released = Event()
+        self.drained = Event()
+
+        info('Connecting %i users.' % arguments.users)
+        workers = []
+        for index in xrange(arguments.users):
+            # Users are spread evenly over the ramp.
+            offset = arguments.ramp * index / arguments.users
+            thread = Thread(target=self.work,
+                            args=(users[index % len(users)], offset))
+            thread.start()
+            workers.append(thread)
+
+        # Once every user has connected, they are released together. The
+        # client watches how late its own threads run while the burst
+        # drains.
+        self.saturation = Saturation()
+        try:
+            self.barrier.wait()
+        except BrokenBarrier:
+            error('A user failed before the release, so the burst was '
+                  'called off.')
+            for thread in workers:
+                thread.join()
+            self.probe_connection.close()
+            return
+
+        self.release = time()
+        self.released.set()
+        self.saturation.begin()
+        info('Released %i users.' % arguments.users)
+
+        probe = Thread(target=self.probe, args=(arguments.recovery,))
+        probe.start()
+
+        for thread in workers:
+            thread.join()
+        self.drained.set()
+        self.drain = time() - self.release
+        self.saturation.end()
+
+        probe.join()
+        self.probe_connection.close()
+
+        self.report(arguments)
+
+    def work(self, user, offset):
+        '''
+        Connects a virtual user, waits for the release and then sends its
+        flow. Everything but sending is done before the release, so that the
+        users start as close together as possible.
+        '''
+        # A user that fails aborts the barrier, so that the others and the
+        # main thread are not left waiting for it forever.
+        try:
+            prepared = self.prepare(user)
+            auth = prepared[0]
+            connection = auth.create_connection()
+            try:
+                auth.open_connection(connection)
+            except Exception, exception:
+                warning('Could not connect: %s' % exception)
+
+            self.barrier.wait()
+
+        except BrokenBarrier:
+            return
+
+        except Exception, exception:
+            error('A user failed: %s' % exception)
+            self.barrier.abort()
+            return
+
+        self.released.wait()
+        if offset:
+            sleep(offset)
+
+        flow = self.flow(connection, prepared)
+        flow['due'] = offset
+        connection.close()
+
+        self.lock.acquire()
+        try:
+            self.flows.append(flow)
+        finally:
+            self.lock.release()
+
+    def prepare(self, user):
+        '''
+        Returns the suites of a user's flow, its product and its auth
+        request.
+        '''
+        auth_params, product = user
+        auth = Auth()
+        validate = Validate()
+        self.share(auth)
+        self.share(validate)
+
+        request = auth.prepare_request(
+            url=auth.get_url(product=product),
+            body=auth.get_body(auth_params=auth_params))
+        return auth, validate, product, request
+
+    def flow(self, connection, prepared):
+        '''
+        Authenticates a user and validates the session key it gets on the
+        same connection. Returns the times of the flow, the latency of each
+        request and the response that ended it.
+        '''
+        auth, validate, product, (url, headers, body) = prepared
+
+        result = {'start': time(), 'auth': None, 'validate': None}
+        try:
+            status, response_headers, response_body = \
+                auth.send(connection, url, headers, body, AUTH_SCHEMAS)
+            result['auth'] = time() - result['start']
+            response = 'auth %s' % describe(status, response_body)
+
+            if status == 200:
+                validate.session_key = response_body['sessionKey']
+                url, headers, body = validate.prepare_request(
+                    url=validate.get_url(product=product))
+
+                start = time()
+                status, response_headers, response_body = validate.send(
+                    connection, url, headers, body, VALIDATE_SCHEMAS)
+                result['validate'] = time() - start
+                response = 'validate %s' % describe(status, response_body)
+                if status == 200:
+                    response = '200'
+
+        except Exception, exception:
+            connection.close()
+            response = exception.__class__.__name__
+
+        result['end'] = time()
+        result['response'] = response
+        return result
+
+    def probe(self, limit):
+        '''
+        Sends flows one at a time from the release until the burst has
+        drained and the server is healthy again, or the limit is reached.
+        '''
+        streak = 0
+        while time() - self.release < limit:
+            flow = self.flow(self.probe_connection, self.probe_flow)
+            flow['healthy'] = flow['response'] == '200' and \
+                flow['end'] - flow['start'] <= self.healthy
+            self.probes.append(flow)
+
+            streak = flow['healthy'] and streak + 1 or 0
+            if self.drained.isSet() and streak >= STREAK:
+                return
+
+    def get_recovery(self):
+        '''
+        Returns the time from the release to the first probe after which
+        every probe was healthy, or None if the server did not recover.
+        '''
+        if not self.probes or not self.probes[-1]['healthy']:
+            return None
+
+        recovered = self.probes[0]['start']
+        for flow in self.probes:
+            if not flow['healthy']:
+                recovered = flow['end']
+        return recovered - self.release
+
+    def report(self, arguments):
+        '''
+        Prints how the server handled the burst.
+        '''
+        flows = self.flows
+        release = self.release
+        late = max([flow['start'] - release - flow['due']
+                    for flow in flows])
+
+        how = 'at once'
+        if arguments.ramp:
+            how = 'over %.2fs' % arguments.ramp
+        print 'Released %i users %s. The last flow started %.3fs late.' % \
+              (len(flows), how, late)
+        if self.idle[0] is None:
+            print 'Idle auth latency: no idle flow was authenticated.'
+        else:
+            print 'Idle auth latency: p50 %.1fms, p99 %.1fms' % \
+                  (self.idle[0] * 1000, self.idle[1] * 1000)
+        print 'Drained in %.2fs.' % self.drain
+
+        # Threads share one core, so a large burst may keep the client's
+        # threads from running when they should. The latencies then include
+        # time spent waiting in the client.
+        lag = max([second['lag']
+                   for second in self.saturation.seconds.values()] + [0])
+        if lag >= LAG_LIMIT:
+            warning('The client\'s threads ran up to %.0fms late while the '
+                    'burst drained, so the latencies include time spent in '
+                    'the client. Run several burst processes at once '
+                    'instead.' % (lag * 1000))
+
+        for name in ('auth', 'validate'):
+            latencies = [flow[name] for flow in flows
+                         if flow[name] is not None]
+            if not latencies:
+                continue
+            p50, p99, p100 = percentiles(latencies, [50, 99, 100])
+            print '%s latency: p50 %.1fms, p99 %.1fms, max %.1fms' % \
+                  (name.capitalize(), p50 * 1000, p99 * 1000, p100 * 1000)
+
+        # Time spent waiting on the server is estimated as the auth latency
+        # above that of the idle server.
+        queueing = [max(flow['auth'] - self.idle[0], 0) for flow in flows
+                    if flow['auth'] is not None and self.idle[0] is not None]
+        if queueing:
+            p50, p99, p100 = percentiles(queueing, [50, 99, 100])
+            print 'Queueing: p50 %.1fms, p99 %.1fms, max %.1fms' % \
+                  (p50 * 1000, p99 * 1000, p100 * 1000)
+
+        responses = {}
+        for flow in flows:
+            responses[flow['response']] = \
+                responses.get(flow['response'], 0) + 1
+        print 'Responses:'
+        for response, count in sorted(responses.items()):
+            print '  %s: %i' % (response, count)
+
+        self.print_timeline(flows)
+
+        recovery = self.get_recovery()
+        if recovery is None:
+            print 'The server did not recover within %gs of the release.' % \
+                  arguments.recovery
+        else:
+            print 'Recovered %.2fs after the release (%i probes, healthy ' \
+                  'under %.1fms).' % (recovery, len(self.probes),
+                                      self.healthy * 1000)
+
+    def print_timeline(self, flows):
+        '''
+        Prints the flows that ended in each part of the drain, and the
+        errors among them.
+        '''
+        width = max(self.drain / ROWS, 0.1)
+        rows = {}
+        for flow in flows:
+            row = rows.setdefault(int((flow['end'] - self.release) / width),
+                                  {'flows': 0, 'errors': 0})
+            row['flows'] += 1
+            if flow['response'] != '200':
+                row['errors'] += 1
+
+        print '%-16s %8s %8s' % ('ended', 'flows', 'errors')
+        peak = None
+        for index in xrange(max(rows.keys()) + 1):
+            row = rows.get(index, {'flows': 0, 'errors': 0})
+            print '%-16s %8i %8i' % ('%.2f-%.2fs' % (index * width,
+                                                    (index + 1) * width),
+                                     row['flows'], row['errors'])
+            if row['errors'] and (peak is None or
+                                  row['errors'] > rows[peak]['errors']):
+                peak = index
+
+        if peak is not None:
+            row = rows[peak]
+            print 'Errors peaked at %i of %i flows (%.0f%%), %.2fs after ' \
+                  'the release.' % (row['errors'], row['flows'],
+                                    100.0 * row['errors'] / row['flows'],
+                                    peak * width)
@@ -0,0 +1,298 @@
+#!/usr/bin/env python
+# coding: utf-8
+# Copyright (c) 2012, Polar Mobile.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name Polar Mobile nor the names of its contributors
+#     may be used to endorse or promote products derived from this software
+#     without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL POLAR MOBILE BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from polar.paywall.test.subcommand import Subcommand
+
+from polar.paywall.test.auth import Auth
+from polar.paywall.test.validate import Validate
+
+from polar.paywall.test.tls import TLS
+
+from polar.paywall.test.stats import percentiles
+
+from logging import info, error
+
+from ConfigParser import ConfigParser
+from threading import Thread
+
+# The section of the config file that describes the shadow server.
+SHADOW = 'shadow'
+
+
+def get_shadow_config(config):
+    '''
+    Returns a copy of the config in which the server section is replaced by
+    the shadow section. Options the shadow section does not give are taken
+    from the server section.
+    '''
+    result = ConfigParser()
+    for section in config.sections():
+        result.add_section(section)
+        for option, value in config.items(section, raw=True):
+            result.set(section, option, value)
+
+    for option, value in config.items(SHADOW, raw=True):
+        result.set('server', option, value)
+
+    return result
+
+
+class Recorder(object):
+    '''
+    Mixed into a suite to record every request made by its tests: the
+    status and error code of the response, whether the response matched its
+    schema, and the latencies of the exchange. Requests that raise are
+    recorded with the name of the exception as their status.
+    '''
+    def exchange(self, connection, url, headers, body, schemas):
+        # Requests made outside of a test, such as getting a session key,
+        # are not compared.
+        test = self.current_test
+        exchange = super(Recorder, self).exchange
+        if test is None:
+            return exchange(connection, url, headers, body, schemas)
+
+        latencies = len(self.latencies.get(test, []))
+        failures = self.failures
+
+        try:
+            result = exchange(connection, url, headers, body, schemas)
+        except Exception, exception:
+            self.exchanges.append((test, exception.__class__.__name__, None,
+                                   None, []))
+            raise
+
+        status, response_headers, response_body = result
+        code = None
+        if isinstance(response_body, dict) and \
+           isinstance(response_body.get('error'), dict):
+            code = response_body['error'].get('code')
+
+        self.exchanges.append((test, status, code, failures == self.failures,
+                               self.latencies.get(test, [])[latencies:]))
+        return result
+
+
+class RecordingAuth(Recorder, Auth):
+    pass
+
+
+class RecordingValidate(Recorder, Validate):
+    pass
+
+
+class Compare(Subcommand):
+    '''
+    Called by the compare subcommand in main. Runs the auth and validate
+    tests against the server and the shadow server at the same time, then
+    reports where their responses disagree and compares their latencies.
+    '''
+    def run(self, arguments):
+        '''
+        Runs the suites against both servers and prints the comparison.
+        '''
+        if not self.config.has_section(SHADOW):
+            error('The compare command needs a %s section in the config '
+                  'file.' % SHADOW)
+            return
+
+        sides = [
+            ('A', self.config),
+            ('B', get_shadow_config(self.config)),
+        ]
+
+        info('Comparing %s with %s.' % (self.config.get('server', 'address'),
+                                        sides[1][1].get('server', 'address')))
+
+        self.exchanges = {}
+        self.errors = {}
+        workers = []
+        for name, config in sides:
+            self.exchanges[name] = []
+            self.errors[name] = []
+            thread = Thread(target=self.work,
+                            args=(config, self.exchanges[name],
+                                  self.errors[name]))
+            thread.start()
+            workers.append(thread)
+
+        for thread in workers:
+            thread.join()
+
+        self.report(self.exchanges['A'], self.exchanges['B'])
+        self.report_errors()
+
+    def work(self, config, exchanges, errors):
+        '''
+        Runs the auth and validate suites against the server of one config.
+        Each server gets its own resolver and TLS state. A suite that can't
+        run, for example because no session key could be fetched, is added
+        to the errors and the next suite is run.
+        '''
+        side = Subcommand()
+        self.share(side)
+        side.config = config
+        side.resolver = None
+        side.tls = TLS()
+
+        for suite in (RecordingAuth(), RecordingValidate()):
+            side.share(suite)
+            suite.exchanges = exchanges
+
+            connection = None
+            try:
+                connection = suite.create_connection()
+                suite.run_suite(connection)
+            except Exception, exception:
+                error('%s on %s: %s' % (suite.entry,
+                                        config.get('server', 'address'),
+                                        exception))
+                errors.append((suite.entry, exception))
+
+            if connection is not None:
+                connection.close()
+
+    def pair(self, a, b):
+        '''
+        Returns the names of the tests in the order they were run, and the
+        exchanges of each side grouped by test. The exchanges of a test are
+        paired by their position within it.
+        '''
+        names = []
+        grouped = {}
+        for side, exchanges in (('A', a), ('B', b)):
+            for exchange in exchanges:
+                test = exchange[0]
+                if test not in grouped:
+                    names.append(test)
+                    grouped[test] = {'A': [], 'B': []}
+                grouped[test][side].append(exchange)
+        return names, grouped
+
+    def report(self, a, b):
+        '''
+        Prints the agreement of each test, the requests that diverged and the
+        latency of each entry point on both servers.
+        '''
+        names, grouped = self.pair(a, b)
+
+        print '%-28s %8s %8s %8s %8s %9s %9s' % \
+              ('test', 'requests', 'status', 'code', 'schema', 'A p50 ms',
+               'B p50 ms')
+
+        divergences = []
+        for name in names:
+            sides = grouped[name]
+            count = max(len(sides['A']), len(sides['B']))
+            agree = {'status': 0, 'code': 0, 'schema': 0}
+
+            for index in xrange(count):
+                pair = []
+                for side in ('A', 'B'):
+                    if index < len(sides[side]):
+                        pair.append(sides[side][index][1:4])
+                    else:
+                        pair.append(('not sent', None, None))
+
+                (status_a, code_a, schema_a), (status_b, code_b, schema_b) = \
+                    pair
+                agree['status'] += status_a == status_b
+                agree['code'] += code_a == code_b
+                agree['schema'] += schema_a == schema_b
+
+                if pair[0] != pair[1]:
+                    divergences.append((name, index + 1, pair[0], pair[1]))
+
+            p50 = {}
+            for side in ('A', 'B'):
+                latencies = []
+                for exchange in sides[side]:
+                    latencies.extend(exchange[4])
+                p50[side] = '-'
+                if latencies:
+                    p50[side] = '%.1f' % (percentiles(latencies, [50])[0] *
+                                          1000)
+
+            print '%-28s %8i %8s %8s %8s %9s %9s' % \
+                  (name, count,
+                   '%i/%i' % (agree['status'], count),
+                   '%i/%i' % (agree['code'], count),
+                   '%i/%i' % (agree['schema'], count),
+                   p50['A'], p50['B'])
+
+        if divergences:
+            print
+            print 'Divergences:'
+        for name, index, pair_a, pair_b in divergences:
+            print '  %s request %i: A %s, B %s' % \
+                  (name, index, self.describe(pair_a), self.describe(pair_b))
+
+        print
+        for entry in (Auth.entry, Validate.entry):
+            line = []
+            for side, exchanges in (('A', a), ('B', b)):
+                latencies = []
+                for exchange in exchanges:
+                    if exchange[0].startswith(entry + '.'):
+                        latencies.extend(exchange[4])
+                if not latencies:
+                    line.append('%s no responses' % side)
+                    continue
+                p50, p95, p99 = percentiles(latencies, [50, 95, 99])
+                line.append('%s p50 %.1fms, p95 %.1fms, p99 %.1fms' % \
+                            (side, p50 * 1000, p95 * 1000, p99 * 1000))
+            print '%s: %s' % (entry, ' | '.join(line))
+
+    def report_errors(self):
+        '''
+        Prints the suites that could not be run on each side.
+        '''
+        errors = [(side, entry, exception)
+                  for side in ('A', 'B')
+                  for entry, exception in self.errors[side]]
+        if not errors:
+            return
+
+        print
+        print 'Suites that could not be run:'
+        for side, entry, exception in errors:
+            print '  %s %s: %s: %s' % (side, entry,
+                                      exception.__class__.__name__, exception)
+
+    def describe(self, exchange):
+        '''
+        Describes the status, error code and schema check of one response.
+        The schema check is None if there was no response.
+        '''
+        status, code, schema = exchange
+        result = str(status)
+        if code:
+            result += ' ' + code
+        if schema is False:
+            result += ' (schema mismatch)'
+        return result
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# coding: utf-8
+# Copyright (c) 2012, Polar Mobile.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name Polar Mobile nor the names of its contributors
+#     may be used to endorse or promote products derived from this software
+#     without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL POLAR MOBILE BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from polar.paywall.test.schemas import AUTH_SCHEMAS, VALIDATE_SCHEMAS
+
+from polar.paywall.test.subcommand import Subcommand
+
+from polar.paywall.test.auth import Auth
+from polar.paywall.test.validate import Validate
+
+from polar.paywall.test.stats import percentiles
+
+from logging import info
+
+from time import time
+
+# The encodings compared. Identity is the baseline.
+ENCODINGS = ('identity', 'gzip', 'deflate')
+
+
+class Compression(Subcommand):
+    '''
+    Called by the compression subcommand in main. Sends successful auth and
+    validate requests accepting each content encoding in turn, and reports
+    the bytes on the wire, the compression ratio and the latency the
+    server adds to compress its responses.
+    '''
+    def run(self, arguments):
+        '''
+        Measures each entry point with each encoding and prints the results.
+        '''
+        auth = Auth()
+        validate = Validate()
+        for suite in (auth, validate):
+            self.share(suite)
+
+        connection = self.create_connection()
+        validate.session_key = validate.get_session_key(connection)
+
+        print '%-9s %-9s %9s %9s %9s %7s %9s %9s' % \
+              ('entry', 'accept', 'responses', 'encoded', 'bytes', 'ratio',
+               'p50 ms', 'added ms')
+
+        for suite, schemas in ((auth, AUTH_SCHEMAS),
+                               (validate, VALIDATE_SCHEMAS)):
+            baseline = None
+            for encoding in ENCODINGS:
+                info('Measuring %s with %s.' % (suite.entry, encoding))
+                suite.accept_encoding = encoding
+                results = self.measure(suite, connection, schemas,
+                                       arguments.requests)
+                p50 = percentiles(results['latencies'], [50])[0]
+                if baseline is None:
+                    baseline = p50
+                self.report(suite.entry, encoding, results, p50, baseline)
+
+        connection.close()
+
+    def measure(self, suite, connection, schemas, requests):
+        '''
+        Sends a number of identical requests, and records their latency, the
+        size of their bodies and the encoding the server used.
+        '''
+        url, headers, body = suite.prepare_request()
+        results = {'latencies': [], 'raw': 0, 'size': 0, 'encodings': {}}
+
+        for request in xrange(requests):
+            start = time()
+            status, response_headers, response_body = \
+                suite.send(connection, url, headers, body, schemas)
+            results['latencies'].append(time() - start)
+
+            raw, size = suite.body_size
+            results['raw'] += raw
+            results['size'] += size
+
+            encoding = response_headers.get('Content-Encoding', 'identity')
+            encodings = results['encodings']
+            encodings[encoding] = encodings.get(encoding, 0) + 1
+
+        return results
+
+    def report(self, entry, encoding, results, p50, baseline):
+        '''
+        Prints one row of the results table. The bytes are the average size
+        of a response body on the wire, and the ratio is its decompressed
+        size divided by that.
+        '''
+        count = len(results['latencies'])
+        encoded = count - results['encodings'].get('identity', 0)
+        ratio = results['raw'] and float(results['size']) / results['raw']
+
+        print '%-9s %-9s %9i %9i %9i %7.2f %9.2f %9.2f' % \
+              (entry, encoding, count, encoded, results['raw'] / count,
+               ratio, p50 * 1000, (p50 - baseline) * 1000)
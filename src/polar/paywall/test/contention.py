@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+# coding: utf-8
+# Copyright (c) 2012, Polar Mobile.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name Polar Mobile nor the names of its contributors
+#     may be used to endorse or promote products derived from this software
+#     without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL POLAR MOBILE BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from polar.paywall.test.schemas import AUTH_SCHEMAS, VALIDATE_SCHEMAS
+
+from polar.paywall.test.subcommand import Subcommand
+
+from polar.paywall.test.auth import Auth
+from polar.paywall.test.validate import Validate
+
+from polar.paywall.test.pool import read_credentials
+
+from polar.paywall.test.pacing import Barrier, BrokenBarrier
+
+from polar.paywall.test.stats import percentiles
+
+from logging import info, warning, error
+
+from threading import Thread, Lock
+from time import time
+
+
+def describe(status, body):
+    '''
+    Returns the status of a response, followed by its error code if it has
+    one.
+    '''
+    try:
+        return '%s %s' % (status, body['error']['code'])
+    except (TypeError, KeyError):
+        return str(status)
+
+
+class Contention(Subcommand):
+    '''
+    Called by the contention subcommand in main. Sends bursts of
+    simultaneous auth requests for the same user, then validates every
+    session key that was returned. The latency is compared with bursts for
+    different users, or with requests sent one at a time, and keys that were
+    invalidated by a later login are reported.
+    '''
+    def run(self, arguments):
+        '''
+        Measures the same user bursts and the baseline and prints both.
+        '''
+        self.validate = Validate()
+        self.share(self.validate)
+
+        auth = Auth()
+        self.share(auth)
+        product = self.config.get('products', 'valid user')
+        user = (auth.get_body()['authParams'], product)
+
+        info('Sending %i bursts of %i auth requests for the same user.' % \
+             (arguments.bursts, arguments.size))
+        same = self.measure([user] * arguments.size, arguments.bursts)
+        if same is None:
+            return
+
+        # Without other users, the baseline is the same user without
+        # concurrency.
+        if arguments.credentials:
+            users = read_credentials(arguments.credentials, product)
+            if len(users) < arguments.size:
+                warning('Only %i users were given, so some are repeated in '
+                        'each burst.' % len(users))
+            users = [users[index % len(users)]
+                     for index in xrange(arguments.size)]
+            baseline_name = 'different users'
+            info('Sending %i bursts of %i auth requests for different '
+                 'users.' % (arguments.bursts, arguments.size))
+            baseline = self.measure(users, arguments.bursts)
+        else:
+            baseline_name = 'one at a time'
+            info('Sending %i auth requests one at a time.' % \
+                 (arguments.bursts * arguments.size))
+            baseline = self.measure([user], arguments.bursts * arguments.size)
+
+        if baseline is None:
+            return
+        self.report([('same user', same), (baseline_name, baseline)])
+
+    def measure(self, users, bursts):
+        '''
+        Sends bursts with one worker per user. Each worker connects before
+        the first burst, and all of them are released at once. The session
+        keys of each burst are validated once the whole burst is answered.
+        Returns None if a worker failed.
+        '''
+        self.lock = Lock()
+        self.barrier = Barrier(len(users) + 1)
+        self.results = {'latencies': [], 'responses': {}, 'keys': [],
+                        'validations': {}}
+
+        workers = []
+        for auth_params, product in users:
+            thread = Thread(target=self.work,
+                            args=(auth_params, product, bursts))
+            thread.start()
+            workers.append(thread)
+
+        connection = self.validate.create_connection()
+        try:
+            for burst in xrange(bursts):
+                # Release the burst, then wait for all of its responses.
+                self.barrier.wait()
+                self.barrier.wait()
+
+                for session_key, product in self.results['keys']:
+                    self.check_key(connection, session_key, product)
+                self.results['keys'] = []
+        except BrokenBarrier:
+            error('A worker failed, so the bursts were stopped.')
+            self.results = None
+        connection.close()
+
+        for thread in workers:
+            thread.join()
+
+        return self.results
+
+    def work(self, auth_params, product, bursts):
+        '''
+        Sends one auth request per burst on a connection that is opened
+        before the first burst.
+        '''
+        # A worker that fails aborts the barrier, so that the other workers
+        # and the main thread stop instead of waiting for it forever.
+        try:
+            auth = Auth()
+            self.share(auth)
+            connection = auth.create_connection()
+            url, headers, body = auth.prepare_request(
+                url=auth.get_url(product=product),
+                body=auth.get_body(auth_params=auth_params))
+
+            try:
+                auth.open_connection(connection)
+            except Exception, exception:
+                warning('Could not connect: %s' % exception)
+
+            for burst in xrange(bursts):
+                self.barrier.wait()
+
+                start = time()
+                session_key = None
+                try:
+                    status, response_headers, response_body = auth.send(
+                        connection, url, headers, body, AUTH_SCHEMAS)
+                    response = describe(status, response_body)
+                    if status == 200:
+                        session_key = response_body['sessionKey']
+
+                except Exception, exception:
+                    connection.close()
+                    response = exception.__class__.__name__
+
+                self.record(time() - start, response, session_key, product)
+                self.barrier.wait()
+
+            connection.close()
+
+        except BrokenBarrier:
+            pass
+
+        except Exception, exception:
+            error('A worker failed: %s' % exception)
+            self.barrier.abort()
+
+    def record(self, latency, response, session_key, product):
+        '''
+        Records the outcome of one auth request.
+        '''
+        self.lock.acquire()
+        try:
+            self.results['latencies'].append(latency)
+            responses = self.results['responses']
+            responses[response] = responses.get(response, 0) + 1
+            if session_key is not None:
+                self.results['keys'].append((session_key, product))
+        finally:
+            self.lock.release()
+
+    def check_key(self, connection, session_key, product):
+        '''
+        Validates a session key returned by a burst and records whether it
+        is still valid.
+        '''
+        self.validate.session_key = session_key
+        url, headers, body = self.validate.prepare_request(
+            url=self.validate.get_url(product=product))
+
+        try:
+            status, response_headers, response_body = self.validate.send(
+                connection, url, headers, body, VALIDATE_SCHEMAS)
+            response = describe(status, response_body)
+        except Exception, exception:
+            connection.close()
+            response = exception.__class__.__name__
+
+        validations = self.results['validations']
+        validations[response] = validations.get(response, 0) + 1
+
+    def report(self, runs):
+        '''
+        Prints the latency and key validity of each run, and the latency
+        inflation of the first run compared with the second.
+        '''
+        print '%-16s %9s %9s %9s %9s %7s %12s' % \
+              ('', 'requests', 'p50 ms', 'p95 ms', 'p99 ms', 'keys',
+               'invalidated')
+
+        for name, results in runs:
+            p50, p95, p99 = percentiles(results['latencies'], [50, 95, 99])
+            keys = sum(results['validations'].values())
+            invalid = keys - results['validations'].get('200', 0)
+            print '%-16s %9i %9.1f %9.1f %9.1f %7i %12i' % \
+                  (name, len(results['latencies']), p50 * 1000, p95 * 1000,
+                   p99 * 1000, keys, invalid)
+
+        (name, same), (baseline_name, baseline) = runs
+        same_p50, same_p99 = percentiles(same['latencies'], [50, 99])
+        base_p50, base_p99 = percentiles(baseline['latencies'], [50, 99])
+        print 'Latency inflation compared with %s: p50 x%.2f, p99 x%.2f' % \
+              (baseline_name, same_p50 / base_p50, same_p99 / base_p99)
+
+        for name, results in runs:
+            print 'Responses for %s:' % name
+            for response, count in sorted(results['responses'].items()):
+                print '  %s: %i' % (response, count)
+
+            invalid = [(response, count) for response, count in
+                       results['validations'].items() if response != '200']
+            for response, count in sorted(invalid):
+                print '  Validated keys answered %s: %i' % (response, count)
+
+        if sum([count for response, count in same['validations'].items()
+                if response != '200']):
+            print 'Concurrent logins for the same user invalidated earlier ' \
+                  'session keys.'
@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# coding: utf-8
+# Copyright (c) 2012, Polar Mobile.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name Polar Mobile nor the names of its contributors
+#     may be used to endorse or promote products derived from this software
+#     without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL POLAR MOBILE BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from polar.paywall.test.stats import percentiles
+
+from sys import stderr
+from threading import Thread, Lock, Event
+from time import time
+
+# The number of recent latencies each shard keeps for the percentiles.
+RECENT = 1024
+
+
+class Shard(object):
+    '''
+    The counters of one worker. Only the worker writes to its shard, so
+    workers never wait on each other or on the dashboard. The dashboard
+    reads the counters without locking; a refresh may see a request counted
+    in one counter but not yet in another, which is corrected by the next
+    refresh.
+    '''
+    def __init__(self):
+        self.requests = 0
+        self.in_flight = 0
+        self.errors = {}
+        self.connected = False
+
+        # A ring of the most recent latencies.
+        self.recent = [None] * RECENT
+
+    def begin(self):
+        '''
+        Called when the worker sends a request.
+        '''
+        self.in_flight += 1
+
+    def end(self, latency, error=None, connected=True):
+        '''
+        Called when a request finishes, with its error code if it failed and
+        whether the worker's connection is still open.
+        '''
+        self.recent[self.requests % RECENT] = latency
+        self.requests += 1
+        if error is not None:
+            self.errors[error] = self.errors.get(error, 0) + 1
+        self.connected = connected
+        self.in_flight -= 1
+
+
+class Dashboard(object):
+    '''
+    A live view of a load style run, redrawn on the terminal a few times per
+    second from a thread of its own. It shows the current request rate, the
+    requests in flight, percentiles of the recent latencies, the errors by
+    error code and how many worker connections are open.
+    '''
+    def __init__(self, interval=0.25, output=stderr):
+        self.interval = interval
+        self.output = output
+        self.shards = []
+        self.lock = Lock()
+        self.stopped = Event()
+        self.thread = None
+
+        self.start = None
+        self.last = (0, 0)
+        self.lines = 0
+
+    def shard(self):
+        '''
+        Returns a new shard for a worker.
+        '''
+        shard = Shard()
+        self.lock.acquire()
+        try:
+            self.shards.append(shard)
+        finally:
+            self.lock.release()
+        return shard
+
+    def begin(self):
+        '''
+        Starts redrawing the dashboard.
+        '''
+        self.start = time()
+        self.last = (self.start, 0)
+        self.thread = Thread(target=self.refresh)
+        self.thread.setDaemon(True)
+        self.thread.start()
+
+    def end(self):
+        '''
+        Stops redrawing and leaves the last view on the terminal.
+        '''
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.draw()
+
+    def refresh(self):
+        while not self.stopped.isSet():
+            self.draw()
+            self.stopped.wait(self.interval)
+
+    def draw(self):
+        '''
+        Replaces the previous view with the current one.
+        '''
+        lines = self.render()
+        frame = ''
+        if self.lines:
+            frame = '\x1b[%iF\x1b[J' % self.lines
+        self.output.write(frame + '\n'.join(lines) + '\n')
+        self.output.flush()
+        self.lines = len(lines)
+
+    def render(self):
+        '''
+        Returns the lines of the current view.
+        '''
+        self.lock.acquire()
+        shards = list(self.shards)
+        self.lock.release()
+
+        now = time()
+        requests = 0
+        in_flight = 0
+        connected = 0
+        errors = {}
+        recent = []
+        for shard in shards:
+            requests += shard.requests
+            in_flight += shard.in_flight
+            connected += shard.connected
+            for code, count in shard.errors.items():
+                errors[code] = errors.get(code, 0) + count
+            recent.extend([latency for latency in shard.recent[:]
+                           if latency is not None])
+
+        last_time, last_requests = self.last
+        rate = 0.0
+        if now > last_time:
+            rate = (requests - last_requests) / (now - last_time)
+        self.last = (now, requests)
+
+        lines = ['%6.0fs  %i requests  %.0f/s  %i in flight  '
+                 '%i/%i connections open' % \
+                 (now - self.start, requests, rate, in_flight, connected,
+                  len(shards))]
+
+        if recent:
+            p50, p90, p99, p100 = percentiles(recent, [50, 90, 99, 100])
+            lines.append('latency  p50 %.1fms  p90 %.1fms  p99 %.1fms  '
+                         'max %.1fms' % (p50 * 1000, p90 * 1000, p99 * 1000,
+                                         p100 * 1000))
+        else:
+            lines.append('latency  -')
+
+        if errors:
+            lines.append('errors   ' + '  '.join(
+                ['%s %i' % (code, count) for code, count in
+                 sorted(errors.items(), key=lambda item: -item[1])[:6]]))
+        else:
+            lines.append('errors   none')
+
+        return lines
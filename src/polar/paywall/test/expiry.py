@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+# coding: utf-8
+# Copyright (c) 2012, Polar Mobile.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name Polar Mobile nor the names of its contributors
+#     may be used to endorse or promote products derived from this software
+#     without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL POLAR MOBILE BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from polar.paywall.test.schemas import VALIDATE_SCHEMAS
+
+from polar.paywall.test.subcommand import Subcommand
+
+from polar.paywall.test.validate import Validate
+
+from logging import info, warning
+
+from math import sqrt
+from time import time, sleep
+
+
+class Expiry(Subcommand):
+    '''
+    Called by the expiry subcommand in main. Estimates how long the server
+    keeps sessions alive. Each probe mints a fresh session key and validates
+    it once, at an age picked by a search that narrows in on the expiry time.
+    Keys are not validated twice, since validating may extend a session.
+    '''
+    def run(self, arguments):
+        '''
+        Mints and probes session keys until the expiry time is known to the
+        requested resolution.
+        '''
+        self.validate = Validate()
+        self.share(self.validate)
+
+        # Probe results as (age, valid) pairs.
+        self.observations = []
+
+        minted = 0
+        while not self.done(arguments):
+            if minted >= arguments.keys:
+                warning('Ran out of session keys before reaching the '
+                        'requested resolution.')
+                break
+
+            # The key is minted when the probe is due, so that it is exactly
+            # the target age when it is validated.
+            target = self.get_target(arguments)
+            key = self.mint()
+            minted += 1
+            if key is None:
+                continue
+
+            sleep(max(key[0] + target - time(), 0))
+            self.probe(key)
+
+        self.report()
+
+    def get_bounds(self):
+        '''
+        Returns the longest age a key was seen valid at and the shortest age
+        a key was seen expired at. Keys seen valid after the shortest expiry
+        are ignored, since they only show that expiry times vary.
+        '''
+        expired = [age for age, valid in self.observations if not valid]
+        upper = expired and min(expired) or None
+
+        valid = [age for age, valid in self.observations
+                 if valid and (upper is None or age < upper)]
+        lower = valid and max(valid) or 0
+
+        return lower, upper
+
+    def get_target(self, arguments):
+        '''
+        Returns the age at which the next key should be probed. Until a key
+        has expired, the age doubles. After that, the bounds are bisected.
+        '''
+        lower, upper = self.get_bounds()
+        if upper is None:
+            return min(max(lower * 2, arguments.first_age), arguments.max_age)
+        return (lower + upper) / 2.0
+
+    def done(self, arguments):
+        '''
+        Returns True once the bounds are within the resolution, or no key has
+        expired by the maximum age.
+        '''
+        lower, upper = self.get_bounds()
+        if upper is None:
+            return lower >= arguments.max_age
+        return upper - lower <= arguments.resolution
+
+    def mint(self):
+        '''
+        Authenticates and returns the session key as a (mint time, key) pair,
+        or None if no key could be minted.
+        '''
+        try:
+            connection = self.create_connection()
+            try:
+                return time(), self.validate.get_session_key(connection)
+            finally:
+                connection.close()
+        except Exception, exception:
+            warning('Could not mint a session key: %s' % exception)
+            return None
+
+    def probe(self, key):
+        '''
+        Validates a key once and records whether it was still valid.
+        '''
+        minted, self.validate.session_key = key
+
+        try:
+            connection = self.create_connection()
+            try:
+                url = self.validate.get_url()
+                headers = self.validate.get_headers()
+                age = time() - minted
+                status, headers, body = self.validate.send(
+                    connection, url, headers, '', VALIDATE_SCHEMAS)
+            finally:
+                connection.close()
+        except Exception, exception:
+            warning('Could not validate the key: %s' % exception)
+            return
+
+        # The body is None when the response was not JSON.
+        code = None
+        if isinstance(body, dict) and isinstance(body.get('error'), dict):
+            code = body['error'].get('code')
+
+        if status == 200:
+            valid = True
+        elif status == 401 and code == 'SessionExpired':
+            valid = False
+        else:
+            warning('Validation returned status %s, ignoring the key.' % \
+                    status)
+            return
+
+        info('A key %.0f seconds old is %s.' % \
+             (age, valid and 'valid' or 'expired'))
+        self.observations.append((age, valid))
+
+    def report(self):
+        '''
+        Prints the estimated session lifetime and its spread.
+        '''
+        lower, upper = self.get_bounds()
+        print 'Probes: %i' % len(self.observations)
+
+        if upper is None:
+            print 'No session expired. Sessions last at least %.0fs.' % lower
+            return
+
+        print 'Sessions last between %.0fs and %.0fs.' % (lower, upper)
+
+        # Keys that were valid at an age past the shortest expiry show that
+        # the lifetime varies. The spread is estimated from the ages of all
+        # of the probes in the overlap.
+        longest = max([age for age, valid in self.observations if valid] +
+                      [0])
+        if longest <= upper:
+            print 'Estimated lifetime: %.1fs +/- %.1fs.' % \
+                  ((lower + upper) / 2.0, (upper - lower) / 2.0)
+            return
+
+        overlap = [age for age, valid in self.observations
+                   if upper <= age <= longest]
+        mean = sum(overlap) / len(overlap)
+        deviation = sqrt(sum([(age - mean) ** 2 for age in overlap]) /
+                         len(overlap))
+        print 'Lifetimes vary between %.0fs and %.0fs.' % (upper, longest)
+        print 'Estimated lifetime: %.0fs, standard deviation %.0fs.' % \
+              (mean, deviation)
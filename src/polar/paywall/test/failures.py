@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# coding: utf-8
+# Copyright (c) 2012, Polar Mobile.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name Polar Mobile nor the names of its contributors
+#     may be used to endorse or promote products derived from this software
+#     without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL POLAR MOBILE BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from logging import info, warning
+
+from collections import deque
+from threading import Lock
+from time import time
+
+# The number of recent failures kept as examples.
+EXAMPLES = 100
+
+# The number of characters of a response body kept with an example.
+BODY_SIZE = 4096
+
+
+def truncate(body, size=BODY_SIZE):
+    '''
+    Returns a response body, or the text of a decoded one, cut to size
+    characters. A cut body ends with its original length.
+    '''
+    if not isinstance(body, basestring):
+        body = repr(body)
+    if len(body) <= size:
+        return body
+    return '%s... (%i characters in all)' % (body[:size], len(body))
+
+
+class FailureLog(object):
+    '''
+    Counts failures by test, expected value and actual value, and keeps the
+    most recent failures as examples in a ring of fixed size. The response
+    bodies of examples are truncated, so the ring's memory is bounded. Only the
+    first failure of each kind is logged as it happens, so a misbehaving
+    server costs a counter increment per failure rather than a log line.
+    Messages are only formatted when they are logged.
+    '''
+    def __init__(self, size=EXAMPLES):
+        self.counts = {}
+        self.order = []
+        self.examples = deque(maxlen=size)
+        self.lock = Lock()
+
+    def add(self, test, expected, actual, message, args=(), body=None):
+        '''
+        Records a failure. The message is a format string for args.
+        '''
+        key = (test, expected, actual)
+
+        self.lock.acquire()
+        try:
+            count = self.counts.get(key, 0) + 1
+            self.counts[key] = count
+            if count == 1:
+                self.order.append(key)
+            self.examples.append((time(), test, message, args,
+                                  body is not None and truncate(body) or None))
+        finally:
+            self.lock.release()
+
+        if count == 1:
+            warning(message % args)
+            if body is not None:
+                info(body)
+
+    def total(self):
+        '''
+        Returns the number of failures recorded.
+        '''
+        return sum(self.counts.values())
+
+    def summarize(self):
+        '''
+        Returns a line per kind of failure with its count, in the order the
+        kinds were first seen.
+        '''
+        self.lock.acquire()
+        try:
+            return ['%s: expected %s, got %s, %i failures' % \
+                    (test, expected, actual, self.counts[test, expected,
+                                                         actual])
+                    for test, expected, actual in self.order]
+        finally:
+            self.lock.release()
+
+    def dump(self, force=False):
+        '''
+        Logs the count of each kind of failure at the warning level and the
+        recent examples at the info level. Unless forced, nothing is logged
+        if every failure has already been logged as it happened.
+        '''
+        self.lock.acquire()
+        try:
+            examples = list(self.examples)
+        finally:
+            self.lock.release()
+
+        if not force and self.total() == len(self.counts):
+            return
+
+        for line in self.summarize():
+            warning(line)
+
+        for timestamp, test, message, args, body in examples:
+            info('Example failure in %s: %s' % (test, message % args))
+            if body is not None:
+                info(body)
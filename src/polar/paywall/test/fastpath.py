@@ -0,0 +1,275 @@
+#!/usr/bin/env python
+# coding: utf-8
+# Copyright (c) 2012, Polar Mobile.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name Polar Mobile nor the names of its contributors
+#     may be used to endorse or promote products derived from this software
+#     without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL POLAR MOBILE BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from socket import create_connection, IPPROTO_TCP, TCP_NODELAY
+
+from time import time
+
+# The size of the receive buffer. Response headers must fit in it.
+BUFFER_SIZE = 64 * 1024
+
+# The maximum number of prepared requests kept by a connection.
+CACHE_SIZE = 4096
+
+
+class FastPathError(Exception):
+    '''
+    Raised when a response uses a feature the fast path does not support.
+    '''
+
+
+class FastResponse(object):
+    '''
+    A response read by a FastConnection. Only the status, the Content-Type,
+    Content-Length and Content-Encoding headers, and the body are
+    available.
+    '''
+    def __init__(self, connection, status, msg, length, will_close):
+        self.connection = connection
+        self.status = status
+        self.msg = msg
+
+        # The number of body bytes left to read, or None if the body ends
+        # when the connection is closed.
+        self.length = length
+        self.will_close = will_close
+
+    def getheader(self, name, default=None):
+        return self.msg.get(name, default)
+
+    def read(self, amt=None):
+        '''
+        Reads up to amt bytes of the body, or the rest of the body if amt is
+        None.
+        '''
+        if amt is not None:
+            return self.connection.read_body(self, amt)
+
+        parts = []
+        while True:
+            data = self.connection.read_body(self, BUFFER_SIZE)
+            if not data:
+                return ''.join(parts)
+            parts.append(data)
+
+
+class FastConnection(object):
+    '''
+    A minimal HTTP/1.1 client for load tests. It implements the parts of
+    httplib.HTTPConnection that Subcommand.request uses. Requests are cached
+    as prepared bytes, and responses are parsed from a single receive buffer
+    that is reused for the life of the connection. Responses are read in
+    order, so several requests may be sent before their responses are read.
+    The hostname is sent as the host of requests that do not give one, and
+    the server's certificate is checked against it.
+    '''
+    def __init__(self, host, port, timeout=None, tls=None, hostname=None):
+        self.host = host
+        self.address = (host, port)
+        self.timeout = timeout
+        self.tls = tls
+        self.hostname = hostname or host
+
+        self.sock = None
+        self.buffer = bytearray(BUFFER_SIZE)
+        self.view = memoryview(self.buffer)
+        self.start = 0
+        self.end = 0
+
+        # The last response, which must be read before the next one.
+        self.response = None
+
+        self.prepared = {}
+
+    def connect(self):
+        '''
+        Opens the socket. Nagle's algorithm is disabled since requests are
+        always sent in a single write.
+        '''
+        start = time()
+        self.sock = create_connection(self.address, self.timeout)
+        self.sock.setsockopt(IPPROTO_TCP, TCP_NODELAY, 1)
+
+        # Secure connections share the TLS state of their subcommand.
+        if self.tls is not None:
+            self.tls.record_connect(time() - start)
+            self.sock = self.tls.wrap(self.sock, self.hostname)
+
+        self.start = 0
+        self.end = 0
+        self.response = None
+
+    def close(self):
+        '''
+        Closes the socket and discards any buffered data.
+        '''
+        if self.sock is not None:
+            self.sock.close()
+        self.sock = None
+        self.start = 0
+        self.end = 0
+        self.response = None
+
+    def prepare(self, method, url, body='', headers={}):
+        '''
+        Returns the bytes of a request, building them only the first time the
+        same request is seen.
+        '''
+        key = (method, url, body) + tuple(headers.items())
+        data = self.prepared.get(key)
+        if data is not None:
+            return data
+
+        lines = ['%s %s HTTP/1.1' % (method, url)]
+        if 'Host' not in headers:
+            lines.append('Host: %s' % self.hostname)
+        for name, value in headers.items():
+            lines.append('%s: %s' % (name, value))
+        if 'Content-Length' not in headers:
+            lines.append('Content-Length: %i' % len(body))
+        data = '\r\n'.join(lines) + '\r\n\r\n' + body
+
+        if len(self.prepared) >= CACHE_SIZE:
+            self.prepared.clear()
+        self.prepared[key] = data
+        return data
+
+    def send(self, data):
+        '''
+        Sends prepared request bytes, connecting first if needed.
+        '''
+        if self.sock is None:
+            self.connect()
+        self.sock.sendall(data)
+
+    def request(self, method, url, body=None, headers={}):
+        '''
+        Sends a request.
+        '''
+        self.send(self.prepare(method, url, body or '', headers))
+
+    def fill(self):
+        '''
+        Receives more data into the buffer. Returns the number of bytes
+        received, which is 0 once the server has closed the connection.
+        '''
+        if self.start == self.end:
+            self.start = 0
+            self.end = 0
+
+        elif self.end == len(self.buffer):
+            if self.start == 0:
+                raise FastPathError('The response headers do not fit in the '
+                                    'receive buffer.')
+            data = self.view[self.start:self.end].tobytes()
+            self.buffer[0:len(data)] = data
+            self.start = 0
+            self.end = len(data)
+
+        count = self.sock.recv_into(self.view[self.end:])
+        self.end += count
+        return count
+
+    def getresponse(self):
+        '''
+        Reads the status line and headers of the next response.
+        '''
+        # Skip whatever is left of the last response's body.
+        if self.response is not None and self.response.length:
+            while self.read_body(self.response, BUFFER_SIZE):
+                pass
+
+        while True:
+            index = self.buffer.find('\r\n\r\n', self.start, self.end)
+            if index >= 0:
+                break
+            if not self.fill():
+                self.close()
+                raise FastPathError('The server closed the connection.')
+
+        head = self.view[self.start:index].tobytes()
+        self.start = index + 4
+
+        lines = head.split('\r\n')
+        status = int(lines[0][9:12])
+
+        msg = {}
+        length = None
+        will_close = False
+        for line in lines[1:]:
+            if ':' not in line:
+                continue
+            name, value = line.split(':', 1)
+            name = name.lower()
+            if name == 'content-length':
+                length = int(value)
+                msg['Content-Length'] = value.strip()
+            elif name == 'content-type':
+                msg['Content-Type'] = value.strip()
+            elif name == 'content-encoding':
+                msg['Content-Encoding'] = value.strip()
+            elif name == 'connection':
+                will_close = value.strip().lower() == 'close'
+            elif name == 'transfer-encoding' and \
+                 value.strip().lower() != 'identity':
+                self.close()
+                raise FastPathError('The fast path does not support the %s '
+                                    'transfer encoding.' % value.strip())
+
+        # Responses without a length end when the connection is closed.
+        if length is None:
+            will_close = True
+
+        self.response = FastResponse(self, status, msg, length, will_close)
+        return self.response
+
+    def read_body(self, response, amt):
+        '''
+        Reads up to amt bytes of a response body from the buffer, receiving
+        more data if the buffer is empty.
+        '''
+        if response.length is not None:
+            amt = min(amt, response.length)
+
+        if amt <= 0 or self.sock is None:
+            data = ''
+        else:
+            if self.start == self.end:
+                self.fill()
+
+            count = min(amt, self.end - self.start)
+            data = self.view[self.start:self.start + count].tobytes()
+            self.start += count
+            if response.length is not None:
+                response.length -= count
+
+        finished = not data or response.length == 0
+        if finished and response.will_close:
+            self.close()
+
+        return data
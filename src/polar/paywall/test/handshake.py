@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# coding: utf-8
+# Copyright (c) 2012, Polar Mobile.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name Polar Mobile nor the names of its contributors
+#     may be used to endorse or promote products derived from this software
+#     without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL POLAR MOBILE BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from polar.paywall.test.subcommand import Subcommand, CONNECT_TIMEOUT
+
+from polar.paywall.test.tls import TLS
+
+from polar.paywall.test.pacing import Throttle
+
+from polar.paywall.test.stats import percentiles
+
+from logging import info, error
+
+from socket import create_connection, error as SocketError
+from threading import Thread, Lock
+from time import time
+
+
+class Handshake(Subcommand):
+    '''
+    Called by the handshake subcommand in main. Measures how many TLS
+    handshakes per second the server can complete, without sending any
+    requests.
+    '''
+    def run(self, arguments):
+        '''
+        Performs the handshakes from a number of workers and reports the
+        results.
+        '''
+        if self.config.get('server', 'protocol') != 'https':
+            error('The handshake command needs a server with protocol https.')
+            return
+
+        # The handshakes of this run are counted on a fresh TLS state.
+        self.tls = TLS()
+        self.throttle = Throttle(arguments.rate)
+        self.remaining = arguments.handshakes
+        self.errors = 0
+        self.lock = Lock()
+
+        info('Performing %i TLS handshakes with %i workers.' % \
+             (arguments.handshakes, arguments.workers))
+
+        start = time()
+        workers = []
+        for worker in range(arguments.workers):
+            thread = Thread(target=self.work)
+            thread.start()
+            workers.append(thread)
+
+        for thread in workers:
+            thread.join()
+        elapsed = time() - start
+
+        completed = len(self.tls.handshakes)
+        print 'Handshakes: %i in %.1fs (%.1f/s), %i errors' % \
+              (completed, elapsed, completed / elapsed, self.errors)
+
+        if self.tls.connects:
+            p50, p99 = percentiles(self.tls.connects, [50, 99])
+            print 'TCP connect: p50 %.1fms, p99 %.1fms' % \
+                  (p50 * 1000, p99 * 1000)
+
+        for line in self.tls.summarize():
+            print line
+
+    def take(self):
+        '''
+        Claims the next handshake. Returns False once all have been claimed.
+        '''
+        self.lock.acquire()
+        try:
+            self.remaining -= 1
+            return self.remaining >= 0
+        finally:
+            self.lock.release()
+
+    def work(self):
+        '''
+        Connects, performs a handshake and disconnects until done.
+        '''
+        timeout = self.get_float('limits', 'connect timeout', CONNECT_TIMEOUT)
+        resolver = self.get_resolver()
+
+        while self.take():
+            self.throttle.wait()
+            try:
+                start = time()
+                sock = create_connection(resolver.next(), timeout)
+                self.tls.record_connect(time() - start)
+                self.tls.wrap(sock, resolver.host).close()
+
+            # A certificate that doesn't match the host raises
+            # ssl.CertificateError, which is a ValueError rather than a
+            # socket error.
+            except (SocketError, ValueError), exception:
+                error('Handshake failed: %s' % str(exception))
+                self.lock.acquire()
+                self.errors += 1
+                self.lock.release()
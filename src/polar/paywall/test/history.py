@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# coding: utf-8
+# Copyright (c) 2012, Polar Mobile.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name Polar Mobile nor the names of its contributors
+#     may be used to endorse or promote products derived from this software
+#     without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL POLAR MOBILE BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from logging import warning
+
+from os.path import exists
+
+# Used to key outcomes by the configuration they were produced with.
+try:
+    from hashlib import sha1
+except ImportError:
+    from sha import new as sha1
+
+# Used to store outcomes on disk. Note that in python 2.5 the json module is
+# called simplejson.
+try:
+    from json import loads, dumps
+except ImportError:
+    from simplejson import loads, dumps
+
+# Test outcomes.
+PASSED = 'passed'
+FAILED = 'failed'
+ERRORED = 'error'
+TIMEOUT = 'timeout'
+TOO_LARGE = 'too large'
+NOT_RUN = 'not run'
+
+
+class History(object):
+    '''
+    Persists the outcome of each test between runs. Outcomes are keyed by a
+    hash of the configuration, so changing the configuration means that all
+    of the tests are considered changed.
+    '''
+    def __init__(self, path, config):
+        '''
+        Loads the outcomes of previous runs from path. If path is None, the
+        history is only kept in memory.
+        '''
+        self.path = path
+        self.key = self.hash_config(config)
+        self.runs = self.load()
+
+        # The outcomes of the last run with this configuration and the
+        # outcomes of this run.
+        self.previous = self.runs.get(self.key, {})
+        self.outcomes = {}
+
+    def hash_config(self, config):
+        '''
+        Creates a hash of every option in the configuration.
+        '''
+        digest = sha1()
+        for section in sorted(config.sections()):
+            digest.update('[%s]\n' % section)
+            for option, value in sorted(config.items(section)):
+                digest.update('%s = %s\n' % (option, value))
+        return digest.hexdigest()
+
+    def load(self):
+        '''
+        Reads the history file. A missing or corrupt file is treated as an
+        empty history.
+        '''
+        if self.path is None or not exists(self.path):
+            return {}
+
+        try:
+            history = open(self.path)
+            try:
+                return loads(history.read())
+            finally:
+                history.close()
+
+        except (IOError, ValueError), exception:
+            warning('Could not read the test history: %s' % str(exception))
+            return {}
+
+    def save(self):
+        '''
+        Merges the outcomes of this run into the history file. Tests that
+        were not selected this run keep their previous outcome.
+        '''
+        outcomes = dict(self.previous)
+        outcomes.update(self.outcomes)
+        self.runs[self.key] = outcomes
+
+        if self.path is None:
+            return
+
+        try:
+            history = open(self.path, 'w')
+            try:
+                history.write(dumps(self.runs, indent=1, sort_keys=True))
+            finally:
+                history.close()
+
+        except IOError, exception:
+            warning('Could not save the test history: %s' % str(exception))
+
+    def record(self, name, outcome):
+        '''
+        Records the outcome of a test in this run.
+        '''
+        self.outcomes[name] = outcome
+
+    def passed(self, name):
+        '''
+        Returns True if the test passed the last time it was run with this
+        configuration.
+        '''
+        return self.previous.get(name) == PASSED
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# coding: utf-8
+# Copyright (c) 2012, Polar Mobile.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name Polar Mobile nor the names of its contributors
+#     may be used to endorse or promote products derived from this software
+#     without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL POLAR MOBILE BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from polar.paywall.test.subcommand import Subcommand
+
+from polar.paywall.test.impairment import ImpairmentProxy, get_impairment
+
+from polar.paywall.test.slo import parse_duration
+
+
+class Impair(Subcommand):
+    '''
+    Called by the impair subcommand in main. Runs the impairment proxy on
+    its own, so that other tools, or several runs, can share it.
+    '''
+    # The proxy is the point of the command, so it is not started twice.
+    impaired = False
+
+    def run(self, arguments):
+        '''
+        Serves connections until interrupted, then prints how many were
+        degraded.
+        '''
+        impairment = get_impairment(self.config)
+        if arguments.latency is not None:
+            impairment.latency = parse_duration(arguments.latency)
+        if arguments.jitter is not None:
+            impairment.jitter = parse_duration(arguments.jitter)
+        if arguments.bandwidth is not None:
+            impairment.bandwidth = arguments.bandwidth
+        if arguments.reset is not None:
+            impairment.reset = arguments.reset
+        if arguments.truncate is not None:
+            impairment.truncate = arguments.truncate
+
+        proxy = ImpairmentProxy(self.get_resolver().next(), impairment,
+                                (arguments.host, arguments.port))
+        print 'Listening on %s:%i.' % proxy.address
+
+        try:
+            proxy.running = True
+            proxy.serve()
+        except KeyboardInterrupt:
+            proxy.stop()
+
+        counts = proxy.counts
+        print 'Connections: %i, reset: %i, truncated: %i' % \
+              (counts['connections'], counts['reset'], counts['truncate'])
@@ -0,0 +1,363 @@
+#!/usr/bin/env python
+# coding: utf-8
+# Copyright (c) 2012, Polar Mobile.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name Polar Mobile nor the names of its contributors
+#     may be used to endorse or promote products derived from this software
+#     without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL POLAR MOBILE BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from polar.paywall.test.slo import parse_duration
+
+from logging import info, debug
+
+from random import Random
+from socket import (socket, create_connection, error as SocketError,
+    AF_INET, SOCK_STREAM, SOL_SOCKET, SO_REUSEADDR, SO_LINGER, SHUT_WR,
+    SHUT_RDWR)
+from struct import pack
+from threading import Thread, Lock, currentThread
+from Queue import Queue
+from time import time, sleep
+
+# The number of bytes read from a socket at a time.
+CHUNK_SIZE = 16 * 1024
+
+# Bandwidth limited data is sent in slices of about one packet.
+SLICE_SIZE = 1400
+
+# Seconds to wait for the threads of a connection when the proxy stops.
+STOP_TIMEOUT = 5
+
+
+def shut(connection):
+    '''
+    Shuts a socket down in both directions and closes it. Python keeps a
+    socket open while another thread is blocked reading from it, so the
+    shutdown is what wakes that thread up.
+    '''
+    try:
+        connection.shutdown(SHUT_RDWR)
+    except SocketError:
+        pass
+    connection.close()
+
+
+def reset(connection):
+    '''
+    Closes a socket with a TCP reset rather than a normal close. The socket
+    is shut down first, since python keeps it open while another thread is
+    blocked reading from it, and no reset would be sent until that read
+    returned.
+    '''
+    try:
+        connection.setsockopt(SOL_SOCKET, SO_LINGER, pack('ii', 1, 0))
+        connection.shutdown(SHUT_RDWR)
+    except SocketError:
+        pass
+    connection.close()
+
+
+class Impairment(object):
+    '''
+    The ways a proxied connection is degraded. Latency and jitter, in
+    seconds, are added to each direction. Bandwidth is in bytes per second
+    per direction, or None for no limit. Reset and truncate are the
+    chances that a connection is reset when the first request arrives, or
+    cut off part way through the first response.
+    '''
+    def __init__(self, latency=0, jitter=0, bandwidth=None, reset=0,
+                 truncate=0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.bandwidth = bandwidth
+        self.reset = reset
+        self.truncate = truncate
+
+        # Connections are degraded the same way on every run with a seed.
+        self.random = Random(seed)
+        self.lock = Lock()
+
+    def get_delay(self):
+        '''
+        Returns the delay added to a chunk of data.
+        '''
+        self.lock.acquire()
+        try:
+            jitter = self.jitter and self.random.uniform(-self.jitter,
+                                                         self.jitter)
+        finally:
+            self.lock.release()
+        return max(self.latency + jitter, 0)
+
+    def get_fate(self):
+        '''
+        Returns what happens to a new connection: 'reset', 'truncate' or
+        None.
+        '''
+        self.lock.acquire()
+        try:
+            value = self.random.random()
+        finally:
+            self.lock.release()
+
+        if value < self.reset:
+            return 'reset'
+        if value < self.reset + self.truncate:
+            return 'truncate'
+        return None
+
+
+def get_impairment(config, section='impairment'):
+    '''
+    Creates the impairment described by a section of the config file.
+    '''
+    def get(option, default=None):
+        if config.has_option(section, option):
+            return config.get(section, option)
+        return default
+
+    bandwidth = get('bandwidth')
+    seed = get('seed')
+    return Impairment(parse_duration(get('latency', '0')),
+                      parse_duration(get('jitter', '0')),
+                      bandwidth and int(bandwidth) or None,
+                      float(get('reset', 0)), float(get('truncate', 0)),
+                      seed and int(seed))
+
+
+class ImpairmentProxy(object):
+    '''
+    A local TCP proxy that forwards connections to a target while degrading
+    them. Since it works below HTTP and TLS, any subcommand can be run
+    through it.
+    '''
+    def __init__(self, target, impairment, address=('127.0.0.1', 0)):
+        self.target = target
+        self.impairment = impairment
+
+        self.listener = socket(AF_INET, SOCK_STREAM)
+        self.listener.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
+        self.listener.bind(address)
+        self.listener.listen(128)
+        self.address = self.listener.getsockname()
+
+        self.running = False
+        self.counts = {'connections': 0, 'reset': 0, 'truncate': 0}
+        self.lock = Lock()
+
+        # The accepting thread, and the thread and sockets of each open
+        # connection, so that they can be shut down when the proxy stops.
+        self.thread = None
+        self.connections = {}
+
+    def start(self):
+        '''
+        Accepts connections on a thread of its own.
+        '''
+        self.running = True
+        self.thread = Thread(target=self.serve)
+        self.thread.setDaemon(True)
+        self.thread.start()
+
+    def stop(self):
+        '''
+        Stops accepting connections, shuts down the open ones and waits for
+        their threads to finish.
+        '''
+        self.running = False
+        shut(self.listener)
+        if self.thread is not None:
+            self.thread.join(STOP_TIMEOUT)
+
+        self.lock.acquire()
+        try:
+            connections = self.connections.items()
+        finally:
+            self.lock.release()
+
+        for thread, sockets in connections:
+            for connection in sockets:
+                try:
+                    connection.shutdown(SHUT_RDWR)
+                except SocketError:
+                    pass
+
+        for thread, sockets in connections:
+            thread.join(STOP_TIMEOUT)
+
+    def serve(self):
+        '''
+        Accepts connections until the proxy is stopped.
+        '''
+        info('Impairing connections from %s:%i to %s:%i.' % \
+             (self.address + tuple(self.target)))
+        while self.running:
+            try:
+                client, address = self.listener.accept()
+            except SocketError:
+                break
+
+            thread = Thread(target=self.proxy, args=(client,))
+            thread.setDaemon(True)
+            self.track(thread, [client])
+            thread.start()
+
+    def track(self, thread, sockets):
+        '''
+        Records the sockets of a connection's thread until it finishes.
+        Without sockets, the thread is forgotten.
+        '''
+        self.lock.acquire()
+        try:
+            if sockets:
+                self.connections[thread] = sockets
+            else:
+                self.connections.pop(thread, None)
+        finally:
+            self.lock.release()
+
+    def proxy(self, client):
+        '''
+        Connects a client to the target and forwards data both ways, and
+        returns once both directions are finished.
+        '''
+        try:
+            self.connect(client)
+        finally:
+            self.track(currentThread(), None)
+
+    def connect(self, client):
+        '''
+        Forwards the data of one client connection.
+        '''
+        fate = self.impairment.get_fate()
+        self.lock.acquire()
+        try:
+            self.counts['connections'] += 1
+            if fate:
+                self.counts[fate] += 1
+        finally:
+            self.lock.release()
+
+        try:
+            server = create_connection(self.target)
+        except SocketError, exception:
+            debug('Could not connect to the target: %s' % exception)
+            reset(client)
+            return
+
+        self.track(currentThread(), [client, server])
+
+        # The proxy may have been stopped while the server was connecting.
+        if not self.running:
+            shut(server)
+            shut(client)
+            return
+
+        upstream = Thread(target=self.forward,
+                          args=(client, server, fate == 'reset' and fate))
+        upstream.setDaemon(True)
+        upstream.start()
+        self.forward(server, client, fate == 'truncate' and fate, True)
+        upstream.join()
+
+    def forward(self, source, destination, fate=None, last=False):
+        '''
+        Reads from one socket and writes to the other, through a queue so
+        that delayed data does not hold up reading. The last direction to
+        finish, from the server to the client, closes both sockets. Returns
+        once the queued data is written.
+        '''
+        queue = Queue()
+        writer = Thread(target=self.write,
+                        args=(queue, destination, source, last))
+        writer.setDaemon(True)
+        writer.start()
+
+        while True:
+            try:
+                data = source.recv(CHUNK_SIZE)
+            except SocketError:
+                data = ''
+
+            if data and fate == 'reset':
+                queue.put((0, None, 'reset'))
+                break
+
+            if data and fate == 'truncate':
+                queue.put((time() + self.impairment.get_delay(),
+                           data[:len(data) // 2], 'truncate'))
+                break
+
+            queue.put((time() + self.impairment.get_delay(), data, None))
+            if not data:
+                break
+
+        writer.join()
+
+    def write(self, queue, destination, source, last):
+        '''
+        Sends queued data when it is due, at no more than the bandwidth.
+        Data is never sent before data queued ahead of it.
+        '''
+        while True:
+            due, data, fate = queue.get()
+            if fate == 'reset':
+                reset(destination)
+                reset(source)
+                return
+
+            delay = due - time()
+            if delay > 0:
+                sleep(delay)
+
+            try:
+                if not data:
+                    destination.shutdown(SHUT_WR)
+                    if last:
+                        shut(destination)
+                        shut(source)
+                    return
+                self.send(destination, data)
+            except SocketError:
+                return
+
+            if fate == 'truncate':
+                reset(destination)
+                reset(source)
+                return
+
+    def send(self, destination, data):
+        '''
+        Sends data, in slices paced to the bandwidth if it is limited.
+        '''
+        bandwidth = self.impairment.bandwidth
+        if not bandwidth:
+            destination.sendall(data)
+            return
+
+        for start in xrange(0, len(data), SLICE_SIZE):
+            part = data[start:start + SLICE_SIZE]
+            destination.sendall(part)
+            sleep(float(len(part)) / bandwidth)
+
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+# coding: utf-8
+# Copyright (c) 2012, Polar Mobile.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name Polar Mobile nor the names of its contributors
+#     may be used to endorse or promote products derived from this software
+#     without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL POLAR MOBILE BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from polar.paywall.test.schemas import AUTH_SCHEMAS, VALIDATE_SCHEMAS
+
+from polar.paywall.test.subcommand import Subcommand
+
+from polar.paywall.test.auth import Auth
+from polar.paywall.test.validate import Validate
+
+from polar.paywall.test.memory import Memory, format_growth
+
+from logging import info, error
+
+from sys import exit
+
+
+class Leak(Subcommand):
+    '''
+    Called by the leak subcommand in main. After a warm-up, sends two equal
+    phases of auth and validate requests through the same path the tests
+    use, and fails if the objects or the bytes held by the client grow in
+    both. Memory that is allocated once, such as a cache that fills up,
+    only grows in one phase, while a leak grows in every phase. Leaks in the
+    request and validation path are caught this way before they break a
+    long run.
+    '''
+    entry = 'leak'
+
+    def __call__(self, arguments):
+        Subcommand.__call__(self, arguments)
+
+        # The check is meant to be scripted, so a leak fails the process.
+        if self.failures:
+            exit(1)
+
+    def run(self, arguments):
+        '''
+        Warms up, then measures the memory held before and after each phase.
+        '''
+        self.auth = Auth()
+        self.validate = Validate()
+        self.share(self.auth)
+        self.share(self.validate)
+
+        self.connections = (self.auth.create_connection(),
+                            self.validate.create_connection())
+
+        # Caches and pools fill up during the warm-up, so they are not
+        # mistaken for leaks.
+        info('Warming up with %i requests.' % arguments.warmup)
+        self.send_requests(arguments.warmup)
+
+        memory = Memory()
+        memory.begin()
+        snapshots = [memory.first]
+        sent = []
+        for phase in (1, 2):
+            info('Sending %i requests in phase %i.' % \
+                 (arguments.requests, phase))
+            sent.append(self.send_requests(arguments.requests))
+            snapshots.append(memory.measure())
+        memory.end()
+
+        for connection in self.connections:
+            connection.close()
+
+        self.report(memory, snapshots, sent, arguments)
+
+    def send_requests(self, requests):
+        '''
+        Sends pairs of auth and validate requests, validating the session key
+        each auth request returns. Returns the number of requests sent.
+        '''
+        auth_connection, validate_connection = self.connections
+        sent = 0
+        while sent < requests:
+            try:
+                url, status, headers, body = self.auth.request(
+                    auth_connection, schemas=AUTH_SCHEMAS)
+                sent += 1
+                if status != 200:
+                    continue
+
+                self.validate.session_key = body['sessionKey']
+                self.validate.request(validate_connection,
+                                      schemas=VALIDATE_SCHEMAS)
+                sent += 1
+
+            except Exception, exception:
+                sent += 1
+                error('Request failed: %s' % exception)
+
+        return sent
+
+    def report(self, memory, snapshots, sent, arguments):
+        '''
+        Prints the growth of memory in each phase, and fails if the objects
+        or the bytes held grew by more than their tolerance in both.
+        '''
+        # Traced allocations are counted exactly where they are available.
+        # Otherwise the resident set size is used.
+        measure = 'traced'
+        if snapshots[0]['traced'] is None:
+            measure = 'rss'
+
+        print '%-8s %10s %12s %10s %14s' % \
+              ('phase', 'requests', 'objects', 'per req', 'bytes per req')
+        leaks = {'objects': 0, 'bytes': 0}
+        for phase in (1, 2):
+            before, after = snapshots[phase - 1], snapshots[phase]
+            requests = sent[phase - 1]
+            objects = float(after['objects'] - before['objects']) / requests
+            size = None
+            if after[measure] is not None and before[measure] is not None:
+                size = float(after[measure] - before[measure]) / requests
+
+            print '%-8i %10i %+12i %+10.3f %14s' % \
+                  (phase, requests, after['objects'] - before['objects'],
+                   objects, size is None and '' or '%+.1f' % size)
+
+            if objects > arguments.tolerance:
+                leaks['objects'] += 1
+            if size is not None and size > arguments.byte_tolerance:
+                leaks['bytes'] += 1
+
+        print 'Bytes are measured by %s.' % \
+              (measure == 'rss' and 'the resident set size' or
+               'traced allocations')
+
+        growth = memory.compare(snapshots[1], snapshots[2])
+        if growth:
+            print 'Largest growth in phase 2:'
+            for item in growth:
+                print format_growth(*item)
+
+        failed = [name for name, phases in sorted(leaks.items())
+                  if phases == 2]
+        if failed:
+            self.fail('flat memory', 'growth',
+                      'The %s held by the client grew in both phases.',
+                      (' and '.join(failed),))
+        else:
+            print 'Memory stayed flat.'
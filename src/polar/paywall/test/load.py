@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+# coding: utf-8
+# Copyright (c) 2012, Polar Mobile.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name Polar Mobile nor the names of its contributors
+#     may be used to endorse or promote products derived from this software
+#     without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL POLAR MOBILE BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from polar.paywall.test.schemas import AUTH_SCHEMAS, VALIDATE_SCHEMAS
+
+from polar.paywall.test.subcommand import Subcommand
+
+from polar.paywall.test.auth import Auth
+from polar.paywall.test.validate import Validate
+
+from polar.paywall.test.pool import SessionPool
+
+from polar.paywall.test.pacing import Throttle
+
+from polar.paywall.test.stats import percentiles, Reservoir, merge
+
+from polar.paywall.test.dashboard import Dashboard
+
+from polar.paywall.test.saturation import Saturation
+
+from logging import info, warning
+
+from threading import Thread, Lock
+from time import time
+
+# The suite used to build requests for each entry point, and the schema of a
+# successful response.
+SUITES = {
+    'auth': (Auth, AUTH_SCHEMAS),
+    'validate': (Validate, VALIDATE_SCHEMAS),
+}
+
+
+class Load(Subcommand):
+    '''
+    Called by the load subcommand in main. Sends a stream of requests to one
+    entry point from a number of workers and reports the throughput and
+    latency of the server.
+    '''
+    def run(self, arguments):
+        '''
+        Runs the workers until the duration or number of requests is reached.
+        '''
+        self.target = arguments.entry
+        self.pool = None
+        if self.target == 'validate':
+            self.pool = self.get_pool(arguments.pool)
+
+        self.throttle = Throttle(arguments.rate)
+        self.remaining = arguments.requests
+        self.fast = arguments.fast
+        self.lock = Lock()
+
+        info('Loading the %s entry point with %i workers.' % \
+             (self.target, arguments.workers))
+
+        # Each worker keeps its own results, which are merged at the end.
+        self.results = []
+        workers = []
+
+        self.start = time()
+        self.deadline = self.start + arguments.duration
+
+        # Requests that finish during the warm-up are left out of the report.
+        self.steady = self.start + arguments.warmup
+
+        self.dashboard = None
+        if arguments.live:
+            self.dashboard = Dashboard()
+            self.dashboard.begin()
+
+        # Without a rate there is no schedule to fall behind, so only the
+        # client's CPU and scheduling lag are watched.
+        self.saturation = Saturation(self.throttle.backlog, arguments.workers,
+                                     self.series, self.fast)
+        self.saturation.begin()
+
+        for worker in range(arguments.workers):
+            results = {'latencies': Reservoir(), 'responses': {},
+                       'backends': {}}
+            self.results.append(results)
+
+            thread = Thread(target=self.work, args=(results,))
+            thread.start()
+            workers.append(thread)
+
+        for thread in workers:
+            thread.join()
+
+        self.saturation.end()
+        if self.dashboard:
+            self.dashboard.end()
+
+        self.report(max(time() - self.steady, 0))
+
+    def create_suite(self):
+        '''
+        Creates the suite used by a worker to build and check requests.
+        '''
+        suite_class, schemas = SUITES[self.target]
+        suite = suite_class()
+        self.share(suite)
+        return suite, schemas
+
+    def get_pool(self, path):
+        '''
+        Returns the pool of session keys used to load the validate entry
+        point. Without a pool file, a single key is requested.
+        '''
+        if path:
+            pool = SessionPool(path)
+            if pool.load():
+                return pool
+
+        info('Requesting a session key.')
+        suite, schemas = self.create_suite()
+        connection = suite.create_connection()
+        key = suite.get_session_key(connection)
+        connection.close()
+
+        pool = SessionPool(None)
+        pool.entries.append((key, self.config.get('products', 'valid user')))
+        return pool
+
+    def take(self):
+        '''
+        Claims the next request. Returns False once the run is over.
+        '''
+        if time() >= self.deadline:
+            return False
+
+        if self.remaining is None:
+            return True
+
+        self.lock.acquire()
+        try:
+            self.remaining -= 1
+            return self.remaining >= 0
+        finally:
+            self.lock.release()
+
+    def work(self, results):
+        '''
+        Sends requests on a single connection until the run is over.
+        '''
+        suite, schemas = self.create_suite()
+
+        # With the fast option, the minimal fast path client is used instead
+        # of httplib.
+        connection = self.create_connection(fast=self.fast)
+
+        latencies = results['latencies']
+        responses = results['responses']
+
+        # Each connection is made to a single backend.
+        backend = results['backends'].setdefault(connection.backend,
+                                                 Reservoir())
+
+        shard = self.dashboard and self.dashboard.shard()
+
+        while self.take():
+            self.throttle.wait()
+
+            # Validate requests use the keys in the pool in turn.
+            url = None
+            if self.pool:
+                suite.session_key, product = self.pool.draw()
+                url = suite.get_url(product=product)
+
+            if shard:
+                shard.begin()
+
+            start = time()
+            try:
+                url, status, headers, body = suite.request(
+                    connection, url=url, schemas=schemas)
+                response = str(status)
+                if status != 200:
+                    response = '%s %s' % (status, body['error']['code'])
+
+            except Exception, exception:
+                response = exception.__class__.__name__
+
+            finish = time()
+            if shard:
+                error = None
+                if response != '200':
+                    error = response
+                shard.end(finish - start, error, connection.sock is not None)
+
+            if finish < self.steady:
+                continue
+
+            latencies.append(finish - start)
+            backend.append(finish - start)
+            responses[response] = responses.get(response, 0) + 1
+
+        connection.close()
+
+    def report(self, elapsed):
+        '''
+        Prints the merged results of the workers.
+        '''
+        # Each worker samples its latencies, and the samples are merged.
+        latencies = merge([results['latencies'] for results in self.results])
+        responses = {}
+        backends = {}
+        for results in self.results:
+            for response, count in results['responses'].items():
+                responses[response] = responses.get(response, 0) + count
+            for backend, times in results['backends'].items():
+                backends.setdefault(backend, []).append(times)
+        for backend, reservoirs in backends.items():
+            backends[backend] = merge(reservoirs)
+
+        if not elapsed:
+            print 'The run ended during the warm-up.'
+            return
+
+        print 'Requests: %i in %.1fs (%.1f/s)' % \
+              (len(latencies), elapsed, len(latencies) / elapsed)
+
+        if latencies:
+            p50, p95, p99 = percentiles(latencies, [50, 95, 99])
+            print 'Latency: p50 %.1fms, p95 %.1fms, p99 %.1fms, max %.1fms' % \
+                  (p50 * 1000, p95 * 1000, p99 * 1000,
+                   latencies.maximum * 1000)
+
+        print 'Responses:'
+        for response, count in sorted(responses.items()):
+            print '  %s: %i' % (response, count)
+
+        # Latency is only broken out when the load was spread.
+        if len(backends) > 1:
+            print 'Backends:'
+            for backend, times in sorted(backends.items()):
+                if not times:
+                    continue
+                p50, p99 = percentiles(times, [50, 99])
+                print '  %s: %i requests, p50 %.1fms, p99 %.1fms' % \
+                      (backend, len(times), p50 * 1000, p99 * 1000)
+
+        for line in self.saturation.summarize():
+            warning(line)
@@ -30,11 +30,27 @@
 # subcommands.
 from argparse import ArgumentParser, FileType
 
+from os.path import expanduser
+
 # Subcommands.
 from polar.paywall.test.template import template
 from polar.paywall.test.auth import Auth
 from polar.paywall.test.validate import Validate
 from polar.paywall.test.all import All
+from polar.paywall.test.monitor import Monitor
+from polar.paywall.test.pool import Mint
+from polar.paywall.test.load import Load
+from polar.paywall.test.expiry import Expiry
+from polar.paywall.test.pipeline import Pipeline
+from polar.paywall.test.handshake import Handshake
+from polar.paywall.test.sweep import Sweep
+from polar.paywall.test.contention import Contention
+from polar.paywall.test.compare import Compare
+from polar.paywall.test.replay import Replay
+from polar.paywall.test.compression import Compression
+from polar.paywall.test.impair import Impair
+from polar.paywall.test.leak import Leak
+from polar.paywall.test.burst import Burst
 
 # A number of the commands in this module use random functionality.
 from random import seed
@@ -68,6 +84,20 @@ def get_parser():
     create_auth_parser(subparsers)
     create_validate_parser(subparsers)
     create_all_parser(subparsers)
+    create_monitor_parser(subparsers)
+    create_mint_parser(subparsers)
+    create_load_parser(subparsers)
+    create_expiry_parser(subparsers)
+    create_pipeline_parser(subparsers)
+    create_handshake_parser(subparsers)
+    create_sweep_parser(subparsers)
+    create_contention_parser(subparsers)
+    create_compare_parser(subparsers)
+    create_replay_parser(subparsers)
+    create_compression_parser(subparsers)
+    create_impair_parser(subparsers)
+    create_leak_parser(subparsers)
+    create_burst_parser(subparsers)
 
     return parser
 
@@ -91,6 +121,28 @@ def create_log_level_argument(subparser):
                            choices=choices)
 
 
+def create_selection_arguments(subparser):
+    '''
+    Lets the user select which tests are run, using the outcomes of previous
+    runs stored in a history file.
+    '''
+    help = ('File used to store the outcome of each test between runs.')
+    default = expanduser('~/.paywall.test.history')
+    subparser.add_argument('--history', help=help, default=default)
+
+    help = ('Only run tests whose names contain one of these comma separated '
+            'strings, e.g. "auth.test_model,test_success".')
+    subparser.add_argument('-k', '--keyword', help=help, required=False)
+
+    help = ('Run the tests that failed or have not been run with this '
+            'configuration first.')
+    subparser.add_argument('--failed-first', help=help, action='store_true')
+
+    help = ('Only run the tests that failed or have not been run with this '
+            'configuration.')
+    subparser.add_argument('--only-failed', help=help, action='store_true')
+
+
 def create_subparser(subparsers, name, help, callback):
     '''
     Many of the subcommands in this system follow the same structure.
@@ -99,6 +151,8 @@ def create_subparser(subparsers, name, help, callback):
 
     create_configuration_argument(subparser)
     create_log_level_argument(subparser)
+    create_selection_arguments(subparser)
+    create_workers_argument(subparser, 1)
 
     # Register a callback that will be called if this subparser is selected.
     subparser.set_defaults(callback=callback)
@@ -140,6 +194,451 @@ def create_all_parser(subparsers):
     create_subparser(subparsers, 'all', help, All())
 
 
+def create_monitor_parser(subparsers):
+    '''
+    A subparser for the "monitor" command, which checks a set of publishers
+    on a schedule.
+    '''
+    help = ('Continuously runs the auth and validate tests against a set of '
+            'publishers.')
+    subparser = subparsers.add_parser('monitor', help=help)
+
+    help = ('Paths to the configuration files of the publishers to monitor, '
+            'one per publisher.')
+    subparser.add_argument('configurations', help=help, nargs='+',
+                           type=FileType('r'))
+    create_log_level_argument(subparser)
+
+    help = ('The number of publishers checked at the same time.')
+    subparser.add_argument('--workers', help=help, type=int, default=4)
+
+    help = ('File the health and latency of each publisher is written to.')
+    subparser.add_argument('--state', help=help, default='monitor.json')
+
+    help = ('The number of recent requests used to compute the latency of '
+            'each publisher.')
+    subparser.add_argument('--window', help=help, type=int, default=1000)
+
+    create_memory_argument(subparser)
+
+    subparser.set_defaults(callback=Monitor())
+
+
+def create_workers_argument(subparser, default):
+    '''
+    Lets the user specify the number of threads that send requests.
+    '''
+    help = ('The number of workers sending requests at the same time.')
+    subparser.add_argument('--workers', help=help, type=int, default=default)
+
+
+def create_rate_argument(subparser):
+    '''
+    Lets the user limit the rate of requests.
+    '''
+    help = ('The maximum number of requests sent per second. By default, '
+            'there is no limit.')
+    subparser.add_argument('--rate', help=help, type=float, required=False)
+
+
+def create_series_arguments(subparser):
+    '''
+    Lets the user stream the results of a load style run as a time series,
+    leave the warm-up out of the report and watch the run live.
+    '''
+    help = ('A csv file the number of requests, errors by error code and '
+            'latency percentiles of each second of the run are written to as '
+            'the run progresses.')
+    subparser.add_argument('--series', help=help, required=False,
+                           type=FileType('w'))
+
+    help = ('Seconds at the start of the run whose requests are left out of '
+            'the report.')
+    subparser.add_argument('--warmup', help=help, type=float, default=0)
+
+    help = ('Show a live view of the rate, requests in flight, latency, '
+            'errors and open connections while the run progresses.')
+    subparser.add_argument('--live', help=help, action='store_true')
+
+    create_memory_argument(subparser)
+
+
+def create_memory_argument(subparser):
+    '''
+    Lets the user watch the memory of the client during a long run.
+    '''
+    help = ('Sample the memory of the client every this many seconds, '
+            'logging where it grew and adding it to the series.')
+    subparser.add_argument('--memory', help=help, type=float, required=False)
+
+
+def create_mint_parser(subparsers):
+    '''
+    A subparser for the "mint" command, which fills a pool of session keys
+    for load tests.
+    '''
+    help = ('Authenticates a set of users and stores their session keys in '
+            'a pool for load tests.')
+    subparser = subparsers.add_parser('mint', help=help)
+    create_configuration_argument(subparser)
+    create_log_level_argument(subparser)
+    create_workers_argument(subparser, 4)
+    create_rate_argument(subparser)
+
+    help = ('File the session keys are appended to.')
+    subparser.add_argument('--pool', help=help, default='sessions.pool')
+
+    help = ('A csv file of user credentials. Each column is an auth '
+            'parameter, except for an optional product column. By default, '
+            'the valid user in the configuration is used.')
+    subparser.add_argument('--credentials', help=help, required=False,
+                           type=FileType('r'))
+
+    help = ('The number of session keys to mint. Defaults to one per user.')
+    subparser.add_argument('--count', help=help, type=int, required=False)
+
+    subparser.set_defaults(callback=Mint())
+
+
+def create_load_parser(subparsers):
+    '''
+    A subparser for the "load" command, which measures throughput and
+    latency under load.
+    '''
+    help = ('Sends a stream of requests to an entry point and reports the '
+            'throughput and latency.')
+    subparser = subparsers.add_parser('load', help=help)
+    create_configuration_argument(subparser)
+    create_log_level_argument(subparser)
+    create_workers_argument(subparser, 8)
+    create_rate_argument(subparser)
+
+    create_entry_argument(subparser)
+
+    help = ('A pool of session keys created by the mint command, used to '
+            'load the validate entry point.')
+    subparser.add_argument('--pool', help=help, required=False)
+
+    help = ('How long to run for, in seconds.')
+    subparser.add_argument('--duration', help=help, type=float, default=60)
+
+    help = ('Stop after this many requests.')
+    subparser.add_argument('--requests', help=help, type=int, required=False)
+
+    help = ('Use a minimal HTTP client that uses less CPU per request, so '
+            'that each worker can send more traffic.')
+    subparser.add_argument('--fast', help=help, action='store_true')
+
+    create_series_arguments(subparser)
+
+    subparser.set_defaults(callback=Load())
+
+
+def create_expiry_parser(subparsers):
+    '''
+    A subparser for the "expiry" command, which estimates how long sessions
+    last.
+    '''
+    help = ('Estimates how long the server keeps sessions alive by probing '
+            'session keys of different ages.')
+    subparser = subparsers.add_parser('expiry', help=help)
+    create_configuration_argument(subparser)
+    create_log_level_argument(subparser)
+
+    help = ('The maximum number of session keys to mint, one per probe.')
+    subparser.add_argument('--keys', help=help, type=int, default=32)
+
+    help = ('The age of the first probe, in seconds. Later probes double the '
+            'age until a session expires.')
+    subparser.add_argument('--first-age', help=help, type=float, default=60)
+
+    help = ('Stop once the lifetime is known to within this many seconds.')
+    subparser.add_argument('--resolution', help=help, type=float, default=60)
+
+    help = ('Stop if no session has expired by this age, in seconds.')
+    subparser.add_argument('--max-age', help=help, type=float, default=86400)
+
+    subparser.set_defaults(callback=Expiry())
+
+
+def create_entry_argument(subparser):
+    '''
+    Lets the user pick the entry point a command sends requests to.
+    '''
+    help = ('The entry point to send requests to.')
+    subparser.add_argument('--entry', help=help, default='validate',
+                           choices=('auth', 'validate'))
+
+
+def create_pipeline_parser(subparsers):
+    '''
+    A subparser for the "pipeline" command, which checks whether a server
+    handles pipelined requests.
+    '''
+    help = ('Checks whether the server answers pipelined requests in order, '
+            'and compares them with a kept alive connection.')
+    subparser = subparsers.add_parser('pipeline', help=help)
+    create_configuration_argument(subparser)
+    create_log_level_argument(subparser)
+    create_entry_argument(subparser)
+
+    help = ('The number of requests sent before reading their responses.')
+    subparser.add_argument('--depth', help=help, type=int, default=8)
+
+    help = ('The number of pipelined rounds to send.')
+    subparser.add_argument('--rounds', help=help, type=int, default=100)
+
+    subparser.set_defaults(callback=Pipeline())
+
+
+def create_handshake_parser(subparsers):
+    '''
+    A subparser for the "handshake" command, which measures the TLS
+    handshake throughput of an https server.
+    '''
+    help = ('Measures how many TLS handshakes per second an https server can '
+            'complete.')
+    subparser = subparsers.add_parser('handshake', help=help)
+    create_configuration_argument(subparser)
+    create_log_level_argument(subparser)
+    create_workers_argument(subparser, 8)
+    create_rate_argument(subparser)
+
+    help = ('The number of handshakes to perform.')
+    subparser.add_argument('--handshakes', help=help, type=int, default=200)
+
+    subparser.set_defaults(callback=Handshake())
+
+
+def create_sweep_parser(subparsers):
+    '''
+    A subparser for the "sweep" command, which measures how auth latency
+    grows with the size of the request.
+    '''
+    help = ('Measures how the latency of auth requests grows with the size '
+            'of the request, and where the server starts rejecting them.')
+    subparser = subparsers.add_parser('sweep', help=help)
+    create_configuration_argument(subparser)
+    create_log_level_argument(subparser)
+
+    help = ('The part of the request to grow: the number of device fields, '
+            'the length of the auth parameter values, the length of the '
+            'device fields, or each of them in turn.')
+    subparser.add_argument('--dimension', help=help, default='all',
+                           choices=('keys', 'values', 'device', 'all'))
+
+    help = ('The first size sent.')
+    subparser.add_argument('--start', help=help, type=int, default=1)
+
+    help = ('The factor each size is multiplied by to get the next one.')
+    subparser.add_argument('--factor', help=help, type=float, default=2)
+
+    help = ('The largest size sent.')
+    subparser.add_argument('--max-size', help=help, type=int,
+                           default=65536)
+
+    help = ('The number of times each size is sent.')
+    subparser.add_argument('--repeat', help=help, type=int, default=5)
+
+    subparser.set_defaults(callback=Sweep())
+
+
+def create_contention_parser(subparsers):
+    '''
+    A subparser for the "contention" command, which sends simultaneous auth
+    requests for the same user.
+    '''
+    help = ('Sends bursts of simultaneous auth requests for the same user, '
+            'and checks the latency and that the session keys stay valid.')
+    subparser = subparsers.add_parser('contention', help=help)
+    create_configuration_argument(subparser)
+    create_log_level_argument(subparser)
+
+    help = ('The number of simultaneous requests in each burst.')
+    subparser.add_argument('--size', help=help, type=int, default=8)
+
+    help = ('The number of bursts.')
+    subparser.add_argument('--bursts', help=help, type=int, default=10)
+
+    help = ('A csv file of user credentials, in the format used by mint. '
+            'Bursts for these users are the baseline. By default, the '
+            'baseline is requests for the valid user sent one at a time.')
+    subparser.add_argument('--credentials', help=help, required=False,
+                           type=FileType('r'))
+
+    subparser.set_defaults(callback=Contention())
+
+
+def create_compare_parser(subparsers):
+    '''
+    A subparser for the "compare" command, which runs the tests against the
+    server and a shadow server and compares the responses.
+    '''
+    help = ('Runs the auth and validate tests against the server and the '
+            'shadow server at the same time, and compares their responses '
+            'and latencies.')
+    subparser = subparsers.add_parser('compare', help=help)
+    create_configuration_argument(subparser)
+    create_log_level_argument(subparser)
+    subparser.set_defaults(callback=Compare())
+
+
+def create_replay_parser(subparsers):
+    '''
+    A subparser for the "replay" command, which sends the requests of a log
+    again with their original timing.
+    '''
+    help = ('Replays the auth and validate requests of a log with the time '
+            'between requests of the log, optionally sped up.')
+    subparser = subparsers.add_parser('replay', help=help)
+    create_configuration_argument(subparser)
+    create_log_level_argument(subparser)
+    create_workers_argument(subparser, 8)
+
+    help = ('The log to replay. It is read as it is replayed, so it can be '
+            'larger than memory.')
+    subparser.add_argument('log', help=help, type=FileType('r'))
+
+    help = ('The format of the log: a csv file with timestamp, entry point, '
+            'user and product columns, or an access log in the common or '
+            'combined log format.')
+    subparser.add_argument('--format', help=help, default='csv',
+                           choices=('csv', 'access'))
+
+    help = ('How many times faster than the log to replay it.')
+    subparser.add_argument('--speed', help=help, type=float, default=1)
+
+    help = ('Stop after this many requests.')
+    subparser.add_argument('--limit', help=help, type=int, required=False)
+
+    help = ('A csv file of user credentials, in the format used by mint, '
+            'used to authenticate the users of the log. Other users are '
+            'authenticated as the valid user.')
+    subparser.add_argument('--credentials', help=help, required=False,
+                           type=FileType('r'))
+
+    create_series_arguments(subparser)
+
+    subparser.set_defaults(callback=Replay())
+
+
+def create_compression_parser(subparsers):
+    '''
+    A subparser for the "compression" command, which measures whether
+    compressing responses pays off.
+    '''
+    help = ('Measures the bytes on the wire, compression ratio and added '
+            'latency of each entry point with gzip and deflate responses.')
+    subparser = subparsers.add_parser('compression', help=help)
+    create_configuration_argument(subparser)
+    create_log_level_argument(subparser)
+
+    help = ('The number of requests sent to each entry point with each '
+            'encoding.')
+    subparser.add_argument('--requests', help=help, type=int, default=50)
+
+    subparser.set_defaults(callback=Compression())
+
+
+def create_impair_parser(subparsers):
+    '''
+    A subparser for the "impair" command, which runs a local proxy to the
+    server that degrades the network.
+    '''
+    help = ('Runs a local proxy to the server that adds latency, limits '
+            'bandwidth, and resets or cuts off connections. Options override '
+            'the impairment section of the config file.')
+    subparser = subparsers.add_parser('impair', help=help)
+    create_configuration_argument(subparser)
+    create_log_level_argument(subparser)
+
+    help = ('The address to listen on.')
+    subparser.add_argument('--host', help=help, default='127.0.0.1')
+
+    help = ('The port to listen on.')
+    subparser.add_argument('--port', help=help, type=int, default=8888)
+
+    help = ('Latency added to each direction, e.g. 100ms.')
+    subparser.add_argument('--latency', help=help, required=False)
+
+    help = ('Random variation of the latency, e.g. 20ms.')
+    subparser.add_argument('--jitter', help=help, required=False)
+
+    help = ('Bytes per second allowed in each direction of a connection.')
+    subparser.add_argument('--bandwidth', help=help, type=int,
+                           required=False)
+
+    help = ('The chance that a connection is reset when its first request '
+            'arrives, from 0 to 1.')
+    subparser.add_argument('--reset', help=help, type=float, required=False)
+
+    help = ('The chance that the first response on a connection is cut off '
+            'part way through, from 0 to 1.')
+    subparser.add_argument('--truncate', help=help, type=float,
+                           required=False)
+
+    subparser.set_defaults(callback=Impair())
+
+
+def create_leak_parser(subparsers):
+    '''
+    A subparser for the "leak" command, which checks that the memory of the
+    client stays flat.
+    '''
+    help = ('Sends two equal phases of auth and validate requests and fails '
+            'if the memory held by the client grows in both.')
+    subparser = subparsers.add_parser('leak', help=help)
+    create_configuration_argument(subparser)
+    create_log_level_argument(subparser)
+
+    help = ('The number of requests in each of the two measured phases.')
+    subparser.add_argument('--requests', help=help, type=int, default=5000)
+
+    help = ('The number of requests sent before measuring.')
+    subparser.add_argument('--warmup', help=help, type=int, default=1000)
+
+    help = ('The growth in objects held per request that is tolerated.')
+    subparser.add_argument('--tolerance', help=help, type=float,
+                           default=0.01)
+
+    help = ('The growth in bytes held per request that is tolerated.')
+    subparser.add_argument('--byte-tolerance', help=help, type=float,
+                           default=64)
+
+    subparser.set_defaults(callback=Leak())
+
+
+def create_burst_parser(subparsers):
+    '''
+    A subparser for the "burst" command, which releases many users into the
+    auth and validate flow at once.
+    '''
+    help = ('Connects a number of users, releases them at once into the auth '
+            'and validate flow, and reports how the server drains the burst '
+            'and recovers.')
+    subparser = subparsers.add_parser('burst', help=help)
+    create_configuration_argument(subparser)
+    create_log_level_argument(subparser)
+
+    help = ('The number of users released.')
+    subparser.add_argument('--users', help=help, type=int, default=200)
+
+    help = ('Seconds the users are released over. By default, all of them '
+            'are released at once.')
+    subparser.add_argument('--ramp', help=help, type=float, default=0)
+
+    help = ('A csv file of user credentials, in the format used by mint. '
+            'Users are taken from it in turn. By default, every user is the '
+            'valid user.')
+    subparser.add_argument('--credentials', help=help, required=False,
+                           type=FileType('r'))
+
+    help = ('Seconds after the release to wait for the server to recover.')
+    subparser.add_argument('--recovery', help=help, type=float, default=60)
+
+    subparser.set_defaults(callback=Burst())
+
+
 # If the script is called directly, call the main application.
 if __name__ == '__main__':
     main()
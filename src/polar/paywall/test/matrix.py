@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+# coding: utf-8
+# Copyright (c) 2012, Polar Mobile.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name Polar Mobile nor the names of its contributors
+#     may be used to endorse or promote products derived from this software
+#     without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL POLAR MOBILE BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from polar.paywall.test.schemas import ERROR_SCHEMAS
+
+
+class Case(object):
+    '''
+    A row of the test matrix: a request that differs from the default one in
+    some way, and the response it should get. The url, headers and body of
+    a case are either None, for the default, a value, or a function that is
+    given the suite and returns the value. Cases are grouped into tests by
+    name, and a test is the unit that is selected, budgeted and recorded.
+    '''
+    def __init__(self, test, description, status=200, code=None, url=None,
+                 headers=None, body=None, schemas=ERROR_SCHEMAS, when=None):
+        self.test = test
+        self.description = description
+        self.status = status
+        self.code = code
+        self.url = url
+        self.headers = headers
+        self.body = body
+        self.schemas = schemas
+
+        # A function of the config that tells whether the case applies.
+        self.when = when
+
+    def applies(self, config):
+        return self.when is None or self.when(config)
+
+    def build(self, suite):
+        '''
+        Returns the url, headers and encoded body of the request.
+        '''
+        return suite.prepare_request(resolve(suite, self.url),
+                                     resolve(suite, self.headers),
+                                     resolve(suite, self.body))
+
+
+def resolve(suite, value):
+    '''
+    Returns the value of a field of a case for a suite.
+    '''
+    if callable(value):
+        return value(suite)
+    return value
+
+
+def random_id(suite):
+    return suite.random_id()
+
+
+def random_version(suite):
+    return suite.make_random_version()
+
+
+def has_invalid_user(config):
+    return config.has_section('invalid user')
+
+
+def url(**parts):
+    '''
+    The default url with some of its parts replaced.
+    '''
+    def mutate(suite):
+        values = dict([(name, resolve(suite, value))
+                       for name, value in parts.items()])
+        return suite.get_url(**values)
+    return mutate
+
+
+def with_header(name, value):
+    '''
+    The default headers with one of them replaced.
+    '''
+    def mutate(suite):
+        headers = suite.get_headers()
+        headers[name] = resolve(suite, value)
+        return headers
+    return mutate
+
+
+def without_header(name):
+    '''
+    The default headers with one of them left out.
+    '''
+    def mutate(suite):
+        headers = suite.get_headers()
+        del headers[name]
+        return headers
+    return mutate
+
+
+def with_field(path, value):
+    '''
+    The default body with the field at a dotted path replaced.
+    '''
+    def mutate(suite):
+        body = suite.get_body()
+        parent, name = find(body, path)
+        parent[name] = resolve(suite, value)
+        return body
+    return mutate
+
+
+def without_field(path):
+    '''
+    The default body with the field at a dotted path left out.
+    '''
+    def mutate(suite):
+        body = suite.get_body()
+        parent, name = find(body, path)
+        del parent[name]
+        return body
+    return mutate
+
+
+def find(body, path):
+    '''
+    Returns the object holding the field at a dotted path, and its name.
+    '''
+    names = path.split('.')
+    for name in names[:-1]:
+        body = body[name]
+    return body, names[-1]
+
+
+# The cases shared by every entry point.
+COMMON_CASES = [
+    Case('test_urls', 'an invalid api', 404, 'InvalidAPI',
+         url=url(api='test')),
+    Case('test_urls', 'an invalid version', 404, 'InvalidVersion',
+         url=url(version=random_version)),
+    Case('test_urls', 'an invalid format', 404, 'InvalidFormat',
+         url=url(format='test')),
+
+    Case('test_headers', 'no auth header', 400, 'InvalidAuthScheme',
+         headers=without_header('Authorization')),
+    Case('test_headers', 'no auth token', 400, 'InvalidAuthScheme',
+         headers=with_header('Authorization', '')),
+    Case('test_headers', 'invalid auth token', 400, 'InvalidAuthScheme',
+         headers=with_header('Authorization', random_id)),
+]
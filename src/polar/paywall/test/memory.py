@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+# coding: utf-8
+# Copyright (c) 2012, Polar Mobile.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name Polar Mobile nor the names of its contributors
+#     may be used to endorse or promote products derived from this software
+#     without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL POLAR MOBILE BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from logging import info
+
+from threading import Thread, Event
+from time import time
+
+import gc
+
+try:
+    from resource import getrusage, getpagesize, RUSAGE_SELF
+except ImportError:
+    getrusage = None
+
+# Allocations can only be traced by site from python 3.4 on. Older versions
+# count live objects by type instead.
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+# The number of allocation sites listed when memory grows.
+TOP = 10
+
+
+def get_rss():
+    '''
+    Returns the resident set size of this process in bytes, or None if it
+    can't be measured. Where /proc is not available, the peak is returned.
+    '''
+    try:
+        statm = open('/proc/self/statm')
+        try:
+            return int(statm.read().split()[1]) * getpagesize()
+        finally:
+            statm.close()
+    except (IOError, IndexError, ValueError):
+        pass
+
+    if getrusage is None:
+        return None
+
+    # The peak is given in kilobytes on linux but in bytes on mac.
+    peak = getrusage(RUSAGE_SELF).ru_maxrss
+    if peak < 1 << 30:
+        peak *= 1024
+    return peak
+
+
+def format_growth(site, size, count):
+    '''
+    Returns a line describing the growth at an allocation site.
+    '''
+    if size is None:
+        return '  %s: %+i objects' % (site, count)
+    return '  %s: %+i bytes, %+i objects' % (site, size, count)
+
+
+def count_objects():
+    '''
+    Returns the number of objects tracked by the garbage collector, by type.
+    '''
+    counts = {}
+    for item in gc.get_objects():
+        name = type(item).__name__
+        counts[name] = counts.get(name, 0) + 1
+    return counts
+
+
+class Memory(object):
+    '''
+    Measures the memory of the client: its resident set size, the objects
+    tracked by the garbage collector, and where memory is allocated. Between
+    two snapshots, the growth is broken down by allocation site where
+    allocations are traced, or by type of object where they are not.
+    '''
+    def __init__(self, interval=None, series=None):
+        # How often memory is sampled while running, in seconds.
+        self.interval = interval
+        self.series = series
+
+        self.first = None
+        self.last = None
+        self.stopped = Event()
+        self.thread = None
+
+    def begin(self):
+        '''
+        Takes the first snapshot and starts sampling on a thread of its own
+        if there is an interval.
+        '''
+        if tracemalloc and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.first = self.last = self.measure()
+
+        if self.interval:
+            self.thread = Thread(target=self.watch)
+            self.thread.setDaemon(True)
+            self.thread.start()
+
+    def end(self):
+        '''
+        Stops sampling and takes the last snapshot.
+        '''
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.last = self.measure()
+
+    def measure(self):
+        '''
+        Returns a snapshot of the memory of the process. Garbage is collected
+        first, so that only memory that is still referenced is counted.
+        '''
+        collected = gc.collect()
+        objects = count_objects()
+
+        sites = traced = None
+        if tracemalloc:
+            sites = tracemalloc.take_snapshot()
+            traced = tracemalloc.get_traced_memory()[0]
+
+        return {'time': time(), 'rss': get_rss(), 'collected': collected,
+                'garbage': len(gc.garbage), 'counts': objects,
+                'objects': sum(objects.values()), 'sites': sites,
+                'traced': traced}
+
+    def watch(self):
+        '''
+        Samples memory every interval until stopped, writing each sample to
+        the time series and logging where memory grew since the last one.
+        '''
+        while not self.stopped.wait(self.interval) and \
+              not self.stopped.isSet():
+            previous, self.last = self.last, self.measure()
+
+            if self.series:
+                # Measuring can take a while, so the note goes to the second
+                # it is ready in.
+                second = int(time() - self.series.start)
+                self.series.annotate(second, self.last['objects'], 'objects')
+                if self.last['rss'] is not None:
+                    rss = '%.1f' % (self.last['rss'] / 1048576.0)
+                    self.series.annotate(second, rss, 'rss MB')
+
+            info('Memory: %s' % self.describe(self.last))
+            for growth in self.compare(previous, self.last)[:3]:
+                info(format_growth(*growth))
+
+    def describe(self, snapshot):
+        '''
+        Returns a line describing a snapshot.
+        '''
+        line = '%i objects, %i collected, %i uncollectable' % \
+               (snapshot['objects'], snapshot['collected'],
+                snapshot['garbage'])
+        if snapshot['rss'] is not None:
+            line = '%.1f MB resident, %s' % \
+                   (snapshot['rss'] / 1048576.0, line)
+        return line
+
+    def compare(self, before, after):
+        '''
+        Returns the sites that grew the most between two snapshots, as
+        (site, bytes, objects) tuples. Without traced allocations, the sites
+        are types and the bytes are None.
+        '''
+        if after['sites'] is not None:
+            growth = [(str(stat.traceback), stat.size_diff, stat.count_diff)
+                      for stat in after['sites'].compare_to(before['sites'],
+                                                            'lineno')]
+        else:
+            names = set(before['counts']) | set(after['counts'])
+            growth = [(name, None, after['counts'].get(name, 0) - \
+                       before['counts'].get(name, 0)) for name in names]
+
+        growth = [item for item in growth if (item[1] or 0) > 0 or item[2] > 0]
+        growth.sort(key=lambda item: (item[1] or 0, item[2]), reverse=True)
+        return growth[:TOP]
+
+    def summarize(self):
+        '''
+        Returns lines describing how memory changed over the whole run.
+        '''
+        first, last = self.first, self.last
+        lines = ['Memory at the start: %s' % self.describe(first),
+                 'Memory at the end: %s' % self.describe(last)]
+
+        growth = self.compare(first, last)
+        if growth:
+            lines.append('Largest growth:')
+            for item in growth:
+                lines.append(format_growth(*item))
+        return lines
@@ -0,0 +1,324 @@
+#!/usr/bin/env python
+# coding: utf-8
+# Copyright (c) 2012, Polar Mobile.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name Polar Mobile nor the names of its contributors
+#     may be used to endorse or promote products derived from this software
+#     without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL POLAR MOBILE BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from polar.paywall.test.subcommand import Subcommand
+
+from polar.paywall.test.auth import Auth
+from polar.paywall.test.validate import Validate
+
+from polar.paywall.test.history import History, PASSED, ERRORED
+
+from polar.paywall.test.stats import percentiles
+
+from polar.paywall.test.memory import Memory
+
+from logging import info, warning, error
+
+from traceback import format_exc
+
+from collections import deque
+from heapq import heappush, heappop
+from threading import Thread, Condition
+from Queue import Queue
+
+# Used to detect idle connections that the server has closed.
+from select import select
+
+from os import rename
+from os.path import basename
+from time import time
+
+# Note that in python 2.5 the json module is called simplejson.
+try:
+    from json import dumps
+except ImportError:
+    from simplejson import dumps
+
+# Defaults for the monitor section of a publisher's configuration, in
+# seconds.
+INTERVAL = 60.0
+SESSION_LIFETIME = 300.0
+
+
+def close_if_dropped(connection):
+    '''
+    Closes an idle connection if the server has closed its end. An idle
+    socket only becomes readable when the server closes it, so the next
+    request will reconnect instead of failing.
+    '''
+    if connection.sock is None:
+        return
+
+    readable, writable, errors = select([connection.sock], [], [], 0)
+    if readable:
+        connection.close()
+
+
+class Publisher(object):
+    '''
+    A publisher being monitored. Its connections and session key are kept
+    between checks.
+    '''
+    def __init__(self, name, config, window):
+        self.name = name
+        self.auth = Auth()
+        self.validate = Validate()
+
+        self.auth.config = config
+        self.validate.config = config
+        self.validate.session_lifetime = self.auth.get_float(
+            'monitor', 'session lifetime', SESSION_LIFETIME)
+
+        self.interval = self.auth.get_float('monitor', 'interval', INTERVAL)
+        self.connections = {}
+
+        # The rolling state of the publisher.
+        self.latencies = deque(maxlen=window)
+        self.state = {'checks': 0, 'consecutive failures': 0}
+
+    def get_connection(self, suite):
+        '''
+        Returns the warm connection used by a suite, creating it if needed.
+        '''
+        connection = self.connections.get(suite.entry)
+        if connection is None:
+            connection = suite.create_connection()
+            self.connections[suite.entry] = connection
+
+        close_if_dropped(connection)
+        return connection
+
+    def run_suite(self, suite):
+        '''
+        Runs the tests of a suite. If the suite raises, for example because
+        no session key could be fetched, the tests it did not finish are
+        recorded as errors and its connection is dropped.
+        '''
+        suite.latencies = {}
+        try:
+            suite.run_suite(self.get_connection(suite))
+        except Exception, exception:
+            warning('%s: %s tests errored: %s' % (self.name, suite.entry,
+                                                  exception))
+            outcomes = suite.history.outcomes
+            for test in suite.get_tests():
+                name = suite.get_test_name(test)
+                if name not in outcomes:
+                    suite.record(name, ERRORED)
+
+            connection = self.connections.pop(suite.entry, None)
+            if connection is not None:
+                connection.close()
+
+        for latencies in suite.latencies.values():
+            self.latencies.extend(latencies)
+
+    def check(self):
+        '''
+        Runs the auth and validate tests once and updates the state of the
+        publisher.
+        '''
+        start = time()
+
+        # Every check gets its own budget and an in memory history that
+        # collects the outcome of each test.
+        self.auth.budget = self.auth.create_budget()
+        self.auth.history = History(None, self.auth.config)
+        self.auth.share(self.validate)
+
+        for suite in (self.auth, self.validate):
+            self.run_suite(suite)
+
+        outcomes = self.auth.history.outcomes
+        failed = sorted([name for name, outcome in outcomes.items()
+                         if outcome != PASSED])
+
+        # A failing validate suite may mean that the cached session key has
+        # expired.
+        if [name for name in failed if name.startswith('validate.')]:
+            self.validate.session_key = None
+
+        consecutive = 0
+        if failed:
+            consecutive = self.state['consecutive failures'] + 1
+
+        # The state is replaced rather than updated, since it may be saved by
+        # another worker at any time.
+        p50, p95, p99 = percentiles(self.latencies, [50, 95, 99])
+        self.state = {
+            'healthy': not failed,
+            'failed': failed,
+            'checks': self.state['checks'] + 1,
+            'consecutive failures': consecutive,
+            'last check': start,
+            'duration': time() - start,
+            'latency': {'p50': p50, 'p95': p95, 'p99': p99,
+                        'samples': len(self.latencies)},
+        }
+
+        return failed
+
+
+class Monitor(Subcommand):
+    '''
+    Called by the monitor subcommand in main. Checks a set of publishers on a
+    schedule from a long running process, keeping connections and session
+    keys warm between checks.
+    '''
+    def __call__(self, arguments):
+        '''
+        Sets up logging and reads the configuration of every publisher.
+        '''
+        self.set_log_level(arguments.logLevel)
+
+        self.publishers = []
+        for configuration in arguments.configurations:
+            config = self.parse_config(configuration)
+            name = basename(configuration.name)
+            if config.has_option('monitor', 'name'):
+                name = config.get('monitor', 'name')
+            self.publishers.append(Publisher(name, config, arguments.window))
+
+        # The monitor runs for days, so it can log where its memory grows.
+        memory = None
+        if arguments.memory:
+            memory = Memory(arguments.memory)
+            memory.begin()
+
+        self.run(arguments)
+
+        if memory:
+            memory.end()
+            for line in memory.summarize():
+                info(line)
+
+    def run(self, arguments):
+        '''
+        Schedules publisher checks on a pool of workers until interrupted.
+        '''
+        info('Monitoring %i publishers.' % len(self.publishers))
+
+        self.state_path = arguments.state
+        self.condition = Condition()
+        self.queue = Queue()
+
+        # A heap of (time, index) pairs giving the next check of each
+        # publisher that is not being checked.
+        self.schedule = []
+        now = time()
+        for index in range(len(self.publishers)):
+            heappush(self.schedule, (now, index))
+
+        for worker in range(arguments.workers):
+            thread = Thread(target=self.work)
+            thread.setDaemon(True)
+            thread.start()
+
+        try:
+            self.dispatch()
+        except KeyboardInterrupt:
+            info('Stopping the monitor.')
+
+        self.save_state()
+
+    def dispatch(self):
+        '''
+        Hands publishers to the workers as their checks come due.
+        '''
+        while True:
+            self.condition.acquire()
+            try:
+                while not self.schedule or self.schedule[0][0] > time():
+                    timeout = 1.0
+                    if self.schedule:
+                        timeout = min(self.schedule[0][0] - time(), timeout)
+                    self.condition.wait(max(timeout, 0))
+
+                due, index = heappop(self.schedule)
+            finally:
+                self.condition.release()
+
+            self.queue.put((due, index))
+
+    def work(self):
+        '''
+        Checks publishers handed out by dispatch and reschedules them.
+        '''
+        while True:
+            due, index = self.queue.get()
+            publisher = self.publishers[index]
+
+            try:
+                failed = publisher.check()
+                if failed:
+                    warning('%s: failed %s.' % (publisher.name,
+                                                ', '.join(failed)))
+                else:
+                    info('%s: healthy.' % publisher.name)
+
+            except Exception, exception:
+                error(format_exc())
+                error(exception)
+
+            self.save_state()
+
+            # Checks that overrun their interval are run again immediately,
+            # rather than being queued up.
+            self.condition.acquire()
+            try:
+                when = max(due + publisher.interval, time())
+                heappush(self.schedule, (when, index))
+                self.condition.notify()
+            finally:
+                self.condition.release()
+
+    def save_state(self):
+        '''
+        Writes the state of every publisher to the state file. The file is
+        replaced atomically so readers never see a partial write.
+        '''
+        self.condition.acquire()
+        try:
+            state = {'updated': time(), 'publishers': {}}
+            for publisher in self.publishers:
+                state['publishers'][publisher.name] = publisher.state
+
+            path = self.state_path + '.tmp'
+            try:
+                output = open(path, 'w')
+                try:
+                    output.write(dumps(state, indent=1, sort_keys=True))
+                finally:
+                    output.close()
+                rename(path, self.state_path)
+
+            except (IOError, OSError), exception:
+                warning('Could not save the monitor state: %s' % \
+                        str(exception))
+        finally:
+            self.condition.release()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# coding: utf-8
+# Copyright (c) 2012, Polar Mobile.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name Polar Mobile nor the names of its contributors
+#     may be used to endorse or promote products derived from this software
+#     without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL POLAR MOBILE BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from threading import Lock, Condition
+from time import time, sleep
+
+
+class Throttle(object):
+    '''
+    Spaces out events shared by a number of threads so that they happen at
+    no more than a fixed rate. A rate of None means no limit.
+    '''
+    def __init__(self, rate=None):
+        self.interval = rate and 1.0 / rate
+        self.next = time()
+        self.late = 0
+        self.lock = Lock()
+
+    def wait(self):
+        '''
+        Blocks until the calling thread's slot comes up.
+        '''
+        if not self.interval:
+            return
+
+        self.lock.acquire()
+        try:
+            # Slots that were missed are dropped rather than caught up on.
+            self.late = max(time() - self.next, 0)
+            slot = max(self.next, time())
+            self.next = slot + self.interval
+        finally:
+            self.lock.release()
+
+        delay = slot - time()
+        if delay > 0:
+            sleep(delay)
+
+    def backlog(self):
+        '''
+        Returns the number of slots missed before the last one was taken,
+        which is the number of requests the workers fell behind by.
+        '''
+        if not self.interval:
+            return None
+        return int(self.late / self.interval)
+
+
+class BrokenBarrier(Exception):
+    '''
+    Raised by Barrier.wait when the barrier was aborted.
+    '''
+
+
+class Barrier(object):
+    '''
+    Blocks a fixed number of threads until all of them are waiting, then
+    releases them together. The barrier can be waited on again once the
+    threads are released. A thread that can't reach the barrier aborts it,
+    so that the others are not left waiting forever.
+    '''
+    def __init__(self, parties):
+        self.parties = parties
+        self.waiting = 0
+        self.generation = 0
+        self.broken = False
+        self.condition = Condition()
+
+    def wait(self):
+        '''
+        Blocks until all of the parties are waiting. Raises BrokenBarrier if
+        the barrier is aborted.
+        '''
+        self.condition.acquire()
+        try:
+            if self.broken:
+                raise BrokenBarrier()
+
+            generation = self.generation
+            self.waiting += 1
+            if self.waiting == self.parties:
+                self.waiting = 0
+                self.generation += 1
+                self.condition.notifyAll()
+                return
+
+            while generation == self.generation and not self.broken:
+                self.condition.wait()
+
+            if generation == self.generation:
+                raise BrokenBarrier()
+        finally:
+            self.condition.release()
+
+    def abort(self):
+        '''
+        Breaks the barrier, waking up every thread waiting on it.
+        '''
+        self.condition.acquire()
+        try:
+            self.broken = True
+            self.condition.notifyAll()
+        finally:
+            self.condition.release()
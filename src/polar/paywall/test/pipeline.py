@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# coding: utf-8
+# Copyright (c) 2012, Polar Mobile.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name Polar Mobile nor the names of its contributors
+#     may be used to endorse or promote products derived from this software
+#     without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL POLAR MOBILE BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from polar.paywall.test.schemas import ERROR_SCHEMAS
+
+from polar.paywall.test.subcommand import Subcommand
+
+from polar.paywall.test.load import SUITES
+
+from polar.paywall.test.fastpath import FastPathError
+
+from polar.paywall.test.stats import percentiles
+
+from logging import info, warning
+
+from random import choice
+from socket import error as SocketError
+from time import time
+
+
+class Pipeline(Subcommand):
+    '''
+    Called by the pipeline subcommand in main. Measures whether the server
+    answers pipelined requests correctly, and how throughput and latency
+    compare with sending one request at a time over a kept alive connection.
+    '''
+    def run(self, arguments):
+        '''
+        Runs the keep alive baseline and then the pipelined requests.
+        '''
+        suite_class, schemas = SUITES[arguments.entry]
+        self.suite = suite_class()
+        self.share(self.suite)
+
+        # Pipelining needs the fast path client, since httplib can only have
+        # one request outstanding.
+        connection = self.create_connection(fast=True)
+        if arguments.entry == 'validate':
+            self.suite.session_key = self.suite.get_session_key(connection)
+
+        # Successful requests are mixed with requests for an invalid
+        # product, so that responses returned out of order are detected.
+        requests = [
+            self.prepare(connection, self.suite.get_url(), 200, schemas),
+            self.prepare(connection,
+                         self.suite.get_url(product=self.random_id()),
+                         404, ERROR_SCHEMAS),
+        ]
+
+        info('Measuring the keep alive baseline.')
+        baseline = self.measure(connection, requests, arguments.rounds *
+                                arguments.depth, 1)
+
+        info('Measuring %i pipelined requests at a time.' % arguments.depth)
+        pipelined = self.measure(connection, requests, arguments.rounds,
+                                 arguments.depth)
+
+        connection.close()
+
+        print '%-12s %9s %9s %9s %9s %7s' % \
+              ('mode', 'requests', 'rate/s', 'p50 ms', 'p99 ms', 'errors')
+        self.report('keep alive', baseline)
+        self.report('depth %i' % arguments.depth, pipelined)
+
+        if pipelined['errors']:
+            print 'Pipelining is not safe with this server.'
+        else:
+            print 'Pipelining is safe with this server.'
+
+    def prepare(self, connection, url, status, schemas):
+        '''
+        Returns the bytes of a request with the status and schemas expected
+        in its response.
+        '''
+        url, headers, body = self.suite.prepare_request(url=url)
+        return connection.prepare('POST', url, body, headers), status, schemas
+
+    def measure(self, connection, requests, rounds, depth):
+        '''
+        Sends rounds of depth requests, writing each round before reading any
+        of its responses. The latency of a request runs from the moment its
+        round is sent until its response has been read.
+        '''
+        latencies = []
+        errors = 0
+
+        start = time()
+        for round in xrange(rounds):
+            batch = [choice(requests) for index in xrange(depth)]
+
+            try:
+                self.open_connection(connection)
+                sent = time()
+                connection.send(''.join([data for data, status, schemas
+                                         in batch]))
+
+                for data, status, schemas in batch:
+                    if not self.check(connection.getresponse(), status,
+                                      schemas):
+                        errors += 1
+                    latencies.append(time() - sent)
+
+            except (FastPathError, SocketError, ValueError), exception:
+                warning('Pipelined round failed: %s' % str(exception))
+                errors += 1
+                connection.close()
+
+        return {'elapsed': time() - start, 'latencies': latencies,
+                'errors': errors}
+
+    def check(self, response, status, schemas):
+        '''
+        Returns True if a response has the expected status and matches its
+        schema.
+        '''
+        failures = self.suite.failures
+        body = self.suite.read_body(response, schemas)
+
+        if response.status != status:
+            self.suite.fail(status, response.status,
+                            'Expected status %s but got %s. The response may '
+                            'be out of order.', (status, response.status))
+            return False
+
+        self.suite.check_response(body, schemas)
+        return self.suite.failures == failures
+
+    def report(self, mode, results):
+        '''
+        Prints one row of the results table.
+        '''
+        latencies = results['latencies']
+        p50, p99 = percentiles(latencies, [50, 99])
+        rate = len(latencies) / results['elapsed']
+        print '%-12s %9i %9.1f %9.2f %9.2f %7i' % \
+              (mode, len(latencies), rate, (p50 or 0) * 1000,
+               (p99 or 0) * 1000, results['errors'])
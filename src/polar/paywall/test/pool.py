@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+# coding: utf-8
+# Copyright (c) 2012, Polar Mobile.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name Polar Mobile nor the names of its contributors
+#     may be used to endorse or promote products derived from this software
+#     without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL POLAR MOBILE BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from polar.paywall.test.schemas import AUTH_SCHEMAS
+
+from polar.paywall.test.subcommand import Subcommand
+
+from polar.paywall.test.auth import Auth
+
+from polar.paywall.test.pacing import Throttle
+
+from logging import info, warning, error
+
+from traceback import format_exc
+
+from csv import DictReader
+from threading import Thread, Lock
+from Queue import Queue, Empty
+
+
+def read_credentials(credentials, default_product):
+    '''
+    Reads a csv file of user credentials. Each column except product is an
+    auth parameter. Users without a product are given the default product.
+    Returns a list of (auth params, product) pairs.
+    '''
+    result = []
+    for row in DictReader(credentials):
+        product = row.pop('product', None) or default_product
+        result.append((row, product))
+    return result
+
+
+class SessionPool(object):
+    '''
+    A file of session keys and the products they were issued for, one pair
+    per line separated by a tab. Keys can be appended by a number of threads
+    and drawn in turn by a number of threads.
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.entries = []
+        self.index = 0
+        self.lock = Lock()
+
+    def load(self):
+        '''
+        Reads the pool from disk.
+        '''
+        pool = open(self.path)
+        try:
+            self.entries = [tuple(line.rstrip('\n').split('\t', 1))
+                            for line in pool if line.strip()]
+        finally:
+            pool.close()
+
+        return self.entries
+
+    def add(self, session_key, product):
+        '''
+        Appends a session key to the pool on disk.
+        '''
+        self.lock.acquire()
+        try:
+            pool = open(self.path, 'a')
+            try:
+                pool.write('%s\t%s\n' % (session_key, product))
+            finally:
+                pool.close()
+
+            self.entries.append((session_key, product))
+        finally:
+            self.lock.release()
+
+    def draw(self):
+        '''
+        Returns the next (session key, product) pair, cycling through the
+        pool.
+        '''
+        self.lock.acquire()
+        try:
+            entry = self.entries[self.index % len(self.entries)]
+            self.index += 1
+            return entry
+        finally:
+            self.lock.release()
+
+
+class Mint(Subcommand):
+    '''
+    Called by the mint subcommand in main. Authenticates a set of users at a
+    controlled rate and stores the session keys in a pool for load tests.
+    '''
+    def run(self, arguments):
+        '''
+        Mints session keys on a number of workers.
+        '''
+        product = self.config.get('products', 'valid user')
+        if arguments.credentials:
+            users = read_credentials(arguments.credentials, product)
+        else:
+            auth = Auth()
+            self.share(auth)
+            users = [(auth.get_body()['authParams'], product)]
+
+        count = arguments.count or len(users)
+        info('Minting %i session keys.' % count)
+
+        self.pool = SessionPool(arguments.pool)
+        self.throttle = Throttle(arguments.rate)
+        self.minted = 0
+        self.rejected = 0
+        self.lock = Lock()
+
+        # Credentials are reused in turn if more keys than users are needed.
+        self.queue = Queue()
+        for index in xrange(count):
+            self.queue.put(users[index % len(users)])
+
+        workers = []
+        for worker in range(arguments.workers):
+            thread = Thread(target=self.work)
+            thread.start()
+            workers.append(thread)
+
+        for thread in workers:
+            thread.join()
+
+        info('Minted %i session keys. %i requests were rejected.' % \
+             (self.minted, self.rejected))
+
+    def work(self):
+        '''
+        Authenticates users from the queue until it is empty.
+        '''
+        auth = Auth()
+        self.share(auth)
+        connection = auth.create_connection()
+
+        while True:
+            try:
+                auth_params, product = self.queue.get_nowait()
+            except Empty:
+                break
+
+            self.throttle.wait()
+            try:
+                url = auth.get_url(product=product)
+                body = auth.get_body(auth_params=auth_params)
+                url, status, headers, body = auth.request(
+                    connection, url=url, body=body, schemas=AUTH_SCHEMAS)
+
+                if status != 200:
+                    warning('Authentication returned status %s.' % status)
+                    self.count('rejected')
+                    continue
+
+                self.pool.add(body['sessionKey'], product)
+                self.count('minted')
+
+            except Exception, exception:
+                error(format_exc())
+                error(exception)
+                self.count('rejected')
+
+        connection.close()
+
+    def count(self, name):
+        '''
+        Increments one of the counters shared by the workers.
+        '''
+        self.lock.acquire()
+        try:
+            setattr(self, name, getattr(self, name) + 1)
+        finally:
+            self.lock.release()
@@ -0,0 +1,357 @@
+#!/usr/bin/env python
+# coding: utf-8
+# Copyright (c) 2012, Polar Mobile.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name Polar Mobile nor the names of its contributors
+#     may be used to endorse or promote products derived from this software
+#     without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL POLAR MOBILE BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from polar.paywall.test.schemas import AUTH_SCHEMAS, VALIDATE_SCHEMAS
+
+from polar.paywall.test.subcommand import Subcommand
+
+from polar.paywall.test.auth import Auth
+from polar.paywall.test.validate import Validate
+
+from polar.paywall.test.pool import read_credentials
+
+from polar.paywall.test.stats import percentiles, Reservoir
+
+from polar.paywall.test.dashboard import Dashboard
+
+from polar.paywall.test.saturation import Saturation
+
+from logging import info, warning
+
+from calendar import timegm
+from csv import reader
+from re import compile
+from threading import Thread, Lock
+from Queue import Queue
+from time import time, sleep, strptime
+
+# Matches the user, time and request line of an access log in the common
+# or combined log format.
+ACCESS_LOG = compile(r'^\S+ \S+ (\S+) \[([^\]]+)\] "\S+ (\S+)')
+
+# Formats of the timestamps in a csv log, after any fraction of a second is
+# removed. Timestamps may also be seconds since the epoch.
+TIME_FORMATS = ('%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M:%S')
+
+# The format of the timestamps in an access log, without the time zone.
+ACCESS_TIME_FORMAT = '%d/%b/%Y:%H:%M:%S'
+
+# The number of requests per worker that may be read ahead of the clock.
+READ_AHEAD = 16
+
+# The entry points that can be replayed.
+SCHEMAS = {'auth': AUTH_SCHEMAS, 'validate': VALIDATE_SCHEMAS}
+
+
+def parse_time(value, formats):
+    '''
+    Returns a timestamp as seconds since the epoch, or None if it is not in
+    any of the formats. Since only the time between requests matters, time
+    zones are ignored.
+    '''
+    try:
+        return float(value)
+    except ValueError:
+        pass
+
+    fraction = 0.0
+    if '.' in value:
+        value, digits = value.split('.', 1)
+        try:
+            fraction = float('0.' + digits.rstrip('Z'))
+        except ValueError:
+            return None
+
+    for format in formats:
+        try:
+            return timegm(strptime(value.rstrip('Z'), format)) + fraction
+        except ValueError:
+            pass
+    return None
+
+
+def read_csv(log):
+    '''
+    Yields (timestamp, entry, user, product) tuples from a csv log with one
+    request per row. Rows that cannot be parsed, such as a header, are
+    yielded as None.
+    '''
+    for row in reader(log):
+        timestamp = len(row) >= 4 and parse_time(row[0], TIME_FORMATS)
+        if timestamp is None or timestamp is False:
+            yield None
+            continue
+        yield timestamp, row[1].strip(), row[2].strip(), row[3].strip()
+
+
+def read_access_log(log):
+    '''
+    Yields (timestamp, entry, user, product) tuples from an access log. The
+    entry and product are taken from the path of each request. Lines that
+    are not requests to the proxy api are yielded as None.
+    '''
+    for line in log:
+        match = ACCESS_LOG.match(line)
+        if not match:
+            yield None
+            continue
+
+        user, timestamp, path = match.groups()
+        timestamp = parse_time(timestamp.split(' ')[0], (ACCESS_TIME_FORMAT,))
+        parts = path.split('?')[0].split('/')
+        if timestamp is None or len(parts) != 6:
+            yield None
+            continue
+
+        yield timestamp, parts[4], user, parts[5]
+
+
+class Replay(Subcommand):
+    '''
+    Called by the replay subcommand in main. Streams a log of requests and
+    sends each of them again, with the time between requests of the log,
+    optionally sped up. Auth requests are built for the log's users from a
+    credentials file, and validate requests use the session key of the
+    user's last replayed auth request.
+    '''
+    def run(self, arguments):
+        '''
+        Reads the log on this thread and sends the requests from a number of
+        workers.
+        '''
+        self.speed = arguments.speed
+        self.lock = Lock()
+        self.results = {'latencies': {}, 'responses': {},
+                        'lateness': Reservoir(), 'skipped': 0}
+
+        validate = Validate()
+        self.share(validate)
+
+        auth = Auth()
+        self.share(auth)
+        self.default_params = auth.get_body()['authParams']
+
+        self.credentials = {}
+        if arguments.credentials:
+            product = self.config.get('products', 'valid user')
+            for auth_params, product in read_credentials(
+                    arguments.credentials, product):
+                self.credentials[auth_params.get('username')] = auth_params
+
+        # Users whose auth requests have not been replayed yet are validated
+        # with the valid user's key.
+        connection = validate.create_connection()
+        self.session_keys = {None: validate.get_session_key(connection)}
+        connection.close()
+
+        self.dashboard = None
+        if arguments.live:
+            self.dashboard = Dashboard()
+
+        self.queue = Queue(arguments.workers * READ_AHEAD)
+        workers = []
+        for worker in range(arguments.workers):
+            thread = Thread(target=self.work)
+            thread.start()
+            workers.append(thread)
+
+        if arguments.format == 'access':
+            requests = read_access_log(arguments.log)
+        else:
+            requests = read_csv(arguments.log)
+
+        info('Replaying %s at %gx speed with %i workers.' % \
+             (arguments.log.name, self.speed, arguments.workers))
+        self.start = time()
+        self.steady = self.start + arguments.warmup
+        self.first = None
+        self.last = None
+        if self.dashboard:
+            self.dashboard.begin()
+
+        # Requests in the queue are due but have no free worker to send them.
+        self.saturation = Saturation(self.queue.qsize, arguments.workers,
+                                     self.series)
+        self.saturation.begin()
+        self.dispatch(requests, arguments.limit)
+
+        for thread in workers:
+            self.queue.put(None)
+        for thread in workers:
+            thread.join()
+
+        self.saturation.end()
+        if self.dashboard:
+            self.dashboard.end()
+
+        self.report(time() - self.start)
+
+    def dispatch(self, requests, limit):
+        '''
+        Queues each request of the log when its time comes. The queue is
+        bounded, so the log is never read far ahead of the clock.
+        '''
+        count = 0
+        for request in requests:
+            if request is None or request[1] not in SCHEMAS:
+                self.results['skipped'] += 1
+                continue
+
+            if limit is not None and count >= limit:
+                break
+            count += 1
+
+            timestamp = request[0]
+            if self.first is None:
+                self.first = timestamp
+            self.last = timestamp
+
+            due = self.start + (timestamp - self.first) / self.speed
+            delay = due - time()
+            if delay > 0:
+                sleep(delay)
+
+            self.queue.put((due, request))
+
+    def work(self):
+        '''
+        Sends the queued requests on a single connection until the log is
+        finished.
+        '''
+        suites = {'auth': Auth(), 'validate': Validate()}
+        for suite in suites.values():
+            self.share(suite)
+        connection = suites['auth'].create_connection()
+        shard = self.dashboard and self.dashboard.shard()
+
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+
+            due, (timestamp, entry, user, product) = item
+            suite = suites[entry]
+            lateness = time() - due
+
+            if entry == 'auth':
+                body = suite.get_body(auth_params=self.credentials.get(
+                    user, self.default_params))
+            else:
+                body = None
+                suite.session_key = self.session_keys.get(
+                    user, self.session_keys[None])
+
+            if shard:
+                shard.begin()
+
+            start = time()
+            try:
+                url, status, headers, response_body = suite.request(
+                    connection, url=suite.get_url(product=product or None),
+                    body=body, schemas=SCHEMAS[entry])
+                response = str(status)
+                if status != 200:
+                    response = '%s %s' % (status,
+                                          response_body['error']['code'])
+                elif entry == 'auth':
+                    self.session_keys[user] = response_body['sessionKey']
+
+            except Exception, exception:
+                response = exception.__class__.__name__
+
+            finish = time()
+            if shard:
+                error = None
+                if response != '200':
+                    error = response
+                shard.end(finish - start, error, connection.sock is not None)
+
+            # Requests that finish during the warm-up are left out of the
+            # report.
+            if finish >= self.steady:
+                self.record(entry, finish - start, response, lateness)
+
+        connection.close()
+
+    def record(self, entry, latency, response, lateness):
+        '''
+        Records the outcome of one replayed request.
+        '''
+        self.lock.acquire()
+        try:
+            latencies = self.results['latencies']
+            if entry not in latencies:
+                latencies[entry] = Reservoir()
+            latencies[entry].append(latency)
+            responses = self.results['responses']
+            key = '%s %s' % (entry, response)
+            responses[key] = responses.get(key, 0) + 1
+            self.results['lateness'].append(lateness)
+        finally:
+            self.lock.release()
+
+    def report(self, elapsed):
+        '''
+        Prints how faithfully the log was replayed and the results of each
+        entry point.
+        '''
+        results = self.results
+        count = len(results['lateness'])
+        span = 0
+        if self.first is not None:
+            span = self.last - self.first
+
+        print 'Replayed %i requests in %.1fs. The log spans %.1fs.' % \
+              (count, elapsed, span)
+        if self.steady > self.start:
+            print 'Requests that finished during the %.1fs warm-up are not ' \
+                  'included.' % (self.steady - self.start)
+        if results['skipped']:
+            print 'Skipped %i lines that are not auth or validate ' \
+                  'requests.' % results['skipped']
+
+        if count:
+            p50, p99 = percentiles(results['lateness'], [50, 99])
+            p100 = results['lateness'].maximum
+            print 'Sent late by: p50 %.1fms, p99 %.1fms, max %.1fms' % \
+                  (p50 * 1000, p99 * 1000, p100 * 1000)
+            if p99 > 1.0:
+                warning('Requests were sent more than a second late. Use more '
+                        'workers or a lower speed.')
+
+        for entry, latencies in sorted(results['latencies'].items()):
+            p50, p95, p99 = percentiles(latencies, [50, 95, 99])
+            print '%s: %i requests, p50 %.1fms, p95 %.1fms, p99 %.1fms' % \
+                  (entry, len(latencies), p50 * 1000, p95 * 1000, p99 * 1000)
+
+        print 'Responses:'
+        for response, count in sorted(results['responses'].items()):
+            print '  %s: %i' % (response, count)
+
+        for line in self.saturation.summarize():
+            warning(line)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# coding: utf-8
+# Copyright (c) 2012, Polar Mobile.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name Polar Mobile nor the names of its contributors
+#     may be used to endorse or promote products derived from this software
+#     without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL POLAR MOBILE BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from socket import getaddrinfo, SOCK_STREAM
+
+from threading import Lock
+from time import time
+
+# The default port of each protocol.
+PORTS = {'http': 80, 'https': 443}
+
+
+def split_address(address, default_port):
+    '''
+    Splits an address such as "example.com:8080" or "[::1]:8080" into a host
+    and a port.
+    '''
+    host, port = address, default_port
+    if address.startswith('['):
+        host, rest = address[1:].split(']', 1)
+        if rest.startswith(':'):
+            port = rest[1:]
+    elif address.count(':') == 1:
+        host, port = address.split(':')
+    return host, int(port)
+
+
+class Resolver(object):
+    '''
+    Resolves the address of a server once and caches the result for a number
+    of seconds. Connections are spread over the backends in turn. The
+    backends are an explicit list of addresses, every address the server's
+    name resolves to, or just the first of them.
+    '''
+    def __init__(self, address, default_port, ttl=300, spread=False,
+                 backends=None):
+        self.host, self.port = split_address(address, default_port)
+        self.ttl = ttl
+        self.spread = spread
+
+        self.backends = []
+        if backends:
+            self.backends = [split_address(backend.strip(), self.port)
+                             for backend in backends.split(',')
+                             if backend.strip()]
+
+        self.addresses = []
+        self.expires = 0
+        self.index = 0
+        self.lock = Lock()
+
+    def resolve(self):
+        '''
+        Looks up every IPv4 and IPv6 address of the server.
+        '''
+        addresses = []
+        for family, type, protocol, name, address in \
+                getaddrinfo(self.host, self.port, 0, SOCK_STREAM):
+            if address[:2] not in addresses:
+                addresses.append(address[:2])
+        return addresses
+
+    def next(self):
+        '''
+        Returns the (host, port) pair of the backend the next connection
+        should use.
+        '''
+        self.lock.acquire()
+        try:
+            if self.backends:
+                addresses = self.backends
+            else:
+                if time() >= self.expires:
+                    self.addresses = self.resolve()
+                    self.expires = time() + self.ttl
+                addresses = self.addresses
+
+            if not self.spread and not self.backends:
+                return addresses[0]
+
+            address = addresses[self.index % len(addresses)]
+            self.index += 1
+            return address
+        finally:
+            self.lock.release()
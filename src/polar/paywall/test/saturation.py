@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+# coding: utf-8
+# Copyright (c) 2012, Polar Mobile.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name Polar Mobile nor the names of its contributors
+#     may be used to endorse or promote products derived from this software
+#     without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL POLAR MOBILE BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from os import times
+from threading import Thread, Event
+from time import time
+
+# How often the client is sampled, in seconds.
+INTERVAL = 0.1
+
+# The share of one core above which the client is CPU bound. Python threads
+# share one core, so more than one core can't be used by the workers.
+CPU_LIMIT = 0.9
+
+# The scheduling lag, in seconds, above which threads are not getting to run
+# when they should.
+LAG_LIMIT = 0.05
+
+
+class Saturation(object):
+    '''
+    Watches the test client itself while it sends load: the CPU it uses, how
+    late a sampling thread wakes up, which grows when threads contend for
+    the interpreter, and the backlog of requests that are due but not yet
+    sent. Each second of the run is judged on its own, so the seconds where
+    the client rather than the server was the bottleneck can be marked.
+    '''
+    def __init__(self, backlog=None, workers=1, series=None, fast=None):
+        # Returns the number of requests waiting to be sent, or None.
+        self.backlog = backlog
+        self.workers = workers
+        self.series = series
+
+        # Whether the fast path client was used, or None if the command
+        # doesn't have one.
+        self.fast = fast
+
+        self.seconds = {}
+        self.stopped = Event()
+        self.thread = None
+        self.start = None
+
+    def begin(self):
+        '''
+        Starts sampling on a thread of its own.
+        '''
+        # Seconds are counted as in the time series, if there is one.
+        self.start = self.series and self.series.start or time()
+        self.thread = Thread(target=self.sample)
+        self.thread.setDaemon(True)
+        self.thread.start()
+
+    def end(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def sample(self):
+        '''
+        Samples the client until stopped. CPU use is measured over each
+        second, lag and backlog at each sample.
+        '''
+        cpu = sum(times()[:2])
+        second_start = self.start
+        current = self.get_second(0)
+
+        expected = time() + INTERVAL
+        while not self.stopped.wait(max(expected - time(), 0)) and \
+              not self.stopped.isSet():
+            now = time()
+            current['lag'] = max(current['lag'], now - expected)
+            expected = now + INTERVAL
+
+            backlog = self.backlog and self.backlog()
+            if backlog is not None:
+                current['backlog'] = max(current['backlog'], backlog)
+
+            second = int(now - self.start)
+            if second != current['second']:
+                used = sum(times()[:2])
+                current['cpu'] = (used - cpu) / (now - second_start)
+                cpu, second_start = used, now
+                self.finish(current)
+                current = self.get_second(second)
+
+    def get_second(self, second):
+        result = {'second': second, 'cpu': 0.0, 'lag': 0.0, 'backlog': 0}
+        self.seconds[second] = result
+        return result
+
+    def finish(self, second):
+        '''
+        Judges a second that is over, and notes it in the time series if the
+        client was saturated.
+        '''
+        reason = self.get_reason(second)
+        second['reason'] = reason
+        if reason and self.series:
+            self.series.annotate(second['second'], reason)
+
+    def get_reason(self, second):
+        '''
+        Returns why the client was the bottleneck in a second, or None.
+        '''
+        reasons = []
+        if second['cpu'] >= CPU_LIMIT:
+            reasons.append('cpu %.0f%%' % (second['cpu'] * 100))
+        if second['lag'] >= LAG_LIMIT:
+            reasons.append('lag %.0fms' % (second['lag'] * 1000))
+        if second['backlog'] > self.workers:
+            reasons.append('backlog %i' % second['backlog'])
+        return ' '.join(reasons) or None
+
+    def summarize(self):
+        '''
+        Returns lines describing how long the client was saturated and what
+        to do about it. Returns no lines if it never was.
+        '''
+        judged = [second for second in self.seconds.values()
+                  if 'reason' in second]
+        saturated = [second for second in judged if second['reason']]
+        if not saturated:
+            return []
+
+        cpu = [second for second in saturated
+               if second['cpu'] >= CPU_LIMIT or second['lag'] >= LAG_LIMIT]
+        lines = ['The client was the bottleneck for %i of %i seconds; the '
+                 'results of those seconds understate the server.' % \
+                 (len(saturated), len(judged)),
+                 'Saturated seconds: %s' % ', '.join(
+                     ['%i (%s)' % (second['second'], second['reason'])
+                      for second in sorted(saturated,
+                                           key=lambda item: item['second'])
+                     ][:10])]
+
+        if cpu:
+            advice = 'Run several processes at once'
+            if self.fast is False:
+                advice += ', or use --fast'
+            lines.append('The client is CPU bound. %s.' % advice)
+        else:
+            lines.append('Requests are waiting for a free worker. Use more '
+                         'workers.')
+        return lines
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# coding: utf-8
+# Copyright (c) 2012, Polar Mobile.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name Polar Mobile nor the names of its contributors
+#     may be used to endorse or promote products derived from this software
+#     without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL POLAR MOBILE BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from polar.paywall.test.stats import percentile
+
+# Options in the slo section that are not latency objectives.
+SETTINGS = ('repeat',)
+
+# Suffixes accepted on durations and their value in seconds.
+UNITS = (('ms', 0.001), ('s', 1.0))
+
+
+def parse_duration(value):
+    '''
+    Converts a duration such as "300ms" or "1.5s" to seconds. Durations
+    without a unit are in seconds.
+    '''
+    value = value.strip().lower()
+    for suffix, scale in UNITS:
+        if value.endswith(suffix):
+            return float(value[:-len(suffix)]) * scale
+    return float(value)
+
+
+class Objective(object):
+    '''
+    A latency objective from the slo section of the configuration, e.g.
+    "auth.p95 = 300ms" or "validate.test_success.p99 = 1s". The scope is an
+    entry point, or an entry point and a test.
+    '''
+    def __init__(self, option, value):
+        self.scope, name = option.rsplit('.', 1)
+        if not name.startswith('p'):
+            raise ValueError('Invalid latency objective: %s' % option)
+
+        self.percentile = float(name[1:])
+        self.limit = parse_duration(value)
+
+    def check(self, latencies):
+        '''
+        Returns the measured percentile and whether it meets the objective.
+        '''
+        value = percentile(latencies, self.percentile)
+        return value, value <= self.limit
+
+    def __str__(self):
+        return '%s.p%g <= %.0fms' % (self.scope, self.percentile,
+                                     self.limit * 1000)
+
+
+def get_objectives(config):
+    '''
+    Returns the latency objectives in the configuration.
+    '''
+    if not config.has_section('slo'):
+        return []
+
+    return [Objective(option, value)
+            for option, value in config.items('slo')
+            if option not in SETTINGS]
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# coding: utf-8
+# Copyright (c) 2012, Polar Mobile.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name Polar Mobile nor the names of its contributors
+#     may be used to endorse or promote products derived from this software
+#     without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL POLAR MOBILE BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from math import ceil
+from random import randint, sample
+
+# The number of values a reservoir keeps by default.
+SAMPLE = 100000
+
+
+def percentiles(values, percents):
+    '''
+    Returns the nearest rank percentiles of values for each of the given
+    percents, or None for each if there are no values.
+    '''
+    ordered = sorted(values)
+    if not ordered:
+        return [None for percent in percents]
+
+    result = []
+    for percent in percents:
+        index = int(ceil(percent / 100.0 * len(ordered))) - 1
+        result.append(ordered[min(max(index, 0), len(ordered) - 1)])
+    return result
+
+
+def percentile(values, percent):
+    '''
+    Returns the nearest rank percentile of values.
+    '''
+    return percentiles(values, [percent])[0]
+
+
+class Reservoir(object):
+    '''
+    A uniform random sample of at most size values of a stream, so that the
+    percentiles of a stream of any length can be estimated in fixed memory.
+    The number of values and the largest value are kept exactly.
+    '''
+    def __init__(self, size=SAMPLE):
+        self.size = size
+        self.values = []
+        self.count = 0
+        self.maximum = None
+
+    def append(self, value):
+        self.count += 1
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+
+        if len(self.values) < self.size:
+            self.values.append(value)
+            return
+
+        # Each of the values seen so far stays in the sample with the same
+        # chance.
+        index = randint(0, self.count - 1)
+        if index < self.size:
+            self.values[index] = value
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return iter(self.values)
+
+
+def merge(reservoirs, size=SAMPLE):
+    '''
+    Returns one reservoir that samples the streams of several. Each keeps a
+    share of the sample in proportion to the number of values it saw.
+    '''
+    result = Reservoir(size)
+    result.count = sum([reservoir.count for reservoir in reservoirs])
+    maxima = [reservoir.maximum for reservoir in reservoirs
+              if reservoir.maximum is not None]
+    result.maximum = maxima and max(maxima) or None
+
+    for reservoir in reservoirs:
+        if not result.count:
+            break
+        share = int(round(float(size) * reservoir.count / result.count))
+        result.values.extend(sample(reservoir.values,
+                                    min(share, len(reservoir.values))))
+    return result
@@ -0,0 +1,327 @@
+#!/usr/bin/env python
+# coding: utf-8
+# Copyright (c) 2012, Polar Mobile.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name Polar Mobile nor the names of its contributors
+#     may be used to endorse or promote products derived from this software
+#     without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL POLAR MOBILE BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# Used to fingerprint the items of streamed arrays.
+try:
+    from hashlib import sha1
+except ImportError:
+    from sha import new as sha1
+
+# Note that in python 2.5 the json module is called simplejson.
+try:
+    from json import JSONDecoder, dumps
+except ImportError:
+    from simplejson import JSONDecoder, dumps
+
+from zlib import compressobj, decompressobj, MAX_WBITS, DEFLATED
+from zlib import error as ZlibError
+
+# The number of bytes read from a response at a time.
+CHUNK_SIZE = 64 * 1024
+
+# The window bits zlib uses for each content encoding. Deflate is a zlib
+# stream, though some servers send raw deflate data instead.
+WBITS = {'gzip': 16 + MAX_WBITS, 'deflate': MAX_WBITS}
+
+WHITESPACE = ' \t\n\r'
+
+
+class ResponseTooLarge(Exception):
+    '''
+    Raised when a response can't be decoded without buffering more than the
+    configured maximum body size.
+    '''
+    def __init__(self, limit, url=None):
+        Exception.__init__(self, limit, url)
+        self.limit = limit
+        self.url = url
+
+    def __str__(self):
+        return 'The response to %s is larger than the %i byte limit.' % \
+               (self.url, self.limit)
+
+
+def compress(data, encoding):
+    '''
+    Compresses data with the gzip or deflate content encoding.
+    '''
+    compressor = compressobj(6, DEFLATED, WBITS[encoding])
+    return compressor.compress(data) + compressor.flush()
+
+
+class CountingStream(object):
+    '''
+    Wraps a response body that is not compressed and counts its bytes. The
+    raw and decoded sizes are the same.
+    '''
+    def __init__(self, stream):
+        self.stream = stream
+        self.raw = 0
+        self.size = 0
+
+    def read(self, amt):
+        data = self.stream.read(amt)
+        self.raw += len(data)
+        self.size += len(data)
+        return data
+
+
+class DecompressingStream(object):
+    '''
+    Wraps a response body in the gzip or deflate content encoding and reads
+    it decompressed. No read returns more than it was asked for, so the
+    decompressed body is never held in memory at once. The number of bytes
+    read from the response and the number of bytes decompressed are
+    counted.
+    '''
+    def __init__(self, stream, encoding):
+        if encoding not in WBITS:
+            raise ValueError('Unsupported content encoding: %s' % encoding)
+
+        self.stream = stream
+        self.encoding = encoding
+        self.decompressor = None
+        self.eof = False
+        self.raw = 0
+        self.size = 0
+
+    def create_decompressor(self, data):
+        '''
+        Creates the decompressor, telling zlib and raw deflate data apart by
+        the header of the first chunk.
+        '''
+        wbits = WBITS[self.encoding]
+        if self.encoding == 'deflate' and (len(data) < 2 or
+                                           ord(data[0]) & 0x0f != 8 or
+                                           (ord(data[0]) * 256 +
+                                            ord(data[1])) % 31):
+            wbits = -MAX_WBITS
+        self.decompressor = decompressobj(wbits)
+
+    def read(self, amt):
+        '''
+        Returns up to amt bytes of the decompressed body. Corrupt data raises
+        ValueError, like a body that is not valid json.
+        '''
+        try:
+            return self.decompress(amt)
+        except ZlibError, exception:
+            raise ValueError('Could not decompress the %s body: %s' % \
+                             (self.encoding, exception))
+
+    def decompress(self, amt):
+        while True:
+            if self.decompressor and self.decompressor.unconsumed_tail:
+                data = self.decompressor.decompress(
+                    self.decompressor.unconsumed_tail, amt)
+            elif self.eof:
+                return ''
+            else:
+                chunk = self.stream.read(CHUNK_SIZE)
+                self.raw += len(chunk)
+                if self.decompressor is None:
+                    self.create_decompressor(chunk)
+
+                if chunk:
+                    data = self.decompressor.decompress(chunk, amt)
+                else:
+                    self.eof = True
+                    data = self.decompressor.flush()
+
+            if data:
+                self.size += len(data)
+                return data
+
+
+class StreamedArray(list):
+    '''
+    Stands in for a json array whose items were checked one at a time as
+    they were read. The items themselves are not kept, only their number and
+    a digest of their contents.
+    '''
+    def __init__(self, count, digest):
+        list.__init__(self)
+        self.count = count
+        self.digest = digest
+
+
+class StreamDecoder(object):
+    '''
+    Decodes a json document from a file like object while buffering at most
+    limit bytes. Arrays that are members of the top level object and have a
+    callback in arrays are decoded one item at a time. Each item is passed to
+    the callback and then discarded, so arrays of any length can be decoded.
+    '''
+    def __init__(self, stream, limit, arrays=None, chunk_size=CHUNK_SIZE):
+        self.stream = stream
+        self.limit = limit
+        self.arrays = arrays or {}
+        self.chunk_size = chunk_size
+
+        self.decoder = JSONDecoder()
+        self.buffer = ''
+        self.position = 0
+        self.eof = False
+
+    def fill(self):
+        '''
+        Reads the next chunk of the stream into the buffer, dropping the part
+        that has already been decoded. Returns False at the end of the
+        stream.
+        '''
+        if self.eof:
+            return False
+
+        self.buffer = self.buffer[self.position:]
+        self.position = 0
+
+        # More data is needed, but the buffer is already full.
+        if len(self.buffer) >= self.limit:
+            raise ResponseTooLarge(self.limit)
+
+        data = self.stream.read(min(self.chunk_size,
+                                    self.limit - len(self.buffer)))
+        if not data:
+            self.eof = True
+            return False
+
+        self.buffer += data
+        return True
+
+    def peek(self):
+        '''
+        Skips whitespace and returns the next character, or an empty string
+        at the end of the stream.
+        '''
+        while True:
+            while self.position < len(self.buffer) and \
+                  self.buffer[self.position] in WHITESPACE:
+                self.position += 1
+
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+
+            if not self.fill():
+                return ''
+
+    def expect(self, characters):
+        '''
+        Consumes the next character, which must be one of characters, and
+        returns it.
+        '''
+        character = self.peek()
+        if not character or character not in characters:
+            raise ValueError('Expecting one of "%s" at byte %i' % \
+                             (characters, self.position))
+
+        self.position += 1
+        return character
+
+    def value(self):
+        '''
+        Decodes the next complete json value in the stream.
+        '''
+        self.peek()
+
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer,
+                                                     idx=self.position)
+            except ValueError:
+                # The value may be incomplete.
+                if self.fill():
+                    continue
+                raise
+
+            # A number at the end of the buffer may continue in the next
+            # chunk.
+            number = isinstance(value, (int, long, float))
+            if number and end == len(self.buffer) and self.fill():
+                continue
+
+            self.position = end
+            return value
+
+    def array(self, callback):
+        '''
+        Decodes an array one item at a time.
+        '''
+        digest = sha1()
+        count = 0
+
+        self.expect('[')
+        if self.peek() == ']':
+            self.position += 1
+            return StreamedArray(count, digest.hexdigest())
+
+        while True:
+            item = self.value()
+            callback(item)
+            digest.update(dumps(item))
+            count += 1
+
+            if self.expect(',]') == ']':
+                return StreamedArray(count, digest.hexdigest())
+
+    def object(self):
+        '''
+        Decodes the top level object, streaming the arrays that have
+        callbacks.
+        '''
+        result = {}
+
+        self.expect('{')
+        if self.peek() == '}':
+            self.position += 1
+            return result
+
+        while True:
+            key = self.value()
+            self.expect(':')
+
+            if key in self.arrays and self.peek() == '[':
+                result[key] = self.array(self.arrays[key])
+            else:
+                result[key] = self.value()
+
+            if self.expect(',}') == '}':
+                return result
+
+    def decode(self):
+        '''
+        Decodes the whole stream.
+        '''
+        if self.arrays and self.peek() == '{':
+            result = self.object()
+        else:
+            result = self.value()
+
+        if self.peek():
+            raise ValueError('Extra data at byte %i' % self.position)
+
+        return result
@@ -28,33 +28,191 @@
 
 from polar.paywall.test.schemas import ERROR_SCHEMAS
 
-from httplib import HTTPSConnection, HTTPConnection
+from polar.paywall.test.budget import Budget, BudgetExhausted
+
+from polar.paywall.test.history import (History, PASSED, FAILED, ERRORED,
+    TIMEOUT, TOO_LARGE, NOT_RUN)
+
+from polar.paywall.test.stream import (StreamDecoder, ResponseTooLarge,
+    CountingStream, DecompressingStream, compress)
+
+from polar.paywall.test.slo import get_objectives
+
+from polar.paywall.test.timeseries import TimeSeries
+
+from polar.paywall.test.failures import FailureLog
+
+from polar.paywall.test.memory import Memory
+
+from polar.paywall.test.matrix import COMMON_CASES
+
+from polar.paywall.test.impairment import ImpairmentProxy, get_impairment
+
+from polar.paywall.test.tls import TLS, TLSConnection
+
+from polar.paywall.test.fastpath import FastConnection, FastPathError
+
+from polar.paywall.test.resolver import Resolver, PORTS
+
+from httplib import HTTPConnection, HTTPException
 
 from logging import (basicConfig, DEBUG, INFO, WARNING, ERROR, CRITICAL,
     info, warning, error)
 
+from traceback import format_exc
+
+from copy import copy
+from threading import Thread
+from Queue import Queue, Empty
+
+import signal
+
+# Used to enforce connection and read deadlines.
+from socket import timeout as SocketTimeout, error as SocketError
+from time import time
+
+# Python 2.6 and onwards raise SSLError rather than socket.timeout when a
+# read on a secure socket times out.
+try:
+    from ssl import SSLError
+except ImportError:
+    SSLError = SocketTimeout
+
 from ConfigParser import ConfigParser
 
-from jsonschema import validate
+# Note that jsonschema's ValidationError is not a ValueError.
+from jsonschema import validate, ValidationError
 
 # Used to generate random strings for testing.
 from uuid import uuid4
 
-# Used to decode and encode post bodies that contain json encoded data.
+# Used to encode post bodies that contain json encoded data.
 # Note that in python 2.5 and 2.6 the json module is called simplejson.
 # In Python 2.7 and onwards, json is used.
 try:
-    from json import loads, dumps
+    from json import dumps
 except ImportError:
-    from simplejson import loads, dumps
+    from simplejson import dumps
 
 from random import randint
 
+# Default deadlines in seconds, used when the limits section of the
+# configuration does not specify them.
+CONNECT_TIMEOUT = 10.0
+READ_TIMEOUT = 30.0
+
+# The default number of bytes a response may buffer while it is decoded.
+MAX_BODY_SIZE = 1024 * 1024
+
+
+class RequestTimeout(Exception):
+    '''
+    Raised when the server does not accept a connection or answer a request
+    within the configured deadline.
+    '''
+    def __init__(self, url, elapsed):
+        Exception.__init__(self, url, elapsed)
+        self.url = url
+        self.elapsed = elapsed
+
+    def __str__(self):
+        return 'The request to %s timed out after %.2f seconds.' % \
+               (self.url, self.elapsed)
+
+
+class ItemValidator(object):
+    '''
+    Validates the items of a streamed array in batches, so that only one
+    batch of items is held in memory at a time. The first validation error is
+    kept.
+    '''
+    def __init__(self, schema, size=1024):
+        self.schema = {'type': 'array', 'items': schema}
+        self.size = size
+        self.batch = []
+        self.error = None
+
+    def __call__(self, item):
+        self.batch.append(item)
+        if len(self.batch) >= self.size:
+            self.flush()
+
+    def flush(self):
+        '''
+        Validates the items in the current batch.
+        '''
+        try:
+            if self.batch and not self.error:
+                validate(self.batch, self.schema)
+        except (ValueError, ValidationError), exception:
+            self.error = exception
+
+        self.batch = []
+
 
 class Subcommand(object):
     '''
     Adds common functionality to subcommands.
     '''
+    # The entry point tested by the subcommand.
+    entry = None
+
+    # Tests that are still run when the time budget is running low. All other
+    # tests are reported as not run.
+    priority_tests = ()
+
+    # The rows of the test matrix of the entry point. See Case.
+    cases = COMMON_CASES
+
+    # The number of connections tests are run on at the same time.
+    workers = 1
+
+    # The time budget of the run. Subcommands that are not called from main
+    # have no limit unless one is shared with them.
+    budget = Budget()
+
+    # Where test outcomes are persisted, and how they are used to select the
+    # tests that are run. See select_tests.
+    history = None
+    keyword = None
+    failed_first = False
+    only_failed = False
+
+    # The number of failures reported by this subcommand.
+    failures = 0
+
+    # The name of the conformance test being run, if any.
+    current_test = None
+
+    # Collects the results of every request in one second buckets for runs
+    # that ask for a time series. See TimeSeries.
+    series = None
+
+    # Whether runs go through a local proxy that degrades the connection when
+    # the config file has an impairment section.
+    impaired = True
+
+    # The Accept-Encoding sent with requests. If None, the accept encoding
+    # option of the server section is used, if given.
+    accept_encoding = None
+
+    # The size of the last response body read, as it was sent and after it
+    # was decompressed.
+    body_size = (0, 0)
+
+    def __init__(self):
+        # Maps the name of each test to the latencies of its requests.
+        self.latencies = {}
+
+        # TLS state shared by the connections of this subcommand.
+        self.tls = TLS()
+
+        # Failures of this subcommand and those it shares its state with.
+        self.failure_log = FailureLog()
+
+        # Resolves the address of the server. Created by get_resolver.
+        self.resolver = None
+
     def set_log_level(self, log_level):
         '''
         Sets the log level. If None, the log_level will be warning.
@@ -78,6 +236,68 @@ class Subcommand(object):
         result.readfp(config)
         return result
 
+    def get_option(self, section, option, default=None):
+        '''
+        Returns an option from the configuration file, or the default if the
+        option is not specified.
+        '''
+        if self.config.has_option(section, option):
+            return self.config.get(section, option)
+        return default
+
+    def get_float(self, section, option, default=None):
+        '''
+        Returns a numeric option from the configuration file, or the default
+        if the option is not specified.
+        '''
+        if self.config.has_option(section, option):
+            return self.config.getfloat(section, option)
+        return default
+
+    def create_budget(self):
+        '''
+        Creates the time budget for a run using the limits section of the
+        config file.
+        '''
+        seconds = self.get_float('limits', 'budget')
+        reserve = self.get_float('limits', 'budget reserve', 0)
+        return Budget(seconds, reserve)
+
+    def get_resolver(self):
+        '''
+        Returns the resolver of the server's address, creating it from the
+        server section of the config file the first time.
+        '''
+        if self.resolver is None:
+            protocol = self.config.get('server', 'protocol')
+            spread = False
+            if self.config.has_option('server', 'spread'):
+                spread = self.config.getboolean('server', 'spread')
+
+            self.resolver = Resolver(self.config.get('server', 'address'),
+                                     PORTS[protocol],
+                                     self.get_float('server', 'dns ttl', 300),
+                                     spread,
+                                     self.get_option('server', 'backends'))
+        return self.resolver
+
+    def share(self, subcommand):
+        '''
+        Shares the configuration and run state of this subcommand with another
+        subcommand that runs as part of it.
+        '''
+        subcommand.config = self.config
+        subcommand.budget = self.budget
+        subcommand.tls = self.tls
+        subcommand.failure_log = self.failure_log
+        subcommand.resolver = self.get_resolver()
+        subcommand.history = self.history
+        subcommand.keyword = self.keyword
+        subcommand.failed_first = self.failed_first
+        subcommand.only_failed = self.only_failed
+        subcommand.series = self.series
+        subcommand.workers = self.workers
+
     def __call__(self, arguments):
         '''
         Called by the main file's callback mechanism. This function sets up
@@ -87,9 +307,79 @@ class Subcommand(object):
         # Setup logging and configuration.
         self.set_log_level(arguments.logLevel)
         self.config = self.parse_config(arguments.configuration)
+        self.budget = self.create_budget()
+
+        # The resolver is created up front since workers share it.
+        self.get_resolver()
+
+        # Setup test selection. Subcommands that don't run tests don't take
+        # these arguments. Ordering by the outcomes of earlier runs needs a
+        # history.
+        self.keyword = getattr(arguments, 'keyword', None)
+        self.workers = getattr(arguments, 'workers', None) or self.workers
+        if getattr(arguments, 'history', None):
+            self.history = History(arguments.history, self.config)
+            self.failed_first = arguments.failed_first
+            self.only_failed = arguments.only_failed
+
+        # The failures so far can be dumped while a long run is in progress
+        # by sending the process SIGUSR1.
+        if hasattr(signal, 'SIGUSR1'):
+            signal.signal(signal.SIGUSR1,
+                          lambda number, frame: self.failure_log.dump(True))
+
+        # Load style subcommands can stream the results of their requests.
+        if getattr(arguments, 'series', None):
+            self.series = TimeSeries(arguments.series, arguments.warmup)
+
+        # Long runs can watch the memory of the client.
+        memory = None
+        if getattr(arguments, 'memory', None):
+            memory = Memory(arguments.memory, self.series)
+            memory.begin()
+
+        # The proxy is started last, so that nothing can fail between
+        # starting and stopping it.
+        proxy = None
+        if self.impaired and self.config.has_section('impairment'):
+            proxy = self.start_proxy()
+
+        # Run the command. Whatever happens, including an interrupt, the
+        # proxy is stopped and what was collected is written out.
+        try:
+            self.run(arguments)
+        finally:
+            if memory:
+                memory.end()
+                for line in memory.summarize():
+                    info(line)
+
+            if self.series:
+                self.series.close()
+
+            if proxy:
+                proxy.stop()
+
+            self.failure_log.dump()
+
+            if self.history:
+                self.history.save()
+
+            for line in self.tls.summarize():
+                info(line)
+
+    def start_proxy(self):
+        '''
+        Starts a local proxy to the server that degrades connections as the
+        impairment section of the config file describes, and sends every
+        connection through it.
+        '''
+        resolver = self.get_resolver()
+        proxy = ImpairmentProxy(resolver.next(), get_impairment(self.config))
+        proxy.start()
 
-        # Run the command.
-        self.run(arguments)
+        resolver.backends = [proxy.address]
+        return proxy
 
     def run(self, arguments):
         '''
@@ -98,15 +388,84 @@ class Subcommand(object):
         '''
         pass
 
-    def create_connection(self):
+    def get_cases(self):
+        '''
+        Returns the cases of the test matrix that apply to the config file.
+        Functions in the matrix are called with the config file and return
+        cases of their own.
+        '''
+        cases = []
+        for row in self.cases:
+            if callable(row):
+                cases.extend(row(self.config))
+            else:
+                cases.append(row)
+        return [case for case in cases if case.applies(self.config)]
+
+    def get_tests(self):
+        '''
+        Returns the names of the conformance tests of the subcommand in the
+        order they are run.
+        '''
+        tests = []
+        for case in self.get_cases():
+            if case.test not in tests:
+                tests.append(case.test)
+        return tests
+
+    def run_suite(self, connection):
+        '''
+        Runs the conformance tests of the subcommand using the connection.
+        '''
+        self.latencies = {}
+        self.run_tests(connection, self.get_tests())
+        self.check_entry_latency()
+
+    def create_connection(self, fast=False):
         '''
         Creates a connection object using the parameters specified in the
-        config file.
+        config file. The connection is made to the next backend of the
+        resolver. With fast, the minimal fast path client is used instead of
+        httplib.
+        '''
+        host, port = self.get_resolver().next()
+        hostname = self.get_resolver().host
+        timeout = self.get_float('limits', 'connect timeout', CONNECT_TIMEOUT)
+
+        # Secure connections to the same server share their TLS state.
+        tls = None
+        if self.config.get('server', 'protocol') == 'https':
+            tls = self.tls
+
+        if fast:
+            connection = FastConnection(host, port, timeout, tls, hostname)
+        elif tls is not None:
+            connection = TLSConnection(host, port, timeout, tls, hostname)
+        else:
+            connection = HTTPConnection(host, port, timeout=timeout)
+
+        connection.backend = '%s:%i' % (host, port)
+        return connection
+
+    def open_connection(self, connection):
         '''
-        protocols = {'http': HTTPConnection, 'https': HTTPSConnection}
-        protocol = protocols[self.config.get('server', 'protocol')]
+        Connects if the connection is not already open and applies the read
+        deadline to its socket. The deadline never exceeds the time left in
+        the budget. Raises BudgetExhausted if no time is left, since a
+        timeout of zero would make the socket non-blocking.
+        '''
+        remaining = self.budget.remaining()
+        if remaining is not None and remaining <= 0:
+            raise BudgetExhausted()
+
+        if connection.sock is None:
+            connection.connect()
+
+        timeout = self.get_float('limits', 'read timeout', READ_TIMEOUT)
+        if remaining is not None:
+            timeout = min(timeout, remaining)
 
-        return protocol(self.config.get('server', 'address'))
+        connection.sock.settimeout(timeout)
 
     def get_url(self, entry, api='paywallproxy', version=None, format='json',
                 product=None, user='valid user'):
@@ -133,22 +492,45 @@ class Subcommand(object):
 
         try:
             validate(body, schema)
-        except ValueError, exception:
-            warning('Response body does not match the schema: %s.' % \
-                    str(exception))
-            info(body)
+        except (ValueError, ValidationError), exception:
+            self.fail('schema', 'mismatch',
+                      'Response body does not match the schema: %s.',
+                      (exception,), body)
+
+    def get_schemas(self, status, schemas):
+        '''
+        Returns the schemas a response with the given status is checked
+        against. A response that is not successful is an error response,
+        whatever response was hoped for.
+        '''
+        if status != 200:
+            return ERROR_SCHEMAS
+        return schemas
 
     def check_headers(self, headers):
         '''
         Tests the headers to ensure that the content type is json.
         '''
         if 'Content-Type' not in headers:
-            warning('The content type is not in the response.')
+            self.fail('content type', 'none',
+                      'The content type is not in the response.')
             return
 
         content_type = headers['Content-Type']
         if 'application/json' not in content_type:
-            warning('The content type is not json: %s.' % content_type)
+            self.fail('content type', content_type,
+                      'The content type is not json: %s.', (content_type,))
+
+    def fail(self, expected, actual, message, args=(), body=None):
+        '''
+        Reports a failure of the current test, where the expected value was
+        not the actual one. The message is a format string for args. The
+        first failure of each kind is logged, with the response body, if
+        given, at the info level. Later ones are counted. See FailureLog.
+        '''
+        self.failures += 1
+        self.failure_log.add(self.current_test or self.entry, expected,
+                             actual, message, args, body)
 
     def random_id(self):
         '''
@@ -156,11 +538,10 @@ class Subcommand(object):
         '''
         return str(uuid4()).replace('-', '')
 
-    def request(self, connection, url=None, headers=None, body=None,
-                schemas=ERROR_SCHEMAS):
+    def prepare_request(self, url=None, headers=None, body=None):
         '''
-        Issue a request. If url, headers or body are None, then the default
-        factory methods are used.
+        Returns the url, headers and encoded body of a request. If url,
+        headers or body are None, then the default factory methods are used.
         '''
         if url is None:
             url = self.get_url()
@@ -181,43 +562,406 @@ class Subcommand(object):
         if len(body) == 0:
             headers['Content-Length'] = 0
 
-        # Make the request.
-        connection.request('POST', url, body, headers)
-        response = connection.getresponse()
-        status = response.status
+        # Connections are made to a resolved address, so the host has to be
+        # given explicitly.
+        if 'Host' not in headers:
+            headers['Host'] = self.config.get('server', 'address')
+
+        # Compression is only negotiated when it is configured.
+        accept_encoding = self.accept_encoding or \
+            self.get_option('server', 'accept encoding')
+        if accept_encoding and 'Accept-Encoding' not in headers:
+            headers['Accept-Encoding'] = accept_encoding
+
+        request_encoding = self.get_option('server', 'request encoding')
+        if request_encoding and body:
+            body = compress(body, request_encoding)
+            headers['Content-Encoding'] = request_encoding
+
+        return url, headers, body
+
+    def request(self, connection, url=None, headers=None, body=None,
+                schemas=ERROR_SCHEMAS):
+        '''
+        Issue a request. If url, headers or body are None, then the default
+        factory methods are used.
+        '''
+        url, headers, body = self.prepare_request(url, headers, body)
+        return (url,) + self.exchange(connection, url, headers, body, schemas)
+
+    def exchange(self, connection, url, headers, body, schemas):
+        '''
+        Sends a prepared request and checks the response. Returns the status,
+        headers and decoded body of the response.
+        '''
+        # Conformance tests repeat each request to measure its latency. Only
+        # the last response is checked.
+        for repetition in xrange(self.get_repeat()):
+            status, response_headers, response_body = \
+                self.send(connection, url, headers, body, schemas)
+
+        # Check the headers and the body.
+        self.check_headers(response_headers)
+        self.check_response(response_body, self.get_schemas(status, schemas))
 
-        # Check the headers.
-        headers = response.msg
-        self.check_headers(headers)
+        return (status, response_headers, response_body)
+
+    def send(self, connection, url, headers, body, schemas):
+        '''
+        Sends an encoded request and decodes the response, recording the
+        latency of the exchange.
+        '''
+        # Make the request. If the server does not respond in time, the
+        # connection is left in an unknown state, so it is closed. It will
+        # reconnect on the next request.
+        start = time()
+        try:
+            self.open_connection(connection)
+            connection.request('POST', url, body, headers)
+            response = connection.getresponse()
+            status = response.status
+            response_headers = response.msg
+
+            # The body is decoded as it is read. If decoding fails part way
+            # through, the rest of the response is left unread and the
+            # connection can't be reused.
+            try:
+                response_body = self.read_body(
+                    response, self.get_schemas(status, schemas))
+            except ValueError, exception:
+                connection.close()
+                error('Could not decode response: %s' % str(exception))
+                response_body = None
+
+        except (SocketTimeout, SSLError), exception:
+            connection.close()
+            if 'timed out' not in str(exception):
+                raise
+            elapsed = time() - start
+            self.record_latency(elapsed)
+            if self.series:
+                self.series.record(elapsed, 'timeout')
+            raise RequestTimeout(url, elapsed)
+
+        except ResponseTooLarge, exception:
+            connection.close()
+            exception.url = url
+            raise
+
+        # A connection that was reset or cut off can't be reused.
+        except (SocketError, HTTPException, FastPathError):
+            connection.close()
+            raise
+
+        elapsed = time() - start
+        self.record_latency(elapsed)
+        if self.series:
+            self.series.record(elapsed, self.get_error_code(status,
+                                                            response_body))
+
+        return (status, response_headers, response_body)
+
+    def get_error_code(self, status, body):
+        '''
+        Returns the error code of a response, its status if the body has no
+        error code, or None if the request succeeded.
+        '''
+        if status < 400:
+            return None
 
-        # Check the body.
         try:
-            body = loads(response.read())
-        except ValueError, exception:
-            error('Could not decode response: %s' % str(exception))
+            return body['error']['code']
+        except (TypeError, KeyError):
+            return str(status)
+
+    def get_repeat(self):
+        '''
+        Returns the number of times a request is repeated. Only requests made
+        by conformance tests are repeated.
+        '''
+        if self.current_test is None:
+            return 1
+        return int(self.get_float('slo', 'repeat', 1))
 
-        self.check_response(body, schemas)
+    def record_latency(self, latency):
+        '''
+        Records the latency of a request made by a conformance test.
+        '''
+        if self.current_test is not None:
+            self.latencies.setdefault(self.current_test, []).append(latency)
+
+    def check_latency(self, scope, latencies):
+        '''
+        Checks a set of latencies against the objectives for the scope, which
+        is either an entry point or a test name.
+        '''
+        if not latencies:
+            return
+
+        for objective in get_objectives(self.config):
+            if objective.scope != scope:
+                continue
+
+            value, met = objective.check(latencies)
+            info('%s: p%g latency is %.0fms.' % \
+                 (scope, objective.percentile, value * 1000))
+
+            if not met:
+                self.fail(str(objective), 'missed',
+                          '%s: p%g latency of %.0fms does not meet the '
+                          'objective %s.', (scope, objective.percentile,
+                                            value * 1000, objective))
+
+    def read_body(self, response, schemas):
+        '''
+        Decodes a json response body without buffering more than the maximum
+        body size. Arrays in the schema are validated one item at a time as
+        they are read, so they can be of any length.
+        '''
+        limit = int(self.get_float('limits', 'max body size', MAX_BODY_SIZE))
+        schema = schemas[self.config.get('server', 'version')]
+
+        arrays = {}
+        for name, value in schema.get('properties', {}).items():
+            if value.get('type') == 'array' and 'items' in value:
+                arrays[name] = ItemValidator(value['items'])
+
+        # If nothing can be streamed, the whole body has to fit in the limit.
+        length = getattr(response, 'length', None)
+        if not arrays and length is not None and length > limit:
+            raise ResponseTooLarge(limit)
+
+        # Compressed bodies are decompressed as they are read, so the limit
+        # applies to the decompressed body.
+        encoding = response.getheader('Content-Encoding', 'identity').lower()
+        if encoding == 'identity':
+            stream = CountingStream(response)
+        else:
+            stream = DecompressingStream(response, encoding)
+
+        body = StreamDecoder(stream, limit, arrays).decode()
+        self.body_size = (stream.raw, stream.size)
+
+        for name, items in arrays.items():
+            items.flush()
+            if items.error:
+                self.fail('%s schema' % name, 'mismatch',
+                          'Items in %s do not match the schema: %s.',
+                          (name, items.error))
+
+        return body
+
+    def get_test_name(self, test):
+        '''
+        Returns the name used to select and record a test.
+        '''
+        return '%s.%s' % (self.entry, test)
+
+    def select_tests(self, tests):
+        '''
+        Filters and orders tests using the keyword and the outcomes of the
+        last run. The keyword is a comma separated list of strings; a test is
+        selected if its name contains any of them.
+        '''
+        if self.keyword:
+            keywords = [keyword.strip() for keyword in self.keyword.split(',')]
+            tests = [test for test in tests
+                     if any(keyword in self.get_test_name(test)
+                            for keyword in keywords)]
+
+        if not self.history:
+            return tests
 
-        return (url, status, headers, body)
+        # Tests that did not pass last time, including tests that have never
+        # been run with this configuration.
+        failed = [test for test in tests
+                  if not self.history.passed(self.get_test_name(test))]
 
-    def test_error(self, connection, expected_status, expected_code,
-                   url=None, headers=None, body=None, schemas=ERROR_SCHEMAS):
+        if self.only_failed:
+            return failed
+
+        if self.failed_first:
+            return failed + [test for test in tests if test not in failed]
+
+        return tests
+
+    def record(self, name, outcome):
         '''
-        Makes a request to check for an error.
+        Records the outcome of a test if a history is being kept.
         '''
-        response = self.request(connection, url, headers, body, schemas)
-        url, status, response_headers, response_body = response
+        if self.history:
+            self.history.record(name, outcome)
 
-        if status != expected_status:
-            warning('The request to %s returned status %s and not %s' % \
-                    (url, status, expected_status))
-            info(response_body)
+    def report_not_run(self, names, reason):
+        '''
+        Reports and records a set of tests that were not run.
+        '''
+        if not names:
+            return
+
+        for name in names:
+            self.record(name, NOT_RUN)
+
+        warning('%s Tests not run: %s.' % (reason, ', '.join(names)))
+
+    def report_errored(self, names, reason):
+        '''
+        Reports and records a set of tests that could not be run because of
+        an error.
+        '''
+        if not names:
+            return
+
+        for name in names:
+            self.record(name, ERRORED)
+
+        error('%s Tests errored: %s.' % (reason, ', '.join(names)))
+
+    def run_tests(self, connection, tests):
+        '''
+        Runs a batch of tests. The requests of all of their cases are built
+        first, then the tests are handed out to the workers, each sending on
+        a connection of its own. The first worker uses the given connection.
+        Once the time budget runs low, only priority tests are run and the
+        rest are reported as not run. The latencies of the tests are added to
+        those of the suite.
+        '''
+        cases = self.get_cases()
+        batch = Queue()
+        for test in self.select_tests(tests):
+            batch.put((test, [(case, case.build(self)) for case in cases
+                              if case.test == test]))
+
+        # The other workers run on copies of the suite, so that each knows
+        # which test it is running.
+        suites = []
+        for worker in xrange(min(self.workers, batch.qsize()) - 1):
+            suite = copy(self)
+            suite.latencies = {}
+            suite.failures = 0
+            suites.append(suite)
+
+        not_run = []
+        threads = []
+        for suite in suites:
+            thread = Thread(target=suite.run_batch,
+                            args=(None, batch, not_run))
+            thread.start()
+            threads.append(thread)
+
+        self.run_batch(connection, batch, not_run)
+
+        for thread in threads:
+            thread.join()
+
+        for suite in suites:
+            self.failures += suite.failures
+            self.latencies.update(suite.latencies)
+
+        names = [self.get_test_name(test) for test in tests]
+        not_run.sort(key=names.index)
+        self.report_not_run(not_run, 'The time budget is running out.')
+
+    def run_batch(self, connection, batch, not_run):
+        '''
+        Runs tests from the batch until it is empty. Without a connection, a
+        connection of its own is used.
+        '''
+        own = connection is None
+        if own:
+            connection = self.create_connection()
+
+        while True:
+            try:
+                test, requests = batch.get_nowait()
+            except Empty:
+                break
+
+            low = self.budget.low() and test not in self.priority_tests
+            if low or self.budget.exhausted():
+                not_run.append(self.get_test_name(test))
+                continue
+
+            self.run_test(connection, test, requests)
+
+        if own:
+            connection.close()
+
+    def run_test(self, connection, test, requests):
+        '''
+        Runs the cases of a test, given with their built requests, and
+        records the outcome of the test.
+        '''
+        name = self.get_test_name(test)
+        failures = self.failures
+        self.current_test = name
+        try:
+            for case, request in requests:
+                self.run_case(connection, case, request)
+            self.check_latency(name, self.latencies.get(name))
+
+        except RequestTimeout, exception:
+            warning('%s: %s' % (name, exception))
+            self.record(name, TIMEOUT)
+
+        except ResponseTooLarge, exception:
+            warning('%s: %s' % (name, exception))
+            self.record(name, TOO_LARGE)
+
+        except BudgetExhausted:
+            self.report_not_run([name], 'The time budget ran out.')
+
+        except Exception, exception:
+            error(format_exc())
+            error(exception)
+            self.record(name, ERRORED)
+
+        else:
+            if self.failures > failures:
+                self.record(name, FAILED)
+            else:
+                self.record(name, PASSED)
+
+        self.current_test = None
+
+    def run_case(self, connection, case, request):
+        '''
+        Sends the request of a case and checks that the response has the
+        expected status and error code.
+        '''
+        info('Testing %s.' % case.description)
+        url, headers, body = request
+        status, response_headers, response_body = self.exchange(
+            connection, url, headers, body, case.schemas)
+
+        if status != case.status:
+            self.fail(case.status, status,
+                      'The request to %s returned status %s and not %s',
+                      (url, status, case.status), response_body)
+
+        if case.code is None:
+            return
 
         code = response_body['error']['code']
-        if code != expected_code:
-            warning('The request to %s returned code %s and not %s' % \
-                    (url, code, expected_code))
-            info(response_body)
+        if code != case.code:
+            self.fail(case.code, code,
+                      'The request to %s returned code %s and not %s',
+                      (url, code, case.code), response_body)
+
+    def check_entry_latency(self):
+        '''
+        Checks the latency of all of the tests run on the entry point against
+        its objectives.
+        '''
+        latencies = []
+        for values in self.latencies.values():
+            latencies.extend(values)
+
+        failures = self.failures
+        self.check_latency(self.entry, latencies)
+        if latencies:
+            name = '%s.latency' % self.entry
+            self.record(name, self.failures > failures and FAILED or PASSED)
 
     def make_random_version(self):
         '''
@@ -232,38 +976,3 @@ class Subcommand(object):
             patch = randint(0, 9)
             version = 'v%i.%i.%i' % (major, minor, patch)
         return version
-
-    def test_urls(self, connection):
-        '''
-        Tests the main url with bad url parameters.
-        '''
-        info('Testing an invalid api.')
-        url = self.get_url(api='test')
-        self.test_error(connection, 404, 'InvalidAPI', url=url)
-
-        info('Testing an invalid version.')
-        url = self.get_url(version=self.make_random_version())
-        self.test_error(connection, 404, 'InvalidVersion', url=url)
-
-        info('Testing an invalid format.')
-        url = self.get_url(format='test')
-        self.test_error(connection, 404, 'InvalidFormat', url=url)
-
-    def test_headers(self, connection):
-        '''
-        Tests the servers response to invalid headers.
-        '''
-        info('Testing no auth header.')
-        headers = self.get_headers()
-        del headers['Authorization']
-        self.test_error(connection, 400, 'InvalidAuthScheme', headers=headers)
-
-        info('Testing no auth token.')
-        headers = self.get_headers()
-        headers['Authorization'] = ''
-        self.test_error(connection, 400, 'InvalidAuthScheme', headers=headers)
-
-        info('Testing invalid auth token.')
-        headers = self.get_headers()
-        headers['Authorization'] = self.random_id()
-        self.test_error(connection, 400, 'InvalidAuthScheme', headers=headers)
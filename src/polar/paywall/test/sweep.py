@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+# coding: utf-8
+# Copyright (c) 2012, Polar Mobile.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name Polar Mobile nor the names of its contributors
+#     may be used to endorse or promote products derived from this software
+#     without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL POLAR MOBILE BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from polar.paywall.test.schemas import AUTH_SCHEMAS
+
+from polar.paywall.test.subcommand import Subcommand
+
+from polar.paywall.test.auth import Auth
+
+from polar.paywall.test.stats import percentiles
+
+from logging import info
+
+from time import time
+
+# The fields of the device that are grown by the device dimension.
+DEVICE_FIELDS = ('manufacturer', 'model', 'os_version')
+
+# The response a dimension expects when its requests are accepted. Longer
+# auth param values are invalid credentials, so the server can only read
+# them and turn them down.
+EXPECTED = {'values': '401 InvalidPaywallCredentials'}
+
+
+class Sweep(Subcommand):
+    '''
+    Called by the sweep subcommand in main. Measures how the latency of the
+    auth entry point grows with the size of the request. Each dimension of
+    the body is grown over a geometric series, every size is sent a number
+    of times, and the size at which the server starts rejecting requests is
+    reported.
+    '''
+    def run(self, arguments):
+        '''
+        Sweeps each requested dimension and prints a table of the results.
+        '''
+        self.auth = Auth()
+        self.share(self.auth)
+
+        dimensions = arguments.dimension
+        if dimensions == 'all':
+            dimensions = ('keys', 'values', 'device')
+        else:
+            dimensions = (dimensions,)
+
+        connection = self.create_connection()
+        for dimension in dimensions:
+            info('Sweeping the %s of auth requests.' % dimension)
+            self.sweep(connection, dimension, arguments)
+        connection.close()
+
+    def get_sizes(self, arguments):
+        '''
+        Returns the geometric series of sizes to send.
+        '''
+        sizes = []
+        size = arguments.start
+        while size <= arguments.max_size:
+            sizes.append(size)
+            size = max(int(size * arguments.factor), size + 1)
+        return sizes
+
+    def get_body(self, dimension, size):
+        '''
+        Returns the body of an auth request for the valid user, grown along
+        one dimension. Only fields the server has to accept are grown: the
+        server rejects auth params it does not know, so extra keys are added
+        to the device. Growing the user's own auth param values makes the
+        credentials invalid, so those requests are rejected, but the server
+        still has to read them.
+        '''
+        body = self.auth.get_body()
+
+        if dimension == 'keys':
+            for index in xrange(size):
+                body['device']['field%i' % index] = 'test'
+        elif dimension == 'values':
+            for name, value in body['authParams'].items():
+                body['authParams'][name] = value + 'x' * size
+        elif dimension == 'device':
+            for field in DEVICE_FIELDS:
+                body['device'][field] = 'x' * size
+
+        return body
+
+    def send_once(self, connection, url, headers, body):
+        '''
+        Sends one request and returns its latency and a description of the
+        response, which is None if the request was accepted. The latency is
+        None if the server did not answer.
+        '''
+        start = time()
+        try:
+            status, response_headers, response_body = \
+                self.auth.send(connection, url, headers, body, AUTH_SCHEMAS)
+            response = None
+            if status != 200:
+                response = str(status)
+                try:
+                    response += ' ' + response_body['error']['code']
+                except (TypeError, KeyError):
+                    pass
+
+        # Servers often drop the connection rather than answer a request
+        # that is too large.
+        except Exception, exception:
+            connection.close()
+            return None, exception.__class__.__name__
+
+        return time() - start, response
+
+    def sweep(self, connection, dimension, arguments):
+        '''
+        Sends every size of one dimension until the server stops answering
+        every repetition of a size, then prints the curve. The latency of
+        rejected requests that were answered is included.
+        '''
+        print 'Dimension: %s' % dimension
+        print '%10s %10s %10s %10s %10s  %s' % \
+              ('size', 'bytes', 'p50 ms', 'p95 ms', 'accepted', 'rejected as')
+
+        rejected_at = None
+        for size in self.get_sizes(arguments):
+            url, headers, body = self.auth.prepare_request(
+                body=self.get_body(dimension, size))
+
+            expected = EXPECTED.get(dimension)
+            latencies = []
+            rejections = {}
+            for repetition in xrange(arguments.repeat):
+                latency, response = self.send_once(connection, url, headers,
+                                                   body)
+                if latency is not None:
+                    latencies.append(latency)
+                if response is not None and response != expected:
+                    rejections[response] = rejections.get(response, 0) + 1
+
+            p50, p95 = '-', '-'
+            if latencies:
+                p50, p95 = ['%.1f' % (latency * 1000) for latency in
+                            percentiles(latencies, [50, 95])]
+
+            accepted = arguments.repeat - sum(rejections.values())
+            print '%10i %10i %10s %10s %10s  %s' % \
+                  (size, len(body), p50, p95,
+                   '%i/%i' % (accepted, arguments.repeat),
+                   ', '.join(sorted(rejections.keys())))
+
+            if rejections and rejected_at is None:
+                rejected_at = (size, len(body))
+
+            # Larger requests will not be answered either.
+            if not latencies:
+                break
+
+        if rejected_at is None:
+            print 'No request was rejected.'
+        else:
+            print 'Rejections start at size %i (%i bytes).' % rejected_at
+        print
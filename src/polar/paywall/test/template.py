@@ -36,6 +36,72 @@ address = localhost:8080
 protocol = http
 # The version of the proxy api that the server implements.
 version = v1.0.0
+# The address is resolved once and the result is cached for this many seconds.
+dns ttl = 300
+# Spread connections over every address the name resolves to, rather than
+# always using the first one.
+spread = false
+# Connect to these backends in turn instead of resolving the address. Requests
+# are still sent with the address as their host.
+# backends = 10.0.0.1:8080, 10.0.0.2:8080
+# Ask the server to compress responses, e.g. gzip, deflate. Compressed responses
+# are decompressed as they are read.
+# accept encoding = gzip
+# Compress request bodies with gzip or deflate.
+# request encoding = gzip
+
+# A second server that the compare command runs the same tests against. Options
+# that are not given are taken from the server section. This section is
+# optional.
+# [shadow]
+# address = localhost:8081
+
+# Runs are made through a local proxy that degrades the connection to the
+# server when this section is given. Latency and jitter are added to each
+# direction. Bandwidth is in bytes per second. Reset and truncate are the
+# chances, from 0 to 1, that a connection is reset or has its first response
+# cut off. A seed makes the degradation the same on every run.
+# [impairment]
+# latency = 100ms
+# jitter = 20ms
+# bandwidth = 65536
+# reset = 0.01
+# truncate = 0.01
+# seed = 1
+
+# Limits that keep a run from hanging on an unresponsive server. All values are
+# in seconds. This section is optional.
+[limits]
+# Time allowed to establish a connection.
+connect timeout = 10
+# Time allowed for the server to answer a request.
+read timeout = 30
+# Total time allowed for a run. Once less than the reserve is left, only the
+# most important tests are run and the rest are reported as not run.
+budget = 600
+budget reserve = 60
+# The number of bytes of a response that may be buffered while it is decoded.
+# Arrays of products are checked one item at a time, so they can be longer.
+max body size = 1048576
+
+# Latency objectives. Each conformance request is repeated and the percentiles
+# of its latency are checked against these limits. Objectives can be set for
+# an entry point, e.g. auth.p95, or for a single test, e.g.
+# validate.test_success.p99. Durations are in seconds unless they end in ms.
+# This section is optional.
+# [slo]
+# repeat = 3
+# auth.p95 = 1s
+# validate.p95 = 1s
+
+# Settings used by the monitor command. The name the publisher is reported
+# under defaults to the file name. Checks are made every interval seconds, and
+# a session key is reused for session lifetime seconds before a new one is
+# requested. This section is optional.
+# [monitor]
+# name = localhost
+# interval = 60
+# session lifetime = 300
 
 # Valid user settings. Note that the username and password are arbitrary
 # fields. You can specify any authorization fields you like.
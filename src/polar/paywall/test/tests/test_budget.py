@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# coding: utf-8
+# Copyright (c) 2012, Polar Mobile.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name Polar Mobile nor the names of its contributors
+#     may be used to endorse or promote products derived from this software
+#     without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL POLAR MOBILE BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from polar.paywall.test.budget import Budget, BudgetExhausted
+
+from unittest import TestCase
+
+
+class BudgetTest(TestCase):
+    '''
+    Tests tracking the time left in a run.
+    '''
+    def test_unlimited(self):
+        budget = Budget()
+        self.assertEqual(budget.remaining(), None)
+        self.assertFalse(budget.exhausted())
+        self.assertFalse(budget.low())
+
+    def test_remaining(self):
+        budget = Budget(60, reserve=10)
+        self.assertTrue(59 < budget.remaining() <= 60)
+        self.assertFalse(budget.exhausted())
+        self.assertFalse(budget.low())
+
+    def test_low(self):
+        budget = Budget(60, reserve=10)
+        budget.start -= 55
+        self.assertTrue(budget.low())
+        self.assertFalse(budget.exhausted())
+
+    def test_exhausted(self):
+        budget = Budget(60)
+        budget.start -= 120
+        self.assertEqual(budget.remaining(), 0)
+        self.assertTrue(budget.exhausted())
+
+    def test_exhausted_message(self):
+        self.assertEqual(str(BudgetExhausted()), 'The time budget ran out.')
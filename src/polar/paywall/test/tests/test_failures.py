@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# coding: utf-8
+# Copyright (c) 2012, Polar Mobile.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name Polar Mobile nor the names of its contributors
+#     may be used to endorse or promote products derived from this software
+#     without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL POLAR MOBILE BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from polar.paywall.test.failures import FailureLog, truncate
+
+from unittest import TestCase
+
+
+class FailureLogTest(TestCase):
+    '''
+    Tests counting failures and keeping recent examples.
+    '''
+    def test_counts(self):
+        log = FailureLog()
+        log.add('auth.test_model', '401', '200', 'Got %s.', ('200',))
+        log.add('auth.test_model', '401', '200', 'Got %s.', ('200',))
+        log.add('auth.test_urls', '404', '500', 'Got %s.', ('500',))
+
+        self.assertEqual(log.total(), 3)
+        self.assertEqual(log.summarize(),
+                         ['auth.test_model: expected 401, got 200, '
+                          '2 failures',
+                          'auth.test_urls: expected 404, got 500, '
+                          '1 failures'])
+
+    def test_ring(self):
+        log = FailureLog(size=3)
+        for index in range(10):
+            log.add('test', 'a', 'b', 'Failure %i.', (index,))
+
+        self.assertEqual(log.total(), 10)
+        self.assertEqual([example[3] for example in log.examples],
+                         [(7,), (8,), (9,)])
+
+    def test_body_truncated(self):
+        log = FailureLog()
+        log.add('test', 'a', 'b', 'Failure.', (), 'x' * 100000)
+
+        body = log.examples[0][4]
+        self.assertTrue(len(body) < 5000)
+        self.assertTrue(body.endswith('(100000 characters in all)'))
+
+    def test_decoded_body(self):
+        log = FailureLog()
+        log.add('test', 'a', 'b', 'Failure.', (), {'error': {'code': 'X'}})
+        self.assertEqual(log.examples[0][4], repr({'error': {'code': 'X'}}))
+
+    def test_truncate(self):
+        self.assertEqual(truncate('short', 10), 'short')
+        self.assertEqual(truncate('0123456789abc', 10),
+                         '0123456789... (13 characters in all)')
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# coding: utf-8
+# Copyright (c) 2012, Polar Mobile.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name Polar Mobile nor the names of its contributors
+#     may be used to endorse or promote products derived from this software
+#     without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL POLAR MOBILE BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from polar.paywall.test.history import History, PASSED, FAILED
+from polar.paywall.test.subcommand import Subcommand
+
+from ConfigParser import ConfigParser
+from os import close, remove
+from tempfile import mkstemp
+from unittest import TestCase
+
+
+def create_config(address='localhost'):
+    config = ConfigParser()
+    config.add_section('server')
+    config.set('server', 'address', address)
+    return config
+
+
+class HistoryTest(TestCase):
+    '''
+    Tests persisting test outcomes between runs.
+    '''
+    def setUp(self):
+        handle, self.path = mkstemp()
+        close(handle)
+        remove(self.path)
+
+    def tearDown(self):
+        try:
+            remove(self.path)
+        except OSError:
+            pass
+
+    def test_missing_file(self):
+        history = History(self.path, create_config())
+        self.assertEqual(history.previous, {})
+        self.assertFalse(history.passed('auth.test_success'))
+
+    def test_save_and_load(self):
+        history = History(self.path, create_config())
+        history.record('auth.test_success', PASSED)
+        history.record('auth.test_model', FAILED)
+        history.save()
+
+        history = History(self.path, create_config())
+        self.assertTrue(history.passed('auth.test_success'))
+        self.assertFalse(history.passed('auth.test_model'))
+
+    def test_unselected_tests_keep_outcome(self):
+        history = History(self.path, create_config())
+        history.record('auth.test_success', PASSED)
+        history.save()
+
+        history = History(self.path, create_config())
+        history.record('auth.test_model', PASSED)
+        history.save()
+
+        history = History(self.path, create_config())
+        self.assertTrue(history.passed('auth.test_success'))
+        self.assertTrue(history.passed('auth.test_model'))
+
+    def test_config_change(self):
+        history = History(self.path, create_config())
+        history.record('auth.test_success', PASSED)
+        history.save()
+
+        history = History(self.path, create_config('example.com'))
+        self.assertFalse(history.passed('auth.test_success'))
+
+    def test_corrupt_file(self):
+        corrupt = open(self.path, 'w')
+        corrupt.write('{not json')
+        corrupt.close()
+
+        history = History(self.path, create_config())
+        self.assertEqual(history.previous, {})
+
+
+class SelectTestsTest(TestCase):
+    '''
+    Tests filtering and ordering tests by keyword and by the outcomes of the
+    last run.
+    '''
+    tests = ['test_urls', 'test_model', 'test_success']
+
+    def create_suite(self, **options):
+        suite = Subcommand()
+        suite.entry = 'auth'
+        suite.history = History(None, create_config())
+        suite.history.previous = {'auth.test_urls': PASSED,
+                                  'auth.test_success': FAILED}
+        for name, value in options.items():
+            setattr(suite, name, value)
+        return suite
+
+    def test_all(self):
+        suite = self.create_suite()
+        self.assertEqual(suite.select_tests(self.tests), self.tests)
+
+    def test_keyword(self):
+        suite = self.create_suite(keyword='model, auth.test_urls')
+        self.assertEqual(suite.select_tests(self.tests),
+                         ['test_urls', 'test_model'])
+
+    def test_only_failed(self):
+        suite = self.create_suite(only_failed=True)
+        self.assertEqual(suite.select_tests(self.tests),
+                         ['test_model', 'test_success'])
+
+    def test_failed_first(self):
+        suite = self.create_suite(failed_first=True)
+        self.assertEqual(suite.select_tests(self.tests),
+                         ['test_model', 'test_success', 'test_urls'])
+
+    def test_without_history(self):
+        suite = self.create_suite(only_failed=True, keyword='success')
+        suite.history = None
+        self.assertEqual(suite.select_tests(self.tests), ['test_success'])
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# coding: utf-8
+# Copyright (c) 2012, Polar Mobile.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name Polar Mobile nor the names of its contributors
+#     may be used to endorse or promote products derived from this software
+#     without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL POLAR MOBILE BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from polar.paywall.test.schemas import AUTH_SCHEMAS
+
+from polar.paywall.test.auth import Auth
+
+from polar.paywall.test.memory import Memory
+
+# Note that in python 2.5 the json module is called simplejson.
+try:
+    from json import dumps
+except ImportError:
+    from simplejson import dumps
+
+from ConfigParser import ConfigParser
+from StringIO import StringIO
+from unittest import TestCase
+
+# The number of requests sent in each phase.
+REQUESTS = 2000
+
+# The number of objects a request may leave behind on average.
+TOLERANCE = 0.05
+
+BODY = dumps({'sessionKey': 'key',
+              'products': ['product%i' % index for index in range(50)]})
+
+
+class FakeSocket(object):
+    def settimeout(self, timeout):
+        pass
+
+
+class FakeResponse(object):
+    '''
+    A successful auth response, read in chunks like an httplib response.
+    '''
+    status = 200
+
+    def __init__(self):
+        self.msg = {'Content-Type': 'application/json'}
+        self.length = len(BODY)
+        self.body = StringIO(BODY)
+
+    def getheader(self, name, default=None):
+        return self.msg.get(name, default)
+
+    def read(self, amt=None):
+        return self.body.read(amt)
+
+
+class FakeConnection(object):
+    '''
+    A connection that answers every request without a server.
+    '''
+    backend = 'fake'
+
+    def __init__(self):
+        self.sock = None
+
+    def connect(self):
+        self.sock = FakeSocket()
+
+    def request(self, method, url, body, headers):
+        pass
+
+    def getresponse(self):
+        return FakeResponse()
+
+    def close(self):
+        self.sock = None
+
+
+class FlatMemoryTest(TestCase):
+    '''
+    Sends requests through the path the tests use, from building the request
+    to decoding and validating the response, and checks that the memory
+    held by the client stays flat. As in the leak command, memory that is
+    allocated once only grows in one phase, while a leak grows in both.
+    '''
+    def setUp(self):
+        config = ConfigParser()
+        for section, options in (
+                ('server', {'address': 'localhost', 'protocol': 'http',
+                            'version': 'v1.0.0'}),
+                ('valid user', {'username': 'user01', 'password': 'test'}),
+                ('products', {'valid user': 'product01'})):
+            config.add_section(section)
+            for option, value in options.items():
+                config.set(section, option, value)
+
+        self.auth = Auth()
+        self.auth.config = config
+        self.connection = FakeConnection()
+
+    def send_requests(self, requests):
+        for index in xrange(requests):
+            self.auth.request(self.connection, schemas=AUTH_SCHEMAS)
+
+    def test_flat(self):
+        # Caches fill up during the warm-up.
+        self.send_requests(REQUESTS / 4)
+        self.assertEqual(self.auth.failures, 0)
+
+        memory = Memory()
+        snapshots = [memory.measure()]
+        for phase in (1, 2):
+            self.send_requests(REQUESTS)
+            snapshots.append(memory.measure())
+
+        growth = [float(after['objects'] - before['objects']) / REQUESTS
+                  for before, after in zip(snapshots, snapshots[1:])]
+        self.assertFalse(min(growth) > TOLERANCE,
+                         'Objects grew by %.3f and %.3f per request.' % \
+                         tuple(growth))
+        self.assertEqual(self.auth.failures, 0)
+
+    def test_leak_detected(self):
+        # A path that keeps every response is caught.
+        kept = []
+        request = self.auth.request
+        self.auth.request = lambda *args, **kwargs: \
+            kept.append(request(*args, **kwargs))
+
+        memory = Memory()
+        before = memory.measure()
+        self.send_requests(REQUESTS / 4)
+        after = memory.measure()
+        self.assertTrue(float(after['objects'] - before['objects']) /
+                        (REQUESTS / 4) > TOLERANCE)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# coding: utf-8
+# Copyright (c) 2012, Polar Mobile.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name Polar Mobile nor the names of its contributors
+#     may be used to endorse or promote products derived from this software
+#     without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL POLAR MOBILE BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from polar.paywall.test.pacing import Barrier, BrokenBarrier, Throttle
+
+from threading import Thread
+from time import time, sleep
+from unittest import TestCase
+
+
+class BarrierTest(TestCase):
+    '''
+    Tests releasing threads together.
+    '''
+    def start(self, target, count):
+        threads = [Thread(target=target) for index in range(count)]
+        for thread in threads:
+            thread.setDaemon(True)
+            thread.start()
+        return threads
+
+    def join(self, threads):
+        for thread in threads:
+            thread.join(5)
+            self.assertFalse(thread.isAlive())
+
+    def test_release(self):
+        barrier = Barrier(4)
+        released = []
+        threads = self.start(lambda: released.append(barrier.wait()), 3)
+
+        sleep(0.05)
+        self.assertEqual(released, [])
+        barrier.wait()
+        self.join(threads)
+        self.assertEqual(len(released), 3)
+
+    def test_reuse(self):
+        barrier = Barrier(2)
+        rounds = []
+
+        def work():
+            for index in range(3):
+                barrier.wait()
+                rounds.append(index)
+
+        threads = self.start(work, 1)
+        for index in range(3):
+            barrier.wait()
+        self.join(threads)
+        self.assertEqual(rounds, [0, 1, 2])
+
+    def test_abort(self):
+        barrier = Barrier(3)
+        broken = []
+
+        def work():
+            try:
+                barrier.wait()
+            except BrokenBarrier:
+                broken.append(True)
+
+        threads = self.start(work, 2)
+        sleep(0.05)
+        barrier.abort()
+        self.join(threads)
+        self.assertEqual(broken, [True, True])
+
+        # Once aborted, the barrier no longer blocks.
+        self.assertRaises(BrokenBarrier, barrier.wait)
+
+
+class ThrottleTest(TestCase):
+    '''
+    Tests spacing out events.
+    '''
+    def test_unlimited(self):
+        throttle = Throttle()
+        start = time()
+        for index in range(1000):
+            throttle.wait()
+        self.assertTrue(time() - start < 0.5)
+        self.assertEqual(throttle.backlog(), None)
+
+    def test_rate(self):
+        throttle = Throttle(100)
+        start = time()
+        for index in range(11):
+            throttle.wait()
+        self.assertTrue(time() - start >= 0.09)
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# coding: utf-8
+# Copyright (c) 2012, Polar Mobile.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name Polar Mobile nor the names of its contributors
+#     may be used to endorse or promote products derived from this software
+#     without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL POLAR MOBILE BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from polar.paywall.test.resolver import Resolver, split_address
+
+from unittest import TestCase
+
+
+class CountingResolver(Resolver):
+    '''
+    A resolver that returns fixed addresses and counts its lookups.
+    '''
+    lookups = 0
+
+    def resolve(self):
+        self.lookups += 1
+        return [('10.0.0.1', self.port), ('10.0.0.2', self.port)]
+
+
+class SplitAddressTest(TestCase):
+    '''
+    Tests splitting addresses into hosts and ports.
+    '''
+    def test_default_port(self):
+        self.assertEqual(split_address('example.com', 80),
+                         ('example.com', 80))
+
+    def test_port(self):
+        self.assertEqual(split_address('example.com:8080', 80),
+                         ('example.com', 8080))
+
+    def test_ipv6(self):
+        self.assertEqual(split_address('[::1]:8443', 443), ('::1', 8443))
+        self.assertEqual(split_address('[::1]', 443), ('::1', 443))
+
+
+class ResolverTest(TestCase):
+    '''
+    Tests picking the backend of each connection.
+    '''
+    def test_first_address(self):
+        resolver = CountingResolver('example.com:8080', 80)
+        self.assertEqual([resolver.next() for index in range(3)],
+                         [('10.0.0.1', 8080)] * 3)
+
+    def test_spread(self):
+        resolver = CountingResolver('example.com', 80, spread=True)
+        self.assertEqual([resolver.next() for index in range(3)],
+                         [('10.0.0.1', 80), ('10.0.0.2', 80),
+                          ('10.0.0.1', 80)])
+
+    def test_cached(self):
+        resolver = CountingResolver('example.com', 80, ttl=300)
+        resolver.next()
+        resolver.next()
+        self.assertEqual(resolver.lookups, 1)
+
+    def test_expired(self):
+        resolver = CountingResolver('example.com', 80, ttl=0)
+        resolver.next()
+        resolver.next()
+        self.assertEqual(resolver.lookups, 2)
+
+    def test_backends(self):
+        resolver = CountingResolver('example.com:8080', 80,
+                                    backends='10.0.0.3, 10.0.0.4:9090,')
+        self.assertEqual([resolver.next() for index in range(3)],
+                         [('10.0.0.3', 8080), ('10.0.0.4', 9090),
+                          ('10.0.0.3', 8080)])
+        self.assertEqual(resolver.lookups, 0)
+
+    def test_resolve(self):
+        resolver = Resolver('127.0.0.1:8080', 80)
+        self.assertEqual(resolver.next(), ('127.0.0.1', 8080))
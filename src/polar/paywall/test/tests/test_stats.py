@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# coding: utf-8
+# Copyright (c) 2012, Polar Mobile.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name Polar Mobile nor the names of its contributors
+#     may be used to endorse or promote products derived from this software
+#     without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL POLAR MOBILE BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from polar.paywall.test.stats import percentiles, percentile, Reservoir, merge
+
+from unittest import TestCase
+
+
+class PercentilesTest(TestCase):
+    '''
+    Tests nearest rank percentiles.
+    '''
+    def test_nearest_rank(self):
+        values = range(1, 101)
+        self.assertEqual(percentiles(values, [50, 95, 99, 100]),
+                         [50, 95, 99, 100])
+
+    def test_unordered(self):
+        self.assertEqual(percentile([5, 1, 4, 2, 3], 50), 3)
+
+    def test_single(self):
+        self.assertEqual(percentiles([7], [0, 50, 100]), [7, 7, 7])
+
+    def test_empty(self):
+        self.assertEqual(percentiles([], [50, 99]), [None, None])
+
+
+class ReservoirTest(TestCase):
+    '''
+    Tests sampling a stream in fixed memory.
+    '''
+    def test_small_stream(self):
+        reservoir = Reservoir(10)
+        for value in range(5):
+            reservoir.append(value)
+        self.assertEqual(sorted(reservoir), range(5))
+        self.assertEqual(len(reservoir), 5)
+
+    def test_bounded(self):
+        reservoir = Reservoir(100)
+        for value in xrange(10000):
+            reservoir.append(value)
+        self.assertEqual(len(reservoir.values), 100)
+        self.assertEqual(len(reservoir), 10000)
+        self.assertEqual(reservoir.maximum, 9999)
+
+    def test_uniform(self):
+        # The median of a uniform sample of 0 to 9999 is near 5000.
+        reservoir = Reservoir(1000)
+        for value in xrange(10000):
+            reservoir.append(value)
+        self.assertTrue(4000 < percentile(reservoir, 50) < 6000)
+
+    def test_merge(self):
+        # The larger stream gets the larger share of the sample.
+        low, high = Reservoir(100), Reservoir(100)
+        for value in xrange(1000):
+            low.append(1)
+        for value in xrange(3000):
+            high.append(2)
+
+        merged = merge([low, high], 100)
+        self.assertEqual(len(merged), 4000)
+        self.assertEqual(merged.maximum, 2)
+        self.assertEqual(len(merged.values), 100)
+        self.assertEqual(list(merged).count(2), 75)
+
+    def test_merge_empty(self):
+        merged = merge([Reservoir(), Reservoir()])
+        self.assertEqual(len(merged), 0)
+        self.assertEqual(merged.maximum, None)
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# coding: utf-8
+# Copyright (c) 2012, Polar Mobile.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name Polar Mobile nor the names of its contributors
+#     may be used to endorse or promote products derived from this software
+#     without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL POLAR MOBILE BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from polar.paywall.test.stream import (StreamDecoder, DecompressingStream,
+    ResponseTooLarge, compress)
+
+from StringIO import StringIO
+from unittest import TestCase
+
+
+class StreamDecoderTest(TestCase):
+    '''
+    Tests decoding json documents that arrive in chunks.
+    '''
+    def decode(self, data, limit=1024, arrays=None, chunk_size=1):
+        return StreamDecoder(StringIO(data), limit, arrays,
+                             chunk_size).decode()
+
+    def test_split_tokens(self):
+        # With one byte chunks, every token is split across reads.
+        document = '{"key": "value", "number": 12345, "list": [1.5, true]}'
+        self.assertEqual(self.decode(document),
+                         {'key': 'value', 'number': 12345,
+                          'list': [1.5, True]})
+
+    def test_number_at_chunk_end(self):
+        self.assertEqual(self.decode('123456', chunk_size=3), 123456)
+
+    def test_streamed_array(self):
+        items = []
+        result = self.decode('{"products": ["a", "b", "c"], "sessionKey": "k"}',
+                             arrays={'products': items.append})
+        self.assertEqual(items, ['a', 'b', 'c'])
+        self.assertEqual(result['products'].count, 3)
+        self.assertEqual(result['sessionKey'], 'k')
+
+    def test_streamed_array_exceeds_limit(self):
+        # Only one item is buffered at a time, so the array can be longer
+        # than the limit.
+        products = ', '.join(['"product%i"' % index for index in range(100)])
+        items = []
+        result = self.decode('{"products": [%s]}' % products, limit=32,
+                             arrays={'products': items.append},
+                             chunk_size=8)
+        self.assertEqual(len(items), 100)
+        self.assertEqual(result['products'].count, 100)
+
+    def test_oversize(self):
+        self.assertRaises(ResponseTooLarge, self.decode,
+                          '{"key": "%s"}' % ('x' * 100), 32, None, 8)
+
+    def test_extra_data(self):
+        self.assertRaises(ValueError, self.decode, '{} {}')
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, self.decode, '{"key": }')
+
+
+class DecompressingStreamTest(TestCase):
+    '''
+    Tests reading compressed bodies.
+    '''
+    document = '{"products": [%s]}' % \
+        ', '.join(['"product%i"' % index for index in range(1000)])
+
+    def read(self, stream, amt=64):
+        result = []
+        while True:
+            data = stream.read(amt)
+            if not data:
+                return ''.join(result)
+            self.assertTrue(len(data) <= amt)
+            result.append(data)
+
+    def test_gzip(self):
+        stream = DecompressingStream(
+            StringIO(compress(self.document, 'gzip')), 'gzip')
+        self.assertEqual(self.read(stream), self.document)
+        self.assertEqual(stream.size, len(self.document))
+        self.assertTrue(stream.raw < stream.size)
+
+    def test_deflate(self):
+        stream = DecompressingStream(
+            StringIO(compress(self.document, 'deflate')), 'deflate')
+        self.assertEqual(self.read(stream), self.document)
+
+    def test_raw_deflate(self):
+        # Some servers send deflate data without the zlib header.
+        data = compress(self.document, 'deflate')[2:-4]
+        stream = DecompressingStream(StringIO(data), 'deflate')
+        self.assertEqual(self.read(stream), self.document)
+
+    def test_gzip_decoded(self):
+        stream = DecompressingStream(
+            StringIO(compress(self.document, 'gzip')), 'gzip')
+        items = []
+        StreamDecoder(stream, 64, {'products': items.append}, 16).decode()
+        self.assertEqual(len(items), 1000)
+
+    def test_corrupt(self):
+        stream = DecompressingStream(StringIO('not gzip data'), 'gzip')
+        self.assertRaises(ValueError, self.read, stream)
+
+    def test_unsupported(self):
+        self.assertRaises(ValueError, DecompressingStream, StringIO(''),
+                          'brotli')
@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# coding: utf-8
+# Copyright (c) 2012, Polar Mobile.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name Polar Mobile nor the names of its contributors
+#     may be used to endorse or promote products derived from this software
+#     without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL POLAR MOBILE BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from polar.paywall.test.stats import percentiles
+
+from csv import writer
+from threading import Thread, Lock, Event
+from time import time
+
+# The columns of the output file.
+COLUMNS = ('second', 'warmup', 'requests', 'errors', 'p50 ms', 'p99 ms',
+           'error codes', 'client', 'rss MB', 'objects')
+
+# The columns that are filled in by notes rather than by requests.
+NOTES = ('client', 'rss MB', 'objects')
+
+
+class TimeSeries(object):
+    '''
+    Collects the results of requests in one second buckets and streams each
+    bucket to a csv file a second after it is over, leaving time for notes
+    about the client to arrive. Buckets are written by a timer rather than
+    by requests, so a stall shows up as empty rows while it happens. Buckets
+    that fall within the warm-up period are marked. Notes about the client,
+    such as whether it was saturated and how much memory it used, are added
+    to the second they were taken in.
+    '''
+    def __init__(self, output, warmup=0):
+        self.output = output
+        self.writer = writer(output)
+        self.writer.writerow(COLUMNS)
+
+        self.start = time()
+        self.warmup = warmup
+        self.buckets = {}
+        self.annotations = {}
+        self.written = 0
+        self.lock = Lock()
+
+        self.stopped = Event()
+        self.thread = Thread(target=self.tick)
+        self.thread.setDaemon(True)
+        self.thread.start()
+
+    def tick(self):
+        '''
+        Writes the buckets that are due once a second until closed.
+        '''
+        while not self.stopped.wait(1.0) and not self.stopped.isSet():
+            self.lock.acquire()
+            try:
+                self.flush(int(time() - self.start) - 1)
+            finally:
+                self.lock.release()
+
+    def record(self, latency, error=None):
+        '''
+        Records a request that just finished. Errors are recorded by their
+        error code.
+        '''
+        now = time()
+        second = int(now - self.start)
+
+        self.lock.acquire()
+        try:
+            bucket = self.buckets.get(second)
+            if bucket is None:
+                bucket = self.buckets[second] = {'latencies': [], 'errors': {}}
+
+            bucket['latencies'].append(latency)
+            if error is not None:
+                bucket['errors'][error] = bucket['errors'].get(error, 0) + 1
+
+            self.flush(second - 1)
+        finally:
+            self.lock.release()
+
+    def annotate(self, second, note, column='client'):
+        '''
+        Adds a note about the client to a second that has not been written
+        yet.
+        '''
+        self.lock.acquire()
+        try:
+            self.annotations.setdefault(second, {})[column] = note
+        finally:
+            self.lock.release()
+
+    def flush(self, second):
+        '''
+        Writes the buckets of the seconds before the given one. Must be
+        called with the lock held.
+        '''
+        while self.written < second:
+            bucket = self.buckets.pop(self.written,
+                                      {'latencies': [], 'errors': {}})
+            latencies = bucket['latencies']
+            errors = bucket['errors']
+
+            p50, p99 = '', ''
+            if latencies:
+                p50, p99 = ['%.1f' % (value * 1000) for value in
+                            percentiles(latencies, [50, 99])]
+
+            codes = ' '.join(['%s=%i' % (code, count) for code, count
+                              in sorted(errors.items())])
+
+            notes = self.annotations.pop(self.written, {})
+            self.writer.writerow((self.written,
+                                  int(self.written < self.warmup),
+                                  len(latencies), sum(errors.values()),
+                                  p50, p99, codes) + \
+                                 tuple([notes.get(column, '')
+                                        for column in NOTES]))
+            self.written += 1
+
+        self.output.flush()
+
+    def close(self):
+        '''
+        Stops the timer and writes the remaining buckets, including the
+        current second.
+        '''
+        self.stopped.set()
+        self.thread.join()
+
+        self.lock.acquire()
+        try:
+            self.flush(int(time() - self.start) + 1)
+        finally:
+            self.lock.release()
+        self.output.close()
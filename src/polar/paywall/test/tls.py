@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# coding: utf-8
+# Copyright (c) 2012, Polar Mobile.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright
+#     notice, this list of conditions and the following disclaimer in the
+#     documentation and/or other materials provided with the distribution.
+#   * Neither the name Polar Mobile nor the names of its contributors
+#     may be used to endorse or promote products derived from this software
+#     without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL POLAR MOBILE BE LIABLE FOR ANY DIRECT,
+# INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from polar.paywall.test.stats import percentiles
+
+from httplib import HTTPConnection, HTTPSConnection
+
+from threading import Lock
+from time import time
+
+from ssl import wrap_socket
+
+# Older versions of python don't have SSL contexts.
+try:
+    from ssl import create_default_context
+except ImportError:
+    create_default_context = None
+
+
+class TLS(object):
+    '''
+    TLS state shared by the connections to one server: an SSL context that
+    is only created once, and the time spent in handshakes. The ssl module
+    of python 2 can't resume sessions, so every handshake is a full one.
+    '''
+    def __init__(self):
+        self.context = None
+        self.lock = Lock()
+
+        self.connects = []
+        self.handshakes = []
+
+    def get_context(self):
+        '''
+        Returns the shared SSL context, creating it the first time. Returns
+        None if the ssl module does not support contexts.
+        '''
+        self.lock.acquire()
+        try:
+            if self.context is None and create_default_context:
+                self.context = create_default_context()
+            return self.context
+        finally:
+            self.lock.release()
+
+    def wrap(self, sock, hostname):
+        '''
+        Performs the TLS handshake on a connected socket and records how long
+        it took.
+        '''
+        context = self.get_context()
+
+        start = time()
+        if context is None:
+            secure = wrap_socket(sock)
+        else:
+            secure = context.wrap_socket(sock, server_hostname=hostname)
+        elapsed = time() - start
+
+        self.lock.acquire()
+        try:
+            self.handshakes.append(elapsed)
+        finally:
+            self.lock.release()
+
+        return secure
+
+    def record_connect(self, elapsed):
+        '''
+        Records the time taken to open a TCP connection.
+        '''
+        self.lock.acquire()
+        try:
+            self.connects.append(elapsed)
+        finally:
+            self.lock.release()
+
+    def summarize(self):
+        '''
+        Returns lines describing the handshakes so far.
+        '''
+        if not self.handshakes:
+            return []
+
+        p50, p99 = percentiles(self.handshakes, [50, 99])
+        return ['TLS handshakes: %i, %.1fs in total, p50 %.1fms, p99 %.1fms' % \
+                (len(self.handshakes), sum(self.handshakes), p50 * 1000,
+                 p99 * 1000)]
+
+
+class TLSConnection(HTTPSConnection):
+    '''
+    An HTTPS connection that shares its TLS state with the other connections
+    to the same server, and records the time spent connecting and in the
+    handshake. The hostname is the name the server's certificate is checked
+    against, since host may be a resolved address.
+    '''
+    def __init__(self, host, port, timeout, tls, hostname=None):
+        context = tls.get_context()
+        if context is None:
+            HTTPSConnection.__init__(self, host, port, timeout=timeout)
+        else:
+            HTTPSConnection.__init__(self, host, port, timeout=timeout,
+                                     context=context)
+        self.tls = tls
+        self.hostname = hostname or host
+
+    def connect(self):
+        '''
+        Opens the TCP connection and performs the handshake.
+        '''
+        start = time()
+        HTTPConnection.connect(self)
+        self.tls.record_connect(time() - start)
+
+        self.sock = self.tls.wrap(self.sock, self.hostname)
@@ -28,20 +28,60 @@
 
 from polar.paywall.test.schemas import VALIDATE_SCHEMAS, AUTH_SCHEMAS
 
-from polar.paywall.test.subcommand import Subcommand
+from polar.paywall.test.subcommand import Subcommand, RequestTimeout
 
-from logging import info, error
+from polar.paywall.test.budget import BudgetExhausted
+
+from polar.paywall.test.matrix import (Case, COMMON_CASES, url, random_id,
+                                       has_invalid_user)
+
+from logging import info
+
+from threading import Thread
+from time import time
 
 # Used to get a session key.
 from auth import Auth
 
-from traceback import format_exc
+# Tests that send no session key, or an invalid one, and so can be run
+# before the session key is known.
+KEYLESS_TESTS = ('test_urls', 'test_headers')
+
+# The tests of the validate entry point, as rows of the test matrix. See
+# Case.
+CASES = COMMON_CASES + [
+    Case('test_body', 'with body', 400, 'InvalidFormat', body='test'),
+
+    Case('test_model', 'invalid product', 404, 'InvalidProduct',
+         url=url(product=random_id)),
+
+    # One user tries to use another user's session key.
+    Case('test_model', 'session key copy attack', 401, 'SessionExpired',
+         url=url(user='invalid user'), when=has_invalid_user),
+
+    Case('test_success', 'a successful validation',
+         schemas=VALIDATE_SCHEMAS),
+]
 
 
 class Validate(Subcommand):
     '''
     Called by the validate subcommand in main.
     '''
+    entry = 'validate'
+
+    # A successful validation and the model checks are the most important
+    # tests, so they are still run when the budget runs low.
+    priority_tests = ('test_model', 'test_success')
+
+    cases = CASES
+
+    # Session keys are reused for this many seconds. By default, every run
+    # gets a new key.
+    session_lifetime = 0
+    session_key = None
+    session_time = 0
+
     def run(self, arguments):
         '''
         Runs the full series of unit tests on auth.
@@ -49,27 +89,71 @@ class Validate(Subcommand):
         info('Running tests on the validate entry point.')
 
         connection = self.create_connection()
+        self.run_suite(connection)
+        connection.close()
 
-        tests = [
-            self.test_urls,
-            self.test_headers,
-            self.test_body,
-            self.test_model,
-            self.test_success,
-        ]
+    def run_suite(self, connection):
+        '''
+        Runs the tests on the validate entry point. The session key is
+        fetched on a connection of its own while the tests that don't need
+        one run.
+        '''
+        tests = self.get_tests()
+        keyless = [test for test in tests if test in KEYLESS_TESTS]
+        tests = [test for test in tests if test not in keyless]
 
-        # Get a session key to validate with.
-        self.session_key = self.get_session_key(connection)
+        result = {}
+        fetch = Thread(target=self.fetch_session_key, args=(result,))
+        fetch.start()
 
-        for test in tests:
-            try:
-                test(connection)
+        self.latencies = {}
+        self.run_tests(connection, keyless)
+        fetch.join()
+
+        # Without a session key, none of the other tests can be run. They
+        # are not run if the server was too slow to answer, and errored if
+        # anything else went wrong.
+        exception = result.get('exception')
+        if exception is not None:
+            names = [self.get_test_name(test)
+                     for test in self.select_tests(tests)]
+            reason = 'Could not get a session key.'
+            if isinstance(exception, (RequestTimeout, BudgetExhausted)):
+                self.report_not_run(names, '%s %s' % (reason, exception))
+            else:
+                self.report_errored(names, '%s %s: %s' % \
+                                    (reason, exception.__class__.__name__,
+                                     exception))
+            tests = []
 
+        self.run_tests(connection, tests)
+        self.check_entry_latency()
+
+    def fetch_session_key(self, result):
+        '''
+        Refreshes the session key on a new connection. Any exception is
+        stored in result, to be handled by the thread running the tests.
+        '''
+        connection = self.create_connection()
+        try:
+            try:
+                self.refresh_session_key(connection)
             except Exception, exception:
-                error(format_exc())
-                error(exception)
+                result['exception'] = exception
+        finally:
+            connection.close()
 
-        connection.close()
+    def refresh_session_key(self, connection):
+        '''
+        Gets a new session key, unless the current key is younger than the
+        session lifetime.
+        '''
+        if self.session_key is not None and \
+           time() - self.session_time < self.session_lifetime:
+            return
+
+        self.session_key = self.get_session_key(connection)
+        self.session_time = time()
 
     def get_session_key(self, connection):
         '''
@@ -78,7 +162,7 @@ class Validate(Subcommand):
         '''
         # Create an Auth object to create the request to the publisher.
         auth = Auth()
-        auth.config = self.config
+        self.share(auth)
 
         schemas = AUTH_SCHEMAS
         url, status, headers, body = auth.request(connection, schemas=schemas)
@@ -90,9 +174,9 @@ class Validate(Subcommand):
         '''
         Creates a url using the values in the config file.
         '''
-        entry = 'validate'
-        return Subcommand.get_url(self, entry=entry, api=api, version=version,
-                                  format=format, product=product, user=user)
+        return Subcommand.get_url(self, entry=self.entry, api=api,
+                                  version=version, format=format,
+                                  product=product, user=user)
 
     def get_headers(self, charset='utf-8'):
         '''
@@ -109,35 +193,3 @@ class Validate(Subcommand):
         This entry point supports no body.
         '''
         return ''
-
-    def test_body(self, connection):
-        '''
-        Test responses to bad json encoded resquests.
-        '''
-        info('Testing with body.')
-        body = 'test'
-        self.test_error(connection, 400, 'InvalidFormat', body=body)
-
-    def test_model(self, connection):
-        '''
-        Test responses to requests with valid formatting but invalid data.
-        '''
-        info('Testing invalid product.')
-        url = self.get_url(product=self.random_id())
-        self.test_error(connection, 404, 'InvalidProduct', url=url)
-
-        if self.config.has_section('invalid user'):
-            # If an invalid user is provided, we can test a situation where one
-            # user tries to use another users's session id.
-            info('Testing session key copy attack.')
-            url = self.get_url(user='invalid user')
-            body = self.get_body(user='invalid user')
-            code = 'SessionExpired'
-            self.test_error(connection, 401, code, url=url, body=body)
-
-    def test_success(self, connection):
-        '''
-        Test a successful request/response.
-        '''
-        info('Testing a successful validation.')
-        self.request(connection, schemas=VALIDATE_SCHEMAS)